@@ -0,0 +1,47 @@
+"""
+Porównanie wektorowej funkcji przesun_date z dawną implementacją
+opartą na liście Timestampów (zgodność wyników i czas działania).
+
+Uruchomienie (z katalogu głównego repozytorium):
+    PYTHONPATH=src python benchmarks/bench_przesun_date.py
+"""
+import sys
+import os
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from wczytaj_wyczysc import przesun_date
+
+
+def przesun_date_petla(df:pd.DataFrame) -> pd.DataFrame:
+    """Dawna implementacja przesun_date (punkt odniesienia)."""
+    df = df.copy()
+    df.index = pd.to_datetime(df.index, errors="coerce",format="%Y-%m-%d %H:%M:%S")
+    polnoc = df.index.hour == 0
+    nowy_indeks = [t - pd.Timedelta(seconds=1) if h else t for t, h in zip(df.index, polnoc)]
+    df.index = pd.DatetimeIndex(nowy_indeks)
+    return df
+
+
+def zmierz(funkcja, df, powtorzenia=3) -> float:
+    czasy = []
+    for _ in range(powtorzenia):
+        start = time.perf_counter()
+        funkcja(df)
+        czasy.append(time.perf_counter() - start)
+    return min(czasy)
+
+
+if __name__ == "__main__":
+    for lata, stacje in [(1, 10), (5, 50), (10, 100)]:
+        indeks = pd.date_range("2015-01-01 01:00", periods=lata * 8760, freq="h")
+        df = pd.DataFrame(np.random.rand(len(indeks), stacje).astype(np.float32), index=indeks)
+
+        pd.testing.assert_frame_equal(przesun_date(df), przesun_date_petla(df), check_freq=False)
+        t_petla = zmierz(przesun_date_petla, df)
+        t_wekt = zmierz(przesun_date, df)
+        t_miejsce = zmierz(lambda d: przesun_date(d, w_miejscu=True), df.copy())
+        print(f"lata={lata:2d} stacje={stacje:3d}  pętla: {t_petla:.4f} s  "
+              f"wektorowo: {t_wekt:.4f} s  w miejscu: {t_miejsce:.4f} s  "
+              f"(x{t_petla / t_wekt:.0f})")
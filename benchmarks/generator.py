@@ -0,0 +1,95 @@
+"""
+Generator syntetycznych danych w układzie plików GIOŚ (PM2.5, 1g)
+do testów wydajności.
+"""
+import numpy as np
+import pandas as pd
+
+NAGLOWKI = ["Nr", "Kod stacji", "Wskaźnik", "Czas uśredniania", "Jednostka", "Kod stanowiska"]
+
+
+def generuj_metadane(stacje:int, miasta:int=None, stare_kody:float=0.1, seed:int=0) -> pd.DataFrame:
+    """
+    Tworzy tabelę metadanych w układzie pliku metadanych GIOŚ.
+
+    Parameters
+    ----------
+    stacje : int
+        Liczba stacji.
+    miasta : int, optional
+        Liczba miejscowości (domyślnie około stacje / 3).
+    stare_kody : float, optional
+        Udział stacji, które mają stary kod (używany w surowych danych).
+    seed : int, optional
+        Ziarno generatora liczb losowych.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Metadane z kolumnami 'Kod stacji', 'Stary Kod stacji ...', 'Miejscowość'.
+    """
+    rng = np.random.default_rng(seed)
+    miasta = miasta or max(1, stacje // 3)
+    kody = [f"St{nr:04d}" for nr in range(stacje)]
+    stare = [f"Old{nr:04d}" if rng.random() < stare_kody else None for nr in range(stacje)]
+    return pd.DataFrame({
+        "Nr": range(1, stacje + 1),
+        "Kod stacji": kody,
+        "Stary Kod stacji \n(o ile inny od aktualnego)": stare,
+        "Miejscowość": [f"Miasto{nr % miasta:03d}" for nr in range(stacje)],
+    })
+
+
+def generuj_rok(rok:int, metadane:pd.DataFrame, brak:float=0.05, seed:int=0) -> pd.DataFrame:
+    """
+    Tworzy surową tabelę jednego roku w postaci zwracanej przez download_gios_archive.
+
+    Parameters
+    ----------
+    rok : int
+        Rok danych (pomiary od 01:00 1 stycznia do 00:00 1 stycznia kolejnego roku).
+    metadane : pandas.DataFrame
+        Metadane z generuj_metadane; stacje ze starym kodem występują pod nim.
+    brak : float, optional
+        Udział brakujących pomiarów (puste komórki).
+    seed : int, optional
+        Ziarno generatora liczb losowych.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Tabela typu object: wiersze opisowe, a pod nimi pomiary godzinowe.
+    """
+    rng = np.random.default_rng(seed + rok)
+    daty = pd.date_range(f"{rok}-01-01 01:00", f"{rok + 1}-01-01 00:00", freq="h")
+    n = len(metadane)
+    kody = metadane["Stary Kod stacji \n(o ile inny od aktualnego)"].fillna(metadane["Kod stacji"]).tolist()
+
+    # stężenia z sezonowością (zima wyżej) i szumem log-normalnym
+    sezon = 1 + 0.8 * np.cos(2 * np.pi * (daty.dayofyear.to_numpy() / 365.25))
+    wartosci = (15 * sezon[:, None] * rng.lognormal(0, 0.5, (len(daty), n))).round(1).astype(object)
+    wartosci[rng.random(wartosci.shape) < brak] = np.nan
+
+    naglowek = np.array([
+        list(range(1, n + 1)),
+        kody,
+        ["PM2.5"] * n,
+        ["1g"] * n,
+        ["ug/m3"] * n,
+        [f"{k}-PM2.5-1g" for k in kody],
+    ], dtype=object)
+    pierwsza = np.array(NAGLOWKI + list(daty.strftime("%Y-%m-%d %H:%M:%S")), dtype=object)
+    return pd.DataFrame(np.column_stack([pierwsza, np.vstack([naglowek, wartosci])]))
+
+
+def generuj_dane(lata:list[int], stacje:int, brak:float=0.05, seed:int=0) -> tuple[dict[int,pd.DataFrame], pd.DataFrame]:
+    """
+    Tworzy surowe dane dla wielu lat wraz z metadanymi.
+
+    Returns
+    -------
+    tuple
+        Krotka (raw_data {rok: DataFrame}, metadane).
+    """
+    metadane = generuj_metadane(stacje, seed=seed)
+    return {rok: generuj_rok(rok, metadane, brak, seed) for rok in lata}, metadane
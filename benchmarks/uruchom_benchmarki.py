@@ -0,0 +1,162 @@
+"""
+Testy wydajności potoku: wczytywanie/czyszczenie -> analiza -> wykresy.
+
+Dla kilku skal syntetycznych danych (generator.py) mierzony jest czas
+i szczytowe zużycie pamięci (tracemalloc) kolejnych funkcji. Wyniki są
+zapisywane w JSON i mogą być porównane z zapisanym punktem odniesienia.
+
+Uruchomienie (z katalogu głównego repozytorium):
+    PYTHONPATH=src python benchmarks/uruchom_benchmarki.py --wynik wyniki.json
+    PYTHONPATH=src python benchmarks/uruchom_benchmarki.py --baseline wyniki.json
+
+Kod wyjścia 1 oznacza, że któryś pomiar jest gorszy od punktu
+odniesienia o więcej niż zadaną tolerancję.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(os.path.dirname(__file__))
+from generator import generuj_dane
+from analiza import srednie_miesieczne, dni_przekroczenia_normy, srednie_po_stacjach, wybierz_stacje_max_min
+from wczytaj_wyczysc import ujednolic_dane, przesun_date, df_gotowy
+from wizualizacja import wykres_porownanie_miast, wykres_heatmap_srednie, wykres_przekroczenia
+
+SKALE = {
+    "mala": {"lata": [2024], "stacje": 10},
+    "srednia": {"lata": [2021, 2022, 2023, 2024], "stacje": 40},
+    "duza": {"lata": [2018, 2019, 2020, 2021, 2022, 2023, 2024], "stacje": 120},
+}
+
+
+def zmierz(funkcja, powtorzenia:int) -> dict:
+    """Zwraca najkrótszy czas z kilku powtórzeń i szczytową pamięć jednego wywołania."""
+    czasy = []
+    for _ in range(powtorzenia):
+        start = time.perf_counter()
+        funkcja()
+        czasy.append(time.perf_counter() - start)
+        plt.close("all")
+    tracemalloc.start()
+    funkcja()
+    _, szczyt = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    plt.close("all")
+    return {"czas_s": min(czasy), "pamiec_mb": szczyt / 2**20}
+
+
+def przypadki(raw_data:dict, metadane:pd.DataFrame, lata:list[int]) -> dict:
+    """Słownik {nazwa: funkcja bez argumentów} dla jednej skali danych."""
+    pierwszy = raw_data[lata[0]]
+    ujednolicony = ujednolic_dane(pierwszy, metadane)
+    data = df_gotowy(raw_data, metadane)
+    miesieczne = srednie_miesieczne(data)
+    przekroczenia = dni_przekroczenia_normy(data, 25.0, lata)
+    stacje, wybrane = wybierz_stacje_max_min(przekroczenia, lata[-1])
+    miasta_srednie = srednie_po_stacjach(miesieczne)
+    miasta = list(miasta_srednie.columns[:2])
+
+    return {
+        "ujednolic_dane": lambda: ujednolic_dane(pierwszy, metadane),
+        "przesun_date": lambda: przesun_date(ujednolicony),
+        "df_gotowy": lambda: df_gotowy(raw_data, metadane),
+        "srednie_miesieczne": lambda: srednie_miesieczne(data),
+        "dni_przekroczenia_normy": lambda: dni_przekroczenia_normy(data, 25.0, lata),
+        "wykres_porownanie_miast": lambda: wykres_porownanie_miast(miasta_srednie, lata, miasta),
+        "wykres_heatmap_srednie": lambda: wykres_heatmap_srednie(miasta_srednie, lata),
+        "wykres_przekroczenia": lambda: wykres_przekroczenia(wybrane, stacje, lata, 25.0),
+    }
+
+
+def uruchom(skale:list[str], powtorzenia:int) -> dict:
+    wyniki = {}
+    for skala in skale:
+        parametry = SKALE[skala]
+        raw_data, metadane = generuj_dane(parametry["lata"], parametry["stacje"])
+        wyniki[skala] = {}
+        try:
+            funkcje = przypadki(raw_data, metadane, parametry["lata"])
+        except Exception as e:
+            wyniki[skala]["przygotowanie"] = {"blad": f"{type(e).__name__}: {e}"}
+            print(f"{skala:8s} {'przygotowanie':26s} {_opis(wyniki[skala]['przygotowanie'])}")
+            continue
+        for nazwa, funkcja in funkcje.items():
+            try:
+                wyniki[skala][nazwa] = zmierz(funkcja, powtorzenia)
+            except Exception as e:
+                wyniki[skala][nazwa] = {"blad": f"{type(e).__name__}: {e}"}
+            print(f"{skala:8s} {nazwa:26s} {_opis(wyniki[skala][nazwa])}")
+    return wyniki
+
+
+def _opis(pomiar:dict) -> str:
+    if "blad" in pomiar:
+        return f"BŁĄD {pomiar['blad']}"
+    return f"{pomiar['czas_s']:9.4f} s  {pomiar['pamiec_mb']:9.1f} MB"
+
+
+def porownaj(wyniki:dict, baseline:dict, tolerancja:float, tolerancja_pamieci:float) -> list[str]:
+    """Zwraca opisy pomiarów gorszych od punktu odniesienia ponad tolerancję."""
+    regresje = []
+    for skala, pomiary in wyniki.items():
+        for nazwa, pomiar in pomiary.items():
+            wzorzec = baseline.get("wyniki", {}).get(skala, {}).get(nazwa)
+            if wzorzec is None or "blad" in wzorzec:
+                continue
+            if "blad" in pomiar:
+                regresje.append(f"{skala}/{nazwa}: błąd ({pomiar['blad']})")
+                continue
+            if pomiar["czas_s"] > wzorzec["czas_s"] * (1 + tolerancja):
+                regresje.append(f"{skala}/{nazwa}: czas {wzorzec['czas_s']:.4f} -> {pomiar['czas_s']:.4f} s")
+            if pomiar["pamiec_mb"] > wzorzec["pamiec_mb"] * (1 + tolerancja_pamieci):
+                regresje.append(f"{skala}/{nazwa}: pamięć {wzorzec['pamiec_mb']:.1f} -> {pomiar['pamiec_mb']:.1f} MB")
+    return regresje
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--skale", nargs="+", default=["mala", "srednia"], choices=list(SKALE))
+    parser.add_argument("--powtorzenia", type=int, default=3)
+    parser.add_argument("--wynik", help="plik JSON, do którego zapisać wyniki")
+    parser.add_argument("--baseline", help="plik JSON z punktem odniesienia do porównania")
+    parser.add_argument("--tolerancja", type=float, default=0.25, help="dopuszczalny wzrost czasu (ułamek)")
+    parser.add_argument("--tolerancja-pamieci", type=float, default=0.10, help="dopuszczalny wzrost pamięci (ułamek)")
+    args = parser.parse_args(argv)
+
+    wyniki = {
+        "srodowisko": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "matplotlib": matplotlib.__version__,
+            "data": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "wyniki": uruchom(args.skale, args.powtorzenia),
+    }
+    if args.wynik:
+        with open(args.wynik, "w", encoding="utf-8") as f:
+            json.dump(wyniki, f, ensure_ascii=False, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regresje = porownaj(wyniki["wyniki"], baseline, args.tolerancja, args.tolerancja_pamieci)
+        for r in regresje:
+            print(f"REGRESJA {r}")
+        return 1 if regresje else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,573 @@
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+
+import numpy as np
 import pandas as pd
 
-def srednie_miesieczne(df:pd.DataFrame) -> pd.DataFrame:
+from instrumentacja import etap
+from magazyn import MagazynPM25, ZbiorDyskowy
+
+def przygotuj_dane(df) -> pd.DataFrame:
+    """
+    Jednorazowo przygotowuje dane pomiarowe do analizy.
+
+    Wartości są zamieniane na liczby (float32, NaN dla niepoprawnych),
+    tak aby kolejne funkcje z tego modułu nie musiały przy każdym
+    wywołaniu kopiować danych ani wywoływać pd.to_numeric.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame albo MagazynPM25
+        Gotowe dane z funkcji df_gotowy.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame z wartościami zmiennoprzecinkowymi, z tym samym
+        indeksem czasowym i kolumnami (Kod stacji, Miejscowość).
+    """
+    if isinstance(df, MagazynPM25):
+        return df.do_dataframe()
+    if _czy_liczbowy(df):
+        return df
+    return df.apply(pd.to_numeric, errors="coerce").astype("float32")
+
+def _czy_liczbowy(df:pd.DataFrame) -> bool:
+    return all(pd.api.types.is_float_dtype(t) for t in df.dtypes)
+
+def _czy_rzadki(df:pd.DataFrame) -> bool:
+    return any(isinstance(t, pd.SparseDtype) for t in df.dtypes)
+
+def jako_liczby(df) -> pd.DataFrame:
+    """
+    Zwraca dane jako DataFrame liczbowy, bez kopiowania, jeśli już jest przygotowany.
+
+    W przeciwieństwie do przygotuj_dane nie zmienia typu kolumn, które
+    już są zmiennoprzecinkowe; wartości niepoprawne zamieniane są na NaN.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame albo MagazynPM25
+        Dane z funkcji df_gotowy (lub ich wycinek).
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame z wartościami zmiennoprzecinkowymi.
+    """
+    if isinstance(df, MagazynPM25):
+        return df.do_dataframe()
+    if _czy_liczbowy(df):
+        return df
+    return df.apply(pd.to_numeric, errors="coerce")
+
+def macierz_indeks_kolumny(dane) -> tuple[np.ndarray, pd.DatetimeIndex, pd.Index]:
+    """
+    Rozkłada dane na macierz wartości, indeks czasowy i kolumny.
+
+    Dla MagazynPM25 macierz jest zwracana bez kopiowania.
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame albo MagazynPM25
+        Gotowe dane z funkcji df_gotowy (z indeksem czasowym).
+
+    Returns
+    -------
+    tuple
+        Macierz wartości (godziny × stacje), pandas.DatetimeIndex
+        i kolumny (Kod stacji, Miejscowość).
+    """
+    if isinstance(dane, MagazynPM25):
+        return dane.wartosci, dane.indeks, dane.kolumny
+    df = jako_liczby(dane)
+    return df.to_numpy(), pd.DatetimeIndex(df.index), df.columns
+
+class Agregaty:
+    """
+    Silnik agregacji danych godzinowych PM2.5.
+
+    W jednym przejściu po macierzy godzinowej liczone są sumy i liczby
+    poprawnych (nie-NaN) pomiarów dla każdego dnia i każdej stacji.
+    Średnie dobowe, miesięczne i roczne są z nich wyprowadzane na żądanie
+    (np.add.reduceat po kodach okresów) i zapamiętywane, więc obiekt można
+    przekazywać do kolejnych funkcji z tego modułu zamiast DataFrame.
+
+    Parameters
+    ----------
+    dni : numpy.ndarray
+        Rosnące, unikalne kody dni (liczba dni od 1970-01-01), int64.
+    sumy : numpy.ndarray
+        Sumy pomiarów (float64) o kształcie (liczba dni, liczba stacji).
+    liczby : numpy.ndarray
+        Liczby poprawnych pomiarów (int32) o tym samym kształcie.
+    kolumny : pandas.Index
+        Kolumny (Kod stacji, Miejscowość) odpowiadające stacjom.
+    """
+
+    def __init__(self, dni:np.ndarray, sumy:np.ndarray, liczby:np.ndarray, kolumny:pd.Index):
+        self.dni = dni
+        self.sumy = sumy
+        self.liczby = liczby
+        self.kolumny = kolumny
+
+    @classmethod
+    def z_danych(cls, dane, executor=None, blok_stacji:int=None) -> "Agregaty":
+        """
+        Liczy agregaty dobowe w jednym przejściu po danych godzinowych.
+
+        Dla ZbiorDyskowy dane są czytane z dysku rok po roku
+        (zob. z_fragmentow), więc nie muszą mieścić się w pamięci.
+
+        Parameters
+        ----------
+        dane : pandas.DataFrame, MagazynPM25 albo ZbiorDyskowy
+            Gotowe dane z funkcji df_gotowy (z indeksem czasowym).
+        executor : concurrent.futures.Executor albo int, optional
+            Jeśli podany, stacje są dzielone na bloki liczone równolegle
+            (liczba oznacza pulę wątków o takim rozmiarze). Obliczenia NumPy
+            zwalniają GIL, więc wystarcza pula wątków. Kolejność wyników
+            nie zależy od liczby wątków.
+        blok_stacji : int, optional
+            Liczba stacji w jednym bloku. Domyślnie dobierana do liczby
+            wątków, gdy executor podano jako liczbę, a w przeciwnym razie
+            do liczby rdzeni (os.cpu_count()).
+
+        Returns
+        -------
+        Agregaty
+            Obiekt z sumami i liczbami pomiarów dla każdego dnia i stacji.
+        """
+        watki = executor if isinstance(executor, int) else None
+        executor, zamknij = _executor(executor)
+        try:
+            if isinstance(dane, ZbiorDyskowy):
+                # etap "agregacja" jest mierzony dla każdego roku osobno (z_fragmentow -> z_danych)
+                return cls.z_fragmentow((df for _, df in dane.fragmenty()), blok_stacji=blok_stacji,
+                                        executor=executor)
+            with etap("agregacja") as e:
+                if isinstance(dane, pd.DataFrame) and _czy_rzadki(dane):
+                    return cls._z_danych_rzadkich(dane, executor, blok_stacji)
+                wartosci, indeks, kolumny = macierz_indeks_kolumny(dane)
+                e.dodaj(wiersze=wartosci.shape[0], komorki=wartosci.size)
+                dni, sumy, liczby = _sumy_dobowe(wartosci, indeks, executor, blok_stacji, watki)
+                return cls(dni, sumy, liczby, kolumny)
+        finally:
+            if zamknij:
+                executor.shutdown()
+
+    @classmethod
+    def _z_danych_rzadkich(cls, df:pd.DataFrame, executor=None, blok:int=None) -> "Agregaty":
+        """
+        Agregaty dla kolumn rzadkich: gęsta macierz powstaje tylko dla bloku
+        stacji naraz (domyślnie 64). Z executorem bloki są liczone równolegle,
+        więc w pamięci jest naraz po jednym gęstym bloku na wątek.
+        """
+        indeks = pd.DatetimeIndex(df.index)
+        blok = blok or 64
+
+        def policz(a):
+            wartosci = np.column_stack([
+                df.iloc[:, j].to_numpy(dtype=np.float32, na_value=np.nan)
+                for j in range(a, min(a + blok, df.shape[1]))])
+            return _sumy_dobowe(wartosci, indeks)
+
+        poczatki = range(0, df.shape[1], blok)
+        czesci = list(map(policz, poczatki) if executor is None else executor.map(policz, poczatki))
+        dni = czesci[0][0]
+        return cls(dni, np.hstack([c[1] for c in czesci]), np.hstack([c[2] for c in czesci]), df.columns)
+
+    @classmethod
+    def z_fragmentow(cls, fragmenty, blok_stacji:int=None, executor=None) -> "Agregaty":
+        """
+        Liczy agregaty strumieniowo, fragment po fragmencie.
+
+        Dla każdego fragmentu (np. roku danych czytanego z dysku) liczone są
+        sumy i liczby pomiarów dobowych, które następnie są łączone
+        (Agregaty.polacz). Wynik jest taki sam jak dla całych danych,
+        a w pamięci jest naraz tylko jeden fragment (i jeden blok stacji).
+
+        Parameters
+        ----------
+        fragmenty : iterable of pandas.DataFrame
+            Kolejne fragmenty danych godzinowych z tymi samymi kolumnami.
+        blok_stacji : int, optional
+            Jeśli podany, każdy fragment jest dodatkowo przetwarzany
+            blokami po tyle stacji.
+        executor : concurrent.futures.Executor albo int, optional
+            Pula, w której liczone są bloki stacji (jak w z_danych).
+
+        Returns
+        -------
+        Agregaty
+            Agregaty dla wszystkich fragmentów razem.
+        """
+        executor, zamknij = _executor(executor)
+        czesci = []
+        try:
+            for df in fragmenty:
+                if executor is not None:
+                    czesci.append(cls.z_danych(df, executor=executor, blok_stacji=blok_stacji))
+                    continue
+                if blok_stacji is None or blok_stacji >= df.shape[1]:
+                    czesci.append(cls.z_danych(df))
+                    continue
+                bloki = [cls.z_danych(df.iloc[:, a:a + blok_stacji]) for a in range(0, df.shape[1], blok_stacji)]
+                czesci.append(cls(bloki[0].dni, np.hstack([b.sumy for b in bloki]),
+                                  np.hstack([b.liczby for b in bloki]), df.columns))
+        finally:
+            if zamknij:
+                executor.shutdown()
+        return cls.polacz(czesci)
+
+    @classmethod
+    def polacz(cls, czesci:list["Agregaty"]) -> "Agregaty":
+        """
+        Łączy agregaty policzone dla fragmentów danych (np. kolejnych lat).
+
+        Sumy i liczby pomiarów dla dni występujących w kilku fragmentach
+        są dodawane, więc wynik jest taki sam jak dla całych danych.
+        Wszystkie fragmenty muszą mieć te same kolumny.
+        """
+        dni = np.concatenate([c.dni for c in czesci])
+        kolejnosc = np.argsort(dni, kind="stable")
+        dni = dni[kolejnosc]
+        sumy = np.concatenate([c.sumy for c in czesci])[kolejnosc]
+        liczby = np.concatenate([c.liczby for c in czesci])[kolejnosc]
+        if len(dni) and (dni[1:] == dni[:-1]).any():
+            poczatki = np.flatnonzero(np.r_[True, dni[1:] != dni[:-1]])
+            dni = dni[poczatki]
+            sumy = np.add.reduceat(sumy, poczatki, axis=0)
+            liczby = np.add.reduceat(liczby, poczatki, axis=0)
+        return cls(dni, sumy, liczby, czesci[0].kolumny)
+
+    def podmien(self, nowe:"Agregaty") -> "Agregaty":
+        """Zwraca agregaty, w których dni obecne w `nowe` zastępują dotychczasowe."""
+        zostaja = ~np.isin(self.dni, nowe.dni)
+        return Agregaty.polacz([self.wybierz_dni(zostaja), nowe])
+
+    def wybierz_dni(self, maska:np.ndarray) -> "Agregaty":
+        """Zwraca agregaty ograniczone do dni wskazanych maską logiczną."""
+        return Agregaty(self.dni[maska], self.sumy[maska], self.liczby[maska], self.kolumny)
+
+    def _okresy(self, kody:np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sumuje agregaty dobowe w okresach o podanych (rosnących) kodach."""
+        poczatki = np.flatnonzero(np.r_[True, kody[1:] != kody[:-1]]) if len(kody) else np.array([], dtype=int)
+        if len(poczatki) == 0:
+            return kody[:0], self.sumy[:0], self.liczby[:0]
+        return (kody[poczatki],
+                np.add.reduceat(self.sumy, poczatki, axis=0),
+                np.add.reduceat(self.liczby, poczatki, axis=0))
+
+    @cached_property
+    def _miesiace(self) -> np.ndarray:
+        return self.dni.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+    def _ramka(self, sumy:np.ndarray, liczby:np.ndarray, indeks:pd.Index) -> pd.DataFrame:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            srednie = sumy / liczby
+        return pd.DataFrame(srednie, index=indeks, columns=self.kolumny)
+
+    # Ramki wyników są zapamiętywane, a na zewnątrz zwracane są ich kopie,
+    # tak aby zmiana wyniku przez wywołującego nie psuła kolejnych wyników.
+
+    @property
+    def srednie_dzienne(self) -> pd.DataFrame:
+        """Średnie dobowe z indeksem (Rok, Miesiąc, Dzień)."""
+        return self._srednie_dzienne.copy()
+
+    @cached_property
+    def _srednie_dzienne(self) -> pd.DataFrame:
+        daty = pd.DatetimeIndex(self.dni.astype("datetime64[D]"))
+        indeks = pd.MultiIndex.from_arrays([daty.year, daty.month, daty.day], names=['Rok','Miesiąc','Dzień'])
+        return self._ramka(self.sumy, self.liczby, indeks)
+
+    @cached_property
+    def _agregaty_miesieczne(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self._okresy(self._miesiace)
+
+    @property
+    def srednie_miesieczne(self) -> pd.DataFrame:
+        """Średnie miesięczne z indeksem (Rok, Miesiąc), jak w funkcji srednie_miesieczne."""
+        return self._srednie_miesieczne.copy()
+
+    @cached_property
+    def _srednie_miesieczne(self) -> pd.DataFrame:
+        miesiace, sumy, liczby = self._agregaty_miesieczne
+        indeks = pd.MultiIndex.from_arrays([miesiace // 12 + 1970, miesiace % 12 + 1], names=['Rok','Miesiąc'])
+        return self._ramka(sumy, liczby, indeks)
+
+    @property
+    def godziny_miesiecznie(self) -> pd.DataFrame:
+        """Liczba poprawnych pomiarów godzinowych w miesiącu, z indeksem (Rok, Miesiąc)."""
+        return self._godziny_miesiecznie.copy()
+
+    @cached_property
+    def _godziny_miesiecznie(self) -> pd.DataFrame:
+        miesiace, _, liczby = self._agregaty_miesieczne
+        indeks = pd.MultiIndex.from_arrays([miesiace // 12 + 1970, miesiace % 12 + 1], names=['Rok','Miesiąc'])
+        return pd.DataFrame(liczby, index=indeks, columns=self.kolumny)
+
+    @cached_property
+    def _lata(self) -> np.ndarray:
+        return self._miesiace // 12 + 1970
+
+    @property
+    def lata(self) -> list[int]:
+        """Lata (rosnąco), z których pochodzą dni w agregatach."""
+        return [int(r) for r in np.unique(self._lata)]
+
+    def przekroczenia(self, normy:list[float], lata:list[int]) -> np.ndarray:
+        """
+        Zlicza dni, w których średnia dobowa przekroczyła każdą z norm.
+
+        Wszystkie normy są porównywane jednocześnie z całą macierzą średnich
+        dobowych, a wyniki sumowane w latach przez np.add.reduceat.
+
+        Parameters
+        ----------
+        normy : list of float
+            Progi dobowe PM2.5.
+        lata : list of int
+            Lata, dla których zwracane są wyniki (lata bez danych dają 0).
+
+        Returns
+        -------
+        numpy.ndarray
+            Tablica int64 o kształcie (len(lata), len(normy), liczba stacji).
+        """
+        normy = np.asarray(normy, dtype=np.float64)
+        wynik = np.zeros((len(lata), len(normy), len(self.kolumny)), dtype=np.int64)
+        if len(self.dni) == 0:
+            return wynik
+        with np.errstate(invalid="ignore", divide="ignore"):
+            dobowe = self.sumy / self.liczby
+        # NaN > norma daje False, więc dni bez pomiarów nie są liczone
+        ponad = (dobowe[None, :, :] > normy[:, None, None]).view(np.uint8)
+        poczatki = np.flatnonzero(np.r_[True, self._lata[1:] != self._lata[:-1]])
+        roczne = np.add.reduceat(ponad, poczatki, axis=1, dtype=np.int64)
+        pozycje = pd.Index(self._lata[poczatki]).get_indexer(lata)
+        znalezione = pozycje >= 0
+        wynik[znalezione] = roczne[:, pozycje[znalezione], :].transpose(1, 0, 2)
+        return wynik
+
+    @property
+    def statystyki_roczne(self) -> pd.DataFrame:
+        """
+        Statystyki roczne dla każdej stacji, z indeksem (Rok, Statystyka):
+        'średnia' (ze wszystkich pomiarów godzinowych), 'godziny' (liczba
+        poprawnych pomiarów), 'dni' (liczba dni z co najmniej jednym pomiarem)
+        i 'max dobowa' (największa średnia dobowa).
+        """
+        return self._statystyki_roczne.copy()
+
+    @cached_property
+    def _statystyki_roczne(self) -> pd.DataFrame:
+        lata, sumy, liczby = self._okresy(self._lata)
+        poczatki = np.searchsorted(self._lata, lata)
+        dni_z_danymi = np.add.reduceat(self.liczby > 0, poczatki, axis=0) if len(lata) else liczby
+        dobowe = self._srednie_dzienne.to_numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            srednie = sumy / liczby
+            maks = np.fmax.reduceat(dobowe, poczatki, axis=0) if len(lata) else srednie
+        bloki = {'średnia': srednie, 'godziny': liczby, 'dni': dni_z_danymi, 'max dobowa': maks}
+        wynik = pd.concat(
+            {nazwa: pd.DataFrame(blok, index=pd.Index(lata, name='Rok'), columns=self.kolumny)
+             for nazwa, blok in bloki.items()},
+            names=['Statystyka'])
+        return wynik.swaplevel().sort_index(level='Rok', sort_remaining=False)
+
+def _sumy_dobowe(wartosci:np.ndarray, indeks:pd.DatetimeIndex, executor=None,
+                 blok_stacji:int=None, watki:int=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Jedno przejście po macierzy godzinowej: sumy i liczby pomiarów dla każdego dnia.
+
+    Z podanym executorem kolumny (stacje) są dzielone na bloki liczone
+    równolegle; wyniki są sklejane w kolejności bloków. Bez podanego
+    `blok_stacji` na każdy z `watki` wątków (domyślnie liczba rdzeni)
+    przypadają około 4 bloki. Powtórzona godzina jest liczona raz
+    (zostaje ostatni wiersz, jak w ZbiorPrzyrostowy.dopisz), niezależnie
+    od tego, czy kolumny są gęste, czy rzadkie.
+    """
+    dni = indeks.values.astype("datetime64[D]").astype(np.int64)
+    poprawne = ~indeks.isna()
+    if indeks.has_duplicates:
+        poprawne &= ~indeks.duplicated(keep="last")
+    wiersze = None
+    if not poprawne.all():
+        wiersze, dni = np.flatnonzero(poprawne), dni[poprawne]
+    if len(dni) and not (np.diff(dni) >= 0).all():
+        kolejnosc = np.argsort(dni, kind="stable")
+        wiersze = kolejnosc if wiersze is None else wiersze[kolejnosc]
+        dni = dni[kolejnosc]
+    if len(dni) == 0:
+        return dni, np.zeros((0, wartosci.shape[1])), np.zeros((0, wartosci.shape[1]), dtype=np.int32)
+    poczatki = np.flatnonzero(np.r_[True, dni[1:] != dni[:-1]])
+
+    if executor is None:
+        sumy, liczby = _redukuj_dni(wartosci, wiersze, poczatki)
+        return dni[poczatki], sumy, liczby
+    n = wartosci.shape[1]
+    blok = blok_stacji or max(1, -(-n // (4 * (watki or os.cpu_count() or 1))))
+    bloki = [wartosci[:, a:a + blok] for a in range(0, n, blok)]
+    wyniki = list(executor.map(_redukuj_dni, bloki, [wiersze] * len(bloki), [poczatki] * len(bloki)))
+    return (dni[poczatki],
+            np.hstack([w[0] for w in wyniki]),
+            np.hstack([w[1] for w in wyniki]))
+
+def _redukuj_dni(wartosci:np.ndarray, wiersze:np.ndarray, poczatki:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Sumy i liczby poprawnych pomiarów w dniach zaczynających się w wierszach `poczatki`."""
+    if wiersze is not None:
+        wartosci = wartosci[wiersze]
+    brak = np.isnan(wartosci)
+    sumy = np.add.reduceat(np.where(brak, 0, wartosci), poczatki, axis=0, dtype=np.float64)
+    # sumowanie bajtów jest wielokrotnie szybsze niż bool -> int64
+    liczby = np.add.reduceat((~brak).view(np.uint8), poczatki, axis=0, dtype=np.int32)
+    return sumy, liczby
+
+def _executor(executor):
+    """Zamienia liczbę wątków na ThreadPoolExecutor (zwracając też, czy trzeba go zamknąć)."""
+    if isinstance(executor, int):
+        return ThreadPoolExecutor(max_workers=executor), True
+    return executor, False
+
+class IndeksMiast:
+    """
+    Indeks miejscowość -> kolumny stacji w układzie CSR.
+
+    Pozycje kolumn są uporządkowane według miejscowości, a tablica
+    przesunięć wskazuje, gdzie zaczyna się blok każdej z nich, więc
+    kolumny jednej miejscowości to wycinek tablicy pozycji, a średnie
+    dla wszystkich miejscowości liczy jedno np.add.reduceat.
+    Kolumny bez miejscowości (NaN) są pomijane.
+
+    Parameters
+    ----------
+    kolumny : pandas.MultiIndex
+        Kolumny (Kod stacji, Miejscowość).
+
+    Attributes
+    ----------
+    miasta : pandas.Index
+        Posortowane nazwy miejscowości.
+    przesuniecia : numpy.ndarray
+        Tablica int64 o długości len(miasta) + 1; kolumny miejscowości nr i
+        to pozycje[przesuniecia[i]:przesuniecia[i + 1]].
+    pozycje : numpy.ndarray
+        Pozycje kolumn (int64) uporządkowane według miejscowości.
+    """
+
+    def __init__(self, kolumny:pd.Index):
+        numery, miasta = pd.factorize(kolumny.get_level_values("Miejscowość"), sort=True)
+        znane = np.flatnonzero(numery >= 0)
+        self.miasta = pd.Index(miasta, name="Miejscowość")
+        self.pozycje = znane[np.argsort(numery[znane], kind="stable")]
+        self.przesuniecia = np.r_[0, np.cumsum(np.bincount(numery[znane], minlength=len(miasta)))]
+        self._numery = dict(zip(miasta, range(len(miasta))))
+
+    def kolumny_miasta(self, miasto:str) -> np.ndarray:
+        """Pozycje kolumn stacji w miejscowości (pusta tablica dla nieznanej)."""
+        nr = self._numery.get(miasto)
+        if nr is None:
+            return self.pozycje[:0]
+        return self.pozycje[self.przesuniecia[nr]:self.przesuniecia[nr + 1]]
+
+    def srednie(self, wartosci:np.ndarray) -> np.ndarray:
+        """
+        Średnie (z pominięciem NaN) po stacjach każdej miejscowości.
+
+        Parameters
+        ----------
+        wartosci : numpy.ndarray
+            Macierz (wiersze × kolumny) zgodna z kolumnami indeksu.
+
+        Returns
+        -------
+        numpy.ndarray
+            Macierz float64 (wiersze × miasta).
+        """
+        if len(self.miasta) == 0:
+            return np.empty((wartosci.shape[0], 0))
+        uporzadkowane = wartosci[:, self.pozycje]
+        brak = np.isnan(uporzadkowane)
+        sumy = np.add.reduceat(np.where(brak, 0, uporzadkowane), self.przesuniecia[:-1], axis=1, dtype=np.float64)
+        liczby = np.add.reduceat((~brak).view(np.uint8), self.przesuniecia[:-1], axis=1, dtype=np.int32)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sumy / liczby
+
+_INDEKSY_MIAST = {}
+
+def indeks_miast(kolumny:pd.Index) -> IndeksMiast:
+    """
+    Zwraca IndeksMiast dla kolumn, budując go tylko raz.
+
+    Indeks jest zapamiętywany dla danego obiektu kolumn (dopóki ten
+    obiekt istnieje); obiekty pandas.Index są niezmienne, więc kolejne
+    wywołania dla tego samego DataFrame nie przeglądają kolumn ponownie.
+    """
+    klucz = id(kolumny)
+    wpis = _INDEKSY_MIAST.get(klucz)
+    if wpis is not None and wpis[0]() is kolumny:
+        return wpis[1]
+    indeks = IndeksMiast(kolumny)
+    _INDEKSY_MIAST[klucz] = (weakref.ref(kolumny), indeks)
+    weakref.finalize(kolumny, _INDEKSY_MIAST.pop, klucz, None)
+    return indeks
+
+def pokrycie_stacji(dane) -> pd.DataFrame:
+    """
+    Oblicza pokrycie danymi każdej stacji w poszczególnych latach.
+
+    Pokrycie to udział godzin z poprawnym pomiarem wśród wszystkich
+    godzin roku. Przydatne szczególnie dla wyniku
+    df_gotowy(..., stacje="wszystkie"), w którym stacje nie muszą
+    działać przez cały okres.
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame, MagazynPM25 albo Agregaty
+        Gotowe dane z funkcji df_gotowy (lub ich agregaty).
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame z indeksem 'Rok' i kolumnami (Kod stacji, Miejscowość),
+        z wartościami od 0 do 1.
+    """
+    agregaty = dane if isinstance(dane, Agregaty) else Agregaty.z_danych(dane)
+    godziny = agregaty._statystyki_roczne.xs('godziny', level='Statystyka')
+    lata = godziny.index.to_numpy()
+    przestepne = (lata % 4 == 0) & ((lata % 100 != 0) | (lata % 400 == 0))
+    return godziny.div(np.where(przestepne, 8784, 8760), axis=0)
+
+def agreguj_fragmentami(zrodlo, blok_stacji:int=None, executor=None) -> Agregaty:
+    """
+    Liczy agregaty dla danych, które nie mieszczą się w pamięci.
+
+    Parameters
+    ----------
+    zrodlo : ZbiorDyskowy albo iterable of pandas.DataFrame
+        Zbiór z funkcji wczytaj_zbior (czytany rok po roku) albo dowolny
+        ciąg fragmentów danych godzinowych z tymi samymi kolumnami.
+    blok_stacji : int, optional
+        Liczba stacji przetwarzanych naraz w obrębie fragmentu
+        (ogranicza szczytowe zużycie pamięci).
+    executor : concurrent.futures.Executor albo int, optional
+        Pula (lub liczba wątków), w której bloki stacji są liczone równolegle.
+
+    Returns
+    -------
+    Agregaty
+        Agregaty, które można przekazać do srednie_miesieczne,
+        dni_przekroczenia_normy i pozostałych funkcji tego modułu.
+    """
+    if isinstance(zrodlo, ZbiorDyskowy):
+        zrodlo = (df for _, df in zrodlo.fragmenty())
+    return Agregaty.z_fragmentow(zrodlo, blok_stacji=blok_stacji, executor=executor)
+
+def srednie_miesieczne(df, executor=None) -> pd.DataFrame:
     """
     Oblicza średnie miesięczne stężenia PM2.5 dla każdej stacji pomiarowej.
 
@@ -17,7 +584,12 @@ def srednie_miesieczne(df:pd.DataFrame) -> pd.DataFrame:
     df : pandas.DataFrame
         Gotowy DataFrame z danymi pomiarowymi PM2.5,
         z indeksem czasowym oraz kolumnami w postaci MultiIndex
-        (Kod stacji, Miejscowość).
+        (Kod stacji, Miejscowość). Może to być też wynik funkcji
+        przygotuj_dane albo MagazynPM25 - wtedy dane nie są ponownie
+        konwertowane - lub obiekt Agregaty z już policzonymi sumami.
+    executor : concurrent.futures.Executor albo int, optional
+        Pula (lub liczba wątków), w której stacje są liczone blokami
+        równolegle (zob. Agregaty.z_danych).
 
     Returns
     -------
@@ -25,12 +597,8 @@ def srednie_miesieczne(df:pd.DataFrame) -> pd.DataFrame:
         DataFrame zawierający średnie miesięczne wartości PM2.5
         dla każdej stacji i miejscowości.
     """
-    df_pomiary = df.copy()
-    df_pomiary = df_pomiary.apply(pd.to_numeric, errors="coerce")
-    
-    miesieczne_srednie = df_pomiary.groupby([df_pomiary.index.year, df_pomiary.index.month]).mean()
-    miesieczne_srednie.index.names = ['Rok','Miesiąc']
-    return miesieczne_srednie
+    agregaty = df if isinstance(df, Agregaty) else Agregaty.z_danych(df, executor=executor)
+    return agregaty.srednie_miesieczne
 
 def srednie_dla_miast(miesieczne_srednie:pd.DataFrame, miasto:str) -> pd.DataFrame:
     """
@@ -55,7 +623,9 @@ def srednie_dla_miast(miesieczne_srednie:pd.DataFrame, miasto:str) -> pd.DataFra
         w którym indeks stanowią (Rok, Miesiąc),
         a wartościami są średnie PM2.5 dla całej miejscowości.
     """
-    sr_miasto = miesieczne_srednie.loc[:, miesieczne_srednie.columns.get_level_values("Miejscowość") == miasto]
+    # kolumny miasta z indeksu (IndeksMiast) zamiast maski po wszystkich kolumnach
+    pozycje = indeks_miast(miesieczne_srednie.columns).kolumny_miasta(miasto)
+    sr_miasto = miesieczne_srednie.iloc[:, pozycje]
     sr_miasto = sr_miasto.mean(axis=1)
     return sr_miasto 
 
@@ -65,7 +635,8 @@ def srednie_po_stacjach(miesieczne_srednie:pd.DataFrame) -> pd.DataFrame:
 
     Funkcja przyjmuje DataFrame ze średnimi miesięcznymi (wynik funkcji
     srednie_miesieczne) i uśrednia wartości dla stacji należących
-    do tej samej miejscowości.
+    do tej samej miejscowości. Średnie wszystkich miejscowości są liczone
+    jedną operacją na macierzy, według indeksu IndeksMiast.
 
     Parameters
     ----------
@@ -80,9 +651,11 @@ def srednie_po_stacjach(miesieczne_srednie:pd.DataFrame) -> pd.DataFrame:
         a wartości są średnimi PM2.5 dla danej miejscowości
         w poszczególnych miesiącach i latach.
     """
-    return miesieczne_srednie.groupby(level="Miejscowość", axis=1).mean()
+    indeks = indeks_miast(miesieczne_srednie.columns)
+    wartosci = jako_liczby(miesieczne_srednie).to_numpy(dtype=np.float64)
+    return pd.DataFrame(indeks.srednie(wartosci), index=miesieczne_srednie.index, columns=indeks.miasta)
 
-def dni_przekroczenia_normy(df_pomiary:pd.DataFrame, norma_dobowa:float, years:list[int]) -> pd.DataFrame:
+def dni_przekroczenia_normy(df_pomiary, norma_dobowa:float, years:list[int], executor=None) -> pd.DataFrame:
     """
         Zlicza liczbę dni z przekroczeniem dobowej normy PM2.5 dla każdej stacji.
 
@@ -96,12 +669,15 @@ def dni_przekroczenia_normy(df_pomiary:pd.DataFrame, norma_dobowa:float, years:l
         df_pomiary : pandas.DataFrame
             Gotowy DataFrame z danymi pomiarowymi PM2.5,
             z indeksem czasowym oraz kolumnami w postaci MultiIndex
-            (Kod stacji, Miejscowość).
+            (Kod stacji, Miejscowość), wynik funkcji przygotuj_dane,
+            MagazynPM25 albo obiekt Agregaty.
         norma_dobowa : float
             Wartość dobowej normy PM2.5, powyżej której dzień
             uznawany jest za przekroczenie normy.
         years : list of int
             Lista lat, dla których ma zostać wykonane zliczanie przekroczeń.
+        executor : concurrent.futures.Executor albo int, optional
+            Pula (lub liczba wątków) do równoległego liczenia średnich dobowych.
 
         Returns
         -------
@@ -111,32 +687,118 @@ def dni_przekroczenia_normy(df_pomiary:pd.DataFrame, norma_dobowa:float, years:l
             - kolumny to stacje (Kod stacji, Miejscowość),
             - wartości to liczba dni z przekroczeniem normy w danym roku.
         """
-    #wymuszam wartości liczbowe, NaN dla niepoprawnych
-    df_numeric = df_pomiary.apply(pd.to_numeric, errors="coerce")
-    dzienne_srednie = (
-        df_numeric
-        .groupby([df_numeric.index.year, df_numeric.index.month, df_numeric.index.day])
-        .mean(numeric_only=True)
-    )
-    dzienne_srednie.index.names = ['Rok','Miesiąc','Dzień']
+    return dni_przekroczenia_norm(df_pomiary, [norma_dobowa], years, executor).xs(norma_dobowa, level='Norma')
+
+def dni_przekroczenia_norm(df_pomiary, normy:list[float], years:list[int], executor=None) -> pd.DataFrame:
+    """
+        Zlicza dni z przekroczeniem kilku norm dobowych PM2.5 naraz.
+
+        Wersja funkcji dni_przekroczenia_normy dla wielu progów
+        (np. 15, 25, 35 µg/m³): średnie dobowe są porównywane ze wszystkimi
+        normami w jednej operacji wektorowej, bez pętli po latach.
+
+        Parameters
+        ----------
+        df_pomiary : pandas.DataFrame, MagazynPM25 albo Agregaty
+            Gotowe dane z funkcji df_gotowy (lub ich agregaty).
+        normy : list of float
+            Lista norm dobowych PM2.5.
+        years : list of int
+            Lista lat, dla których ma zostać wykonane zliczanie przekroczeń.
+        executor : concurrent.futures.Executor albo int, optional
+            Pula (lub liczba wątków) do równoległego liczenia średnich dobowych.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame typu int64, w którym:
+            - wiersze mają dwupoziomowy indeks (Rok, Norma),
+            - kolumny to stacje (Kod stacji, Miejscowość),
+            - wartości to liczba dni z przekroczeniem danej normy w danym roku.
+        """
+    agregaty = df_pomiary if isinstance(df_pomiary, Agregaty) else Agregaty.z_danych(df_pomiary, executor=executor)
+    wynik = agregaty.przekroczenia(normy, years)
+    indeks = pd.MultiIndex.from_product([years, normy], names=['Rok','Norma'])
+    return pd.DataFrame(wynik.reshape(len(years) * len(normy), -1), index=indeks, columns=agregaty.kolumny)
+
+
+def _najwieksze(klucze:np.ndarray, ile:int) -> np.ndarray:
+    """
+    Pozycje `ile` największych wartości w każdym wierszu macierzy, malejąco.
+
+    Kandydaci są wybierani częściowym podziałem (np.partition), a sortowani
+    są tylko oni; przy remisach pierwsza jest wcześniejsza kolumna.
+    """
+    wiersze, n = klucze.shape
+    if ile == 0 or wiersze == 0:
+        return np.empty((wiersze, 0), dtype=np.int64)
+    prog = np.partition(klucze, n - ile, axis=1)[:, n - ile, None]
+    kandydaci = klucze >= prog
+    nr_wiersza, pozycje = np.nonzero(kandydaci)
+    liczby = kandydaci.sum(axis=1)
+    miejsce = np.arange(len(pozycje)) - np.repeat(np.cumsum(liczby) - liczby, liczby)
+    # kandydaci w tablicy wyrównanej do najdłuższego wiersza (z remisami może ich być więcej niż ile)
+    wyrownane_klucze = np.full((wiersze, liczby.max()), -np.inf)
+    wyrownane_pozycje = np.zeros((wiersze, liczby.max()), dtype=np.int64)
+    wyrownane_klucze[nr_wiersza, miejsce] = klucze[nr_wiersza, pozycje]
+    wyrownane_pozycje[nr_wiersza, miejsce] = pozycje
+    kolejnosc = np.argsort(-wyrownane_klucze, axis=1, kind="stable")[:, :ile]
+    return np.take_along_axis(wyrownane_pozycje, kolejnosc, axis=1)
 
-    # Tworzymy DataFrame wynikowy
-    ile_dni = pd.DataFrame(index=years, columns=dzienne_srednie.columns)
+def ranking_stacji(ile_dni_wiecej_normy:pd.DataFrame, ile:int=3) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Wybiera stacje z największą i najmniejszą liczbą dni z przekroczeniem normy
+    dla wszystkich wierszy (lat, albo par (Rok, Norma)) naraz.
+
+    Zamiast sortowania całych wierszy używany jest częściowy wybór
+    (np.partition), więc koszt zależy głównie od liczby stacji, a nie od
+    sortowania. Przy remisach wyżej jest stacja wcześniejsza w kolumnach.
+    Stacje z najmniejszą liczbą dni są wybierane spośród pozostałych,
+    więc obie listy się nie pokrywają (przy małej liczbie stacji lista
+    najmniejszych jest krótsza). Brakujące wartości (NaN) trafiają na koniec
+    obu rankingów.
+
+    Parameters
+    ----------
+    ile_dni_wiecej_normy : pandas.DataFrame
+        Wynik funkcji dni_przekroczenia_normy albo dni_przekroczenia_norm.
+    ile : int, optional
+        Liczba stacji w każdym z rankingów (domyślnie 3).
+
+    Returns
+    -------
+    tuple
+        Krotka (najwiecej, najmniej) dwóch DataFrame z tym samym indeksem
+        wierszy co dane wejściowe i kolumnami 'Miejsce' (1, 2, ...);
+        wartościami są etykiety kolumn stacji (Kod stacji, Miejscowość).
+        W `najwiecej` kolejność jest malejąca, a w `najmniej` rosnąca.
+    """
+    wartosci = ile_dni_wiecej_normy.to_numpy(dtype=np.float64)
+    n = wartosci.shape[1]
+    ile_max = min(ile, n)
+    ile_min = min(ile, n - ile_max)
+    brak = np.isnan(wartosci)
+    # NaN na końcu rankingu, ale przed stacjami wykluczonymi
+    najnizszy = -np.finfo(np.float64).max
 
-    for year in years:
-        if year in dzienne_srednie.index.get_level_values(0):
-            df_year = dzienne_srednie.loc[year]
-            ile_dni.loc[year] = (df_year > norma_dobowa).sum()
-        else:
-            ile_dni.loc[year] = 0 #jesli brak danych 
-    return ile_dni
+    najwiecej = _najwieksze(np.where(brak, najnizszy, wartosci), ile_max)
+    klucze_min = np.where(brak, najnizszy, -wartosci)
+    np.put_along_axis(klucze_min, najwiecej, -np.inf, axis=1)
+    najmniej = _najwieksze(klucze_min, ile_min)
 
+    etykiety = ile_dni_wiecej_normy.columns.to_numpy()
+    def ramka(pozycje):
+        return pd.DataFrame(etykiety[pozycje].reshape(pozycje.shape), index=ile_dni_wiecej_normy.index,
+                            columns=pd.RangeIndex(1, pozycje.shape[1] + 1, name='Miejsce'))
+    return ramka(najwiecej), ramka(najmniej)
 
 def wybierz_stacje_max_min(ile_dni_wiecej_normy:pd.DataFrame, rok:int, ile_maxmin=3) -> (list, pd.DataFrame):
     """
     Wybiera stacje z największą i najmniejszą liczbą dni z przekroczeniem normy.
 
-    Funkcja działa na wyniku funkcji dni_przekroczenia_normy.
+    Funkcja działa na wyniku funkcji dni_przekroczenia_normy. Wybrane
+    stacje się nie powtarzają (zob. ranking_stacji, który zwraca wyniki
+    dla wszystkich lat naraz).
 
     Parameters
     ----------
@@ -155,7 +817,7 @@ def wybierz_stacje_max_min(ile_dni_wiecej_normy:pd.DataFrame, rok:int, ile_maxmi
         - listę wybranych stacji (kody stacji z miejscowością),
         - DataFrame ograniczony do wybranych stacji.
     """
-    max3 = ile_dni_wiecej_normy.loc[rok].sort_values(ascending=False).head(ile_maxmin)
-    min3 = ile_dni_wiecej_normy.loc[rok].sort_values(ascending=False).tail(ile_maxmin)
-    wybrane_stacje = max3.index.tolist() + min3.index.tolist()
+    najwiecej, najmniej = ranking_stacji(ile_dni_wiecej_normy.loc[[rok]], ile_maxmin)
+    # najmniejsze w kolejności malejącej, jak na końcu posortowanego wiersza
+    wybrane_stacje = najwiecej.iloc[0].tolist() + najmniej.iloc[0].tolist()[::-1]
     return wybrane_stacje, ile_dni_wiecej_normy[wybrane_stacje]
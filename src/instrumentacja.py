@@ -0,0 +1,219 @@
+import json
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Zarejestrowane funkcje odbierające pomiary; pusta lista oznacza wyłączoną instrumentację
+_sluchacze = []
+_blokada_sluchaczy = threading.Lock()
+
+
+def dodaj_sluchacza(sluchacz) -> None:
+    """
+    Rejestruje funkcję wywoływaną po każdym zakończonym etapie i zliczeniu.
+
+    Funkcja jest wywoływana jako sluchacz(nazwa, czas_s, liczniki), gdzie
+    czas_s to czas trwania etapu w sekundach (None dla samego zliczenia,
+    np. trafienia w pamięci podręcznej), a liczniki to słownik
+    {nazwa licznika: wartość}, np. {'bajty': 1024, 'wiersze': 8760}.
+    Dla etapów liczniki zawierają też 'szczyt_rss_mb' (szczytowa pamięć
+    procesu na końcu etapu) i 'przyrost_szczytu_rss_mb' (o ile etap ją
+    podniósł), jeśli system je udostępnia.
+    Może być wywoływana z różnych wątków.
+    """
+    with _blokada_sluchaczy:
+        _sluchacze.append(sluchacz)
+
+
+def usun_sluchacza(sluchacz) -> None:
+    """Wyrejestrowuje funkcję dodaną przez dodaj_sluchacza."""
+    with _blokada_sluchaczy:
+        _sluchacze.remove(sluchacz)
+
+
+def wlaczona() -> bool:
+    """Czy jest zarejestrowany choć jeden słuchacz."""
+    return bool(_sluchacze)
+
+
+def _powiadom(nazwa:str, czas_s, liczniki:dict) -> None:
+    for sluchacz in list(_sluchacze):
+        sluchacz(nazwa, czas_s, liczniki)
+
+
+class _Etap:
+    """Pomiar czasu jednego etapu; liczniki można uzupełniać metodą dodaj."""
+
+    __slots__ = ("nazwa", "liczniki", "_start", "_rss")
+
+    def __init__(self, nazwa:str, liczniki:dict):
+        self.nazwa = nazwa
+        self.liczniki = liczniki
+
+    def dodaj(self, **liczniki) -> None:
+        for klucz, wartosc in liczniki.items():
+            self.liczniki[klucz] = self.liczniki.get(klucz, 0) + wartosc
+
+    def __enter__(self):
+        self._rss = szczyt_rss_mb()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *wyjatek):
+        czas_s = time.perf_counter() - self._start
+        rss = szczyt_rss_mb()
+        if rss is not None:
+            # szczyt jest wspólny dla procesu, więc przy etapach w wielu wątkach
+            # przyrost może pochodzić także z innych wątków
+            self.liczniki["szczyt_rss_mb"] = rss
+            self.liczniki["przyrost_szczytu_rss_mb"] = rss - self._rss
+        _powiadom(self.nazwa, czas_s, self.liczniki)
+        return False
+
+
+class _BezPomiaru:
+    """Etap, gdy instrumentacja jest wyłączona - nic nie mierzy."""
+
+    __slots__ = ()
+
+    def dodaj(self, **liczniki) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *wyjatek):
+        return False
+
+
+_BEZ_POMIARU = _BezPomiaru()
+
+
+def etap(nazwa:str, **liczniki):
+    """
+    Menedżer kontekstu mierzący czas etapu potoku.
+
+    Gdy instrumentacja jest wyłączona (brak słuchaczy), zwracany jest
+    jeden wspólny obiekt, który nic nie robi, więc koszt wywołania
+    sprowadza się do sprawdzenia listy słuchaczy.
+
+    Parameters
+    ----------
+    nazwa : str
+        Nazwa etapu, np. "pobieranie", "parsowanie", "agregacja".
+    **liczniki
+        Początkowe wartości liczników (np. wiersze=..., komorki=...);
+        kolejne można dodać metodą dodaj obiektu zwróconego przez with.
+
+    Examples
+    --------
+    >>> with etap("parsowanie") as e:
+    ...     df = wczytaj(...)
+    ...     e.dodaj(wiersze=len(df))
+    """
+    if not _sluchacze:
+        return _BEZ_POMIARU
+    return _Etap(nazwa, dict(liczniki))
+
+
+def zlicz(nazwa:str, ile:int=1) -> None:
+    """Zwiększa licznik zdarzeń `nazwa` (np. "pamiec.trafienie") o `ile`."""
+    if _sluchacze:
+        _powiadom(nazwa, None, {"ile": ile})
+
+
+def szczyt_rss_mb() -> float:
+    """
+    Szczytowa pamięć rezydentna procesu od jego uruchomienia (w MB)
+    albo None, jeśli system jej nie udostępnia.
+    """
+    if resource is None:
+        return None
+    szczyt = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss jest w bajtach na macOS, a w kilobajtach na Linuksie i BSD
+    return szczyt / 2**20 if sys.platform == "darwin" else szczyt / 1024
+
+
+# liczniki etapów łączone przez maksimum zamiast sumy
+_MAKSIMA = {"szczyt_rss_mb", "przyrost_szczytu_rss_mb"}
+
+
+class Profil:
+    """
+    Zbiera pomiary etapów potoku w bloku with i tworzy z nich raport.
+
+    Dla każdego etapu sumowana jest liczba wywołań, łączny czas i liczniki
+    (bajty, wiersze, komórki), a dla zdarzeń zliczanych funkcją zlicz -
+    liczba wystąpień. Liczniki pamięci ('szczyt_rss_mb',
+    'przyrost_szczytu_rss_mb') są największą wartością z wywołań etapu.
+    Etapy wykonywane w procesach potomnych nie są widoczne; są mierzone
+    w całości w procesie głównym.
+
+    Examples
+    --------
+    >>> with Profil() as profil:
+    ...     data = df_gotowy(wczytaj_lata(...), metadane)
+    >>> print(profil.raport())
+    >>> profil.zapisz("profil.json")
+    """
+
+    def __init__(self):
+        self.etapy = {}
+        self.zdarzenia = {}
+        self.czas_s = None
+        self.szczyt_rss_mb = None
+        self._blokada = threading.Lock()
+
+    def __call__(self, nazwa:str, czas_s, liczniki:dict) -> None:
+        with self._blokada:
+            if czas_s is None:
+                self.zdarzenia[nazwa] = self.zdarzenia.get(nazwa, 0) + liczniki.get("ile", 1)
+                return
+            wpis = self.etapy.setdefault(nazwa, {"wywolania": 0, "czas_s": 0.0})
+            wpis["wywolania"] += 1
+            wpis["czas_s"] += czas_s
+            for klucz, wartosc in liczniki.items():
+                if klucz in _MAKSIMA:
+                    wpis[klucz] = max(wpis.get(klucz, wartosc), wartosc)
+                else:
+                    wpis[klucz] = wpis.get(klucz, 0) + wartosc
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        dodaj_sluchacza(self)
+        return self
+
+    def __exit__(self, *wyjatek):
+        usun_sluchacza(self)
+        self.czas_s = time.perf_counter() - self._start
+        self.szczyt_rss_mb = szczyt_rss_mb()
+        return False
+
+    def raport(self) -> dict:
+        """
+        Zwraca raport w postaci słownika (gotowego do zapisu w JSON).
+
+        Returns
+        -------
+        dict
+            Słownik z kluczami 'czas_s' (czas całego bloku), 'szczyt_rss_mb',
+            'etapy' ({nazwa: {'wywolania', 'czas_s', liczniki...}})
+            i 'zdarzenia' ({nazwa: liczba}).
+        """
+        with self._blokada:
+            return {
+                "czas_s": self.czas_s,
+                "szczyt_rss_mb": self.szczyt_rss_mb,
+                "etapy": {nazwa: dict(wpis) for nazwa, wpis in self.etapy.items()},
+                "zdarzenia": dict(self.zdarzenia),
+            }
+
+    def zapisz(self, sciezka:str) -> None:
+        """Zapisuje raport do pliku JSON."""
+        with open(sciezka, "w", encoding="utf-8") as f:
+            json.dump(self.raport(), f, ensure_ascii=False, indent=1)
@@ -0,0 +1,237 @@
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from wczytaj_wyczysc import NS_GODZINA, przesun_indeks
+
+
+@dataclass
+class MagazynPM25:
+    """
+    Zwarta, typowana postać danych godzinowych PM2.5 (wynik df_gotowy).
+
+    Wartości są przechowywane w jednej ciągłej macierzy float32
+    (godziny × stacje) w układzie kolumnowym (Fortran), więc kolumna
+    jednej stacji lub ciągły zakres stacji to widok bez kopiowania.
+    Opis stacji jest trzymany w osobnej tabeli z kolumnami kategorycznymi,
+    a oś czasu jako przesunięcia int32 w godzinach od `poczatek`.
+
+    Attributes
+    ----------
+    wartosci : numpy.ndarray
+        Macierz float32 o kształcie (liczba godzin, liczba stacji).
+    stacje : pandas.DataFrame
+        Tabela z kolumnami 'Kod stacji' i 'Miejscowość' (typ category),
+        jeden wiersz na kolumnę macierzy `wartosci`.
+    poczatek : pandas.Timestamp
+        Pełna godzina, od której liczone są przesunięcia.
+    godziny : numpy.ndarray
+        Przesunięcia int32 (w godzinach) kolejnych wierszy względem `poczatek`.
+    przesuniecie_polnocy : bool
+        Czy przy odtwarzaniu indeksu pomiary z godziny 00 mają być cofnięte
+        o sekundę (jak w przesun_date).
+    """
+    wartosci: np.ndarray
+    stacje: pd.DataFrame
+    poczatek: pd.Timestamp
+    godziny: np.ndarray
+    przesuniecie_polnocy: bool = True
+
+    @classmethod
+    def z_dataframe(cls, df:pd.DataFrame) -> "MagazynPM25":
+        """
+        Tworzy magazyn z DataFrame w postaci zwracanej przez df_gotowy.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            DataFrame z indeksem czasowym (po przesun_date albo bez przesunięcia)
+            i kolumnami MultiIndex (Kod stacji, Miejscowość).
+
+        Returns
+        -------
+        MagazynPM25
+            Magazyn z tymi samymi danymi w postaci float32.
+
+        Raises
+        ------
+        ValueError
+            Jeśli znaczniki czasu nie dają się zapisać jako pełne godziny.
+        """
+        if not all(pd.api.types.is_float_dtype(t) for t in df.dtypes):
+            df = df.apply(pd.to_numeric, errors="coerce")
+        return cls.z_macierzy(df.to_numpy(dtype=np.float32), df.index, df.columns)
+
+    @classmethod
+    def z_macierzy(cls, wartosci:np.ndarray, indeks:pd.Index, kolumny:pd.Index) -> "MagazynPM25":
+        """
+        Tworzy magazyn z gotowej macierzy wartości, indeksu czasowego i kolumn.
+
+        Macierz float32 w układzie kolumnowym (Fortran) jest używana bez
+        kopiowania, dzięki czemu można ją przygotować wcześniej (np. wypełniać
+        rok po roku, jak df_gotowy).
+
+        Parameters
+        ----------
+        wartosci : numpy.ndarray
+            Macierz (godziny × stacje).
+        indeks : pandas.Index
+            Indeks czasowy wierszy (jak w z_dataframe).
+        kolumny : pandas.Index
+            Kolumny MultiIndex (Kod stacji, Miejscowość) albo kody stacji.
+
+        Returns
+        -------
+        MagazynPM25
+            Magazyn z podanymi danymi.
+
+        Raises
+        ------
+        ValueError
+            Jeśli znaczniki czasu nie dają się zapisać jako pełne godziny.
+        """
+        wartosci = np.asfortranarray(wartosci, dtype=np.float32)
+        indeks = pd.DatetimeIndex(indeks).as_unit("ns")
+        if indeks.isna().any():
+            raise ValueError("Indeks czasowy zawiera wartości NaT")
+        # zaokrąglenie w górę do pełnej godziny odwraca przesunięcie północy
+        pelne = -(-indeks.asi8 // NS_GODZINA)
+        start = int(pelne.min()) if len(pelne) else 0
+        odtworzony = pd.DatetimeIndex(pelne * NS_GODZINA, dtype="datetime64[ns]")
+        if (przesun_indeks(odtworzony) == indeks).all():
+            przesuniecie = True
+        elif (odtworzony == indeks).all():
+            przesuniecie = False
+        else:
+            raise ValueError("Indeks czasowy nie składa się z pełnych godzin")
+
+        if isinstance(kolumny, pd.MultiIndex):
+            kody = kolumny.get_level_values(0)
+            miasta = kolumny.get_level_values(1)
+        else:
+            kody, miasta = kolumny, [None] * len(kolumny)
+        stacje = pd.DataFrame({
+            "Kod stacji": pd.Categorical(kody),
+            "Miejscowość": pd.Categorical(miasta),
+        })
+        return cls(
+            wartosci=wartosci,
+            stacje=stacje,
+            poczatek=pd.Timestamp(start * NS_GODZINA),
+            godziny=(pelne - start).astype(np.int32),
+            przesuniecie_polnocy=przesuniecie,
+        )
+
+    @property
+    def indeks(self) -> pd.DatetimeIndex:
+        """Indeks czasowy odtworzony z przesunięć godzinowych."""
+        ns = self.poczatek.value + self.godziny.astype(np.int64) * NS_GODZINA
+        indeks = pd.DatetimeIndex(ns, dtype="datetime64[ns]")
+        return przesun_indeks(indeks) if self.przesuniecie_polnocy else indeks
+
+    @property
+    def kolumny(self) -> pd.MultiIndex:
+        """Kolumny w postaci MultiIndex (Kod stacji, Miejscowość)."""
+        return pd.MultiIndex.from_arrays(
+            [self.stacje["Kod stacji"].astype(object), self.stacje["Miejscowość"].astype(object)],
+            names=("Kod stacji", "Miejscowość"))
+
+    @property
+    def nbytes(self) -> int:
+        """Przybliżony rozmiar danych w pamięci (w bajtach)."""
+        return (self.wartosci.nbytes + self.godziny.nbytes
+                + int(self.stacje.memory_usage(deep=True).sum()))
+
+    def do_dataframe(self) -> pd.DataFrame:
+        """
+        Zwraca dane jako DataFrame float32 w układzie zwracanym przez df_gotowy.
+        Dane nie są kopiowane.
+        """
+        return pd.DataFrame(self.wartosci, index=self.indeks, columns=self.kolumny, copy=False)
+
+    def kolumna(self, kod:str) -> np.ndarray:
+        """Zwraca wartości jednej stacji jako widok (bez kopiowania)."""
+        nr = self.stacje.index[self.stacje["Kod stacji"] == kod]
+        if len(nr) == 0:
+            raise KeyError(kod)
+        return self.wartosci[:, nr[0]]
+
+    def wybierz(self, kody:list[str]) -> "MagazynPM25":
+        """
+        Zwraca magazyn ograniczony do wybranych stacji (w podanej kolejności).
+
+        Jeśli stacje tworzą ciągły, rosnący zakres kolumn, macierz wynikowa
+        jest widokiem na dane bez kopiowania.
+        """
+        pozycje = pd.Index(self.stacje["Kod stacji"].astype(object)).get_indexer(kody)
+        if (pozycje < 0).any():
+            raise KeyError([k for k, p in zip(kody, pozycje) if p < 0])
+        if len(pozycje) and (np.diff(pozycje) == 1).all():
+            wartosci = self.wartosci[:, pozycje[0]:pozycje[-1] + 1]
+        else:
+            wartosci = np.asfortranarray(self.wartosci[:, pozycje])
+        return MagazynPM25(
+            wartosci=wartosci,
+            stacje=self.stacje.iloc[pozycje].reset_index(drop=True),
+            poczatek=self.poczatek,
+            godziny=self.godziny,
+            przesuniecie_polnocy=self.przesuniecie_polnocy,
+        )
+
+
+class ZbiorDyskowy:
+    """
+    Dane godzinowe PM2.5 zapisane na dysku (funkcja zapisz_zbior)
+    i otwierane bez wczytywania do pamięci (numpy.memmap).
+
+    Każdy rok jest osobnym plikiem z macierzą float32 (godziny × stacje)
+    oraz plikiem ze znacznikami czasu int64 (nanosekundy). Kody stacji,
+    miejscowości i lista lat są zapisane w pliku naglowek.json.
+
+    Parameters
+    ----------
+    katalog : str
+        Katalog ze zbiorem zapisanym przez zapisz_zbior.
+    """
+
+    PLIK_NAGLOWKA = "naglowek.json"
+
+    def __init__(self, katalog:str):
+        self.katalog = katalog
+        with open(os.path.join(katalog, self.PLIK_NAGLOWKA), encoding="utf-8") as f:
+            self.naglowek = json.load(f)
+        self.lata = [int(r) for r in self.naglowek["lata"]]
+        self.kolumny = pd.MultiIndex.from_arrays(
+            [self.naglowek["stacje"], self.naglowek["miasta"]], names=("Kod stacji", "Miejscowość"))
+
+    def _sciezka(self, rok:int, rozszerzenie:str) -> str:
+        return os.path.join(self.katalog, f"{rok}.{rozszerzenie}")
+
+    def wartosci(self, rok:int) -> np.ndarray:
+        """Macierz float32 (godziny × stacje) danego roku jako numpy.memmap tylko do odczytu."""
+        wiersze = self.naglowek["wiersze"][str(rok)]
+        if wiersze == 0:
+            return np.empty((0, len(self.kolumny)), dtype=np.float32)
+        return np.memmap(self._sciezka(rok, "f32"), dtype=np.float32, mode="r",
+                         shape=(wiersze, len(self.kolumny)))
+
+    def indeks(self, rok:int) -> pd.DatetimeIndex:
+        """Indeks czasowy danego roku."""
+        ns = np.fromfile(self._sciezka(rok, "czas"), dtype=np.int64)
+        return pd.DatetimeIndex(ns.view("datetime64[ns]"))
+
+    def rok(self, rok:int) -> pd.DataFrame:
+        """Dane jednego roku jako DataFrame opakowujący memmap (bez kopiowania)."""
+        return pd.DataFrame(self.wartosci(rok), index=self.indeks(rok), columns=self.kolumny, copy=False)
+
+    def fragmenty(self):
+        """Generator kolejnych lat w postaci (rok, DataFrame) - dane czytane z dysku na bieżąco."""
+        for r in self.lata:
+            yield r, self.rok(r)
+
+    def do_dataframe(self) -> pd.DataFrame:
+        """Wczytuje cały zbiór do pamięci jako jeden DataFrame float32."""
+        return pd.concat([df for _, df in self.fragmenty()])
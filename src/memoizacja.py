@@ -0,0 +1,259 @@
+import functools
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from analiza import Agregaty
+from instrumentacja import zlicz
+from magazyn import MagazynPM25, ZbiorDyskowy
+from przyrostowe import ZbiorPrzyrostowy
+
+# Liczba wierszy (albo elementów) pobieranych do odcisku danych
+WIERSZE_PROBKI = 32
+
+
+def _skrot(*czesci) -> str:
+    h = hashlib.sha256()
+    for c in czesci:
+        h.update(c if isinstance(c, bytes) else repr(c).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def _probka_ramki(df) -> bytes:
+    """Skróty kilku równomiernie rozłożonych wierszy (zamiast całej zawartości)."""
+    if len(df) == 0:
+        return b""
+    wiersze = np.unique(np.linspace(0, len(df) - 1, min(len(df), WIERSZE_PROBKI)).astype(np.int64))
+    probka = df.iloc[wiersze]
+    if isinstance(probka, pd.DataFrame) and any(isinstance(t, pd.SparseDtype) for t in probka.dtypes):
+        probka = probka.sparse.to_dense()
+    return pd.util.hash_pandas_object(probka, index=True).to_numpy().tobytes()
+
+
+def _probka_macierzy(wartosci:np.ndarray) -> bytes:
+    if wartosci.size == 0:
+        return b""
+    wiersze = np.unique(np.linspace(0, wartosci.shape[0] - 1, min(wartosci.shape[0], WIERSZE_PROBKI)).astype(np.int64))
+    return np.ascontiguousarray(wartosci[wiersze]).tobytes()
+
+
+def odcisk(dane) -> tuple[str, str]:
+    """
+    Tani odcisk zbioru danych: (tożsamość, wersja).
+
+    Odcisk nie przegląda wszystkich danych - składa się z kształtu,
+    granic indeksu czasowego, kolumn, typów, próbki kilkudziesięciu
+    wierszy i jawnej wersji danych (ZbiorPrzyrostowy.wersja albo
+    df.attrs["wersja"]). Zmiana danych w miejscu, która nie zmienia
+    żadnej z tych cech, nie zostanie wykryta.
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame, pandas.Series, MagazynPM25, ZbiorDyskowy, ZbiorPrzyrostowy albo Agregaty
+        Dane wejściowe funkcji analizy.
+
+    Returns
+    -------
+    tuple of str
+        Tożsamość zbioru i jego wersja. Dla ZbiorPrzyrostowy tożsamością
+        jest katalog zbioru, więc po dopisaniu danych zmienia się tylko wersja.
+    """
+    if isinstance(dane, ZbiorPrzyrostowy):
+        return _skrot("przyrostowy", os.path.abspath(dane.katalog)), str(dane.wersja)
+    if isinstance(dane, ZbiorDyskowy):
+        sciezka = os.path.join(dane.katalog, ZbiorDyskowy.PLIK_NAGLOWKA)
+        return _skrot("dyskowy", os.path.abspath(dane.katalog), dane.naglowek), str(os.stat(sciezka).st_mtime_ns)
+    if isinstance(dane, MagazynPM25):
+        godziny = (int(dane.godziny[0]), int(dane.godziny[-1])) if len(dane.godziny) else ()
+        return _skrot("magazyn", dane.wartosci.shape, dane.poczatek, godziny, dane.przesuniecie_polnocy,
+                      dane.stacje.to_numpy().tolist(), _probka_macierzy(dane.wartosci)), ""
+    if isinstance(dane, Agregaty):
+        dni = (int(dane.dni[0]), int(dane.dni[-1])) if len(dane.dni) else ()
+        return _skrot("agregaty", dane.sumy.shape, dni, dane.kolumny.tolist(),
+                      _probka_macierzy(dane.sumy), _probka_macierzy(dane.liczby)), ""
+    if isinstance(dane, (pd.DataFrame, pd.Series)):
+        granice = (dane.index[0], dane.index[-1]) if len(dane) else ()
+        kolumny = dane.columns.tolist() if isinstance(dane, pd.DataFrame) else dane.name
+        typy = dane.dtypes.astype(str).tolist() if isinstance(dane, pd.DataFrame) else str(dane.dtype)
+        return (_skrot("ramka", dane.shape, granice, dane.index.names, kolumny, typy, _probka_ramki(dane)),
+                str(dane.attrs.get("wersja", "")))
+    raise TypeError(f"Nieobsługiwany typ danych: {type(dane).__name__}")
+
+
+class PamiecWynikow:
+    """
+    Pamięć wyników funkcji analizy (memoizacja) z unieważnianiem.
+
+    Kluczem wyniku jest odcisk danych (funkcja odcisk), nazwa funkcji
+    i jej pozostałe argumenty (np. norma, lata). Wyniki są trzymane
+    w pamięci (LRU o ograniczonej liczbie wpisów) i opcjonalnie
+    w katalogu na dysku, dzięki czemu kolejne uruchomienia notatnika
+    czy raportu mogą z nich korzystać.
+
+    Gdy pojawia się nowa wersja zbioru o tej samej tożsamości (np. po
+    ZbiorPrzyrostowy.dopisz), wszystkie wyniki dla starszych wersji są
+    usuwane z pamięci i z dysku.
+
+    Zwracane wyniki są współdzielone między wywołaniami - nie należy
+    ich modyfikować w miejscu.
+
+    Parameters
+    ----------
+    max_wpisow : int, optional
+        Maksymalna liczba wyników w pamięci (domyślnie 128).
+    katalog : str, optional
+        Katalog dyskowej warstwy pamięci. Domyślnie wyniki są tylko w pamięci.
+    pomijane : tuple of str, optional
+        Nazwy argumentów, które nie wpływają na wynik i nie wchodzą do klucza
+        (domyślnie "executor").
+    max_rozmiar : int, optional
+        Maksymalny łączny rozmiar plików warstwy dyskowej w bajtach. Po
+        przekroczeniu usuwane są najdawniej używane wyniki (poza właśnie
+        zapisanym). Domyślnie bez limitu.
+
+    Examples
+    --------
+    >>> wyniki = PamiecWynikow(katalog="cache/wyniki")
+    >>> srednie = wyniki.memoizuj(srednie_miesieczne)
+    >>> srednie(zbior)                  # liczone
+    >>> srednie(zbior)                  # z pamięci
+    >>> zbior.dopisz(nowe, metadane)
+    >>> srednie(zbior)                  # liczone od nowa
+    """
+
+    def __init__(self, max_wpisow:int=128, katalog:str=None, pomijane:tuple=("executor",),
+                 max_rozmiar:int=None):
+        self.max_wpisow = max_wpisow
+        self.katalog = katalog
+        self.max_rozmiar = max_rozmiar
+        self.pomijane = set(pomijane)
+        self.trafienia = 0
+        self.chybienia = 0
+        self._wpisy = OrderedDict()
+        self._wersje = {}
+        self._blokada = threading.RLock()
+        if katalog is not None:
+            os.makedirs(katalog, exist_ok=True)
+
+    def _sciezka(self, tozsamosc:str, wersja:str, klucz:str) -> str:
+        return os.path.join(self.katalog, f"{tozsamosc}_{_skrot(wersja)[:16]}_{klucz}.pkl")
+
+    def _uniewaznij_starsze(self, tozsamosc:str, wersja:str) -> None:
+        """Usuwa wyniki dla innych wersji zbioru o tej tożsamości."""
+        if self._wersje.get(tozsamosc) == wersja:
+            return
+        self._wersje[tozsamosc] = wersja
+        for k in [k for k in self._wpisy if k[0] == tozsamosc and k[1] != wersja]:
+            del self._wpisy[k]
+        if self.katalog is not None:
+            aktualny = f"{tozsamosc}_{_skrot(wersja)[:16]}_"
+            for sciezka in glob.glob(os.path.join(self.katalog, f"{tozsamosc}_*.pkl")):
+                if not os.path.basename(sciezka).startswith(aktualny):
+                    os.remove(sciezka)
+
+    def wywolaj(self, funkcja, dane, *args, **kwargs):
+        """
+        Zwraca wynik funkcja(dane, *args, **kwargs), liczony tylko przy braku w pamięci.
+
+        Dla ZbiorPrzyrostowy funkcja dostaje jego ZbiorDyskowy (atrybut zbior),
+        więc historia nie jest wczytywana do pamięci w całości.
+        Argumenty z listy `pomijane` nie wchodzą do klucza niezależnie od tego,
+        czy zostały podane pozycyjnie, czy po nazwie.
+        """
+        tozsamosc, wersja = odcisk(dane)
+        nazwa = f"{funkcja.__module__}.{funkcja.__qualname__}"
+        klucz = (tozsamosc, wersja, _skrot(nazwa, pickle.dumps(self._parametry(funkcja, dane, args, kwargs))))
+
+        with self._blokada:
+            self._uniewaznij_starsze(tozsamosc, wersja)
+            if klucz in self._wpisy:
+                self._wpisy.move_to_end(klucz)
+                self.trafienia += 1
+                zlicz("memo.trafienie")
+                return self._wpisy[klucz]
+            sciezka = self._sciezka(*klucz) if self.katalog is not None else None
+            if sciezka is not None and os.path.exists(sciezka):
+                wynik = pd.read_pickle(sciezka)
+                os.utime(sciezka)  # czas modyfikacji pliku służy jako czas ostatniego użycia
+                self._zapamietaj(klucz, wynik)
+                self.trafienia += 1
+                zlicz("memo.trafienie")
+                return wynik
+
+        self.chybienia += 1
+        zlicz("memo.chybienie")
+        wynik = funkcja(dane.zbior if isinstance(dane, ZbiorPrzyrostowy) else dane, *args, **kwargs)
+        with self._blokada:
+            self._zapamietaj(klucz, wynik)
+            if sciezka is not None:
+                self._zapisz_na_dysku(sciezka, wynik)
+        return wynik
+
+    def _zapisz_na_dysku(self, sciezka:str, wynik) -> None:
+        # zapis pod nazwą tymczasową i podmiana - przerwany zapis nie zostawia uszkodzonego wpisu
+        tymczasowy = f"{sciezka}.{threading.get_ident()}.tmp"
+        with open(tymczasowy, "wb") as f:
+            pickle.dump(wynik, f)
+        os.replace(tymczasowy, sciezka)
+        self._usun_nadmiar(sciezka)
+
+    def _usun_nadmiar(self, zapisany:str) -> None:
+        """Usuwa z dysku najdawniej używane wyniki, dopóki rozmiar przekracza max_rozmiar."""
+        if self.max_rozmiar is None:
+            return
+        pliki = []
+        for sciezka in glob.glob(os.path.join(self.katalog, "*.pkl")):
+            try:
+                stat = os.stat(sciezka)
+            except FileNotFoundError:
+                continue
+            pliki.append((stat.st_mtime_ns, stat.st_size, sciezka))
+        rozmiar = sum(p[1] for p in pliki)
+        for _, wielkosc, sciezka in sorted(pliki):
+            if rozmiar <= self.max_rozmiar:
+                break
+            if sciezka == zapisany:
+                continue
+            os.remove(sciezka)
+            rozmiar -= wielkosc
+
+    def _parametry(self, funkcja, dane, args:tuple, kwargs:dict) -> list:
+        """Argumenty wywołania (poza danymi i pomijanymi) jako lista par (nazwa, wartość)."""
+        try:
+            sygnatura = inspect.signature(funkcja)
+        except (TypeError, ValueError):
+            return [("*", args)] + sorted((k, v) for k, v in kwargs.items() if k not in self.pomijane)
+        argumenty = sygnatura.bind(dane, *args, **kwargs)
+        argumenty.apply_defaults()
+        pierwszy = next(iter(sygnatura.parameters))
+        return [(k, v) for k, v in argumenty.arguments.items() if k != pierwszy and k not in self.pomijane]
+
+    def _zapamietaj(self, klucz:tuple, wynik) -> None:
+        self._wpisy[klucz] = wynik
+        self._wpisy.move_to_end(klucz)
+        while len(self._wpisy) > self.max_wpisow:
+            self._wpisy.popitem(last=False)
+
+    def memoizuj(self, funkcja):
+        """Zwraca funkcję działającą jak `funkcja`, ale korzystającą z tej pamięci wyników."""
+        @functools.wraps(funkcja)
+        def opakowana(dane, *args, **kwargs):
+            return self.wywolaj(funkcja, dane, *args, **kwargs)
+        return opakowana
+
+    def wyczysc(self) -> None:
+        """Usuwa wszystkie wyniki z pamięci i z katalogu na dysku."""
+        with self._blokada:
+            self._wpisy.clear()
+            self._wersje.clear()
+            if self.katalog is not None:
+                for sciezka in glob.glob(os.path.join(self.katalog, "*.pkl")):
+                    os.remove(sciezka)
@@ -0,0 +1,376 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import Counter, defaultdict
+
+import pandas as pd
+import requests
+
+from instrumentacja import etap, zlicz
+
+
+class PamiecPodreczna:
+    """
+    Lokalna pamięć podręczna (cache) dla archiwów GIOŚ i wczytanych z nich tabel.
+
+    Surowe pliki (archiwa ZIP, plik metadanych) są zapisywane pod nazwą
+    równą skrótowi SHA-256 ich zawartości, a indeks w pliku JSON wiąże
+    identyfikator linku GIOŚ z tym skrótem i nagłówkiem ETag serwera.
+    Wczytane tabele są zapisywane obok, w kluczu (skrót archiwum, nazwa pliku),
+    więc zmiana archiwum na serwerze automatycznie unieważnia tabelę.
+
+    Parameters
+    ----------
+    katalog : str
+        Katalog, w którym przechowywana jest pamięć podręczna.
+    max_rozmiar : int, optional
+        Maksymalny łączny rozmiar plików w bajtach. Po przekroczeniu usuwane
+        są najdawniej używane archiwa razem z wczytanymi z nich tabelami.
+        Domyślnie bez limitu.
+    offline : bool, optional
+        Jeśli True, pamięć nigdy nie korzysta z sieci, a brak wpisu
+        kończy się błędem FileNotFoundError.
+    rewalidacja : bool, optional
+        Jeśli True, przy każdym użyciu wpisu wysyłane jest zapytanie
+        warunkowe (If-None-Match) i dane są pobierane ponownie tylko wtedy,
+        gdy ETag na serwerze się zmienił. Domyślnie ciepła pamięć
+        w ogóle nie łączy się z siecią.
+    session : requests.Session, optional
+        Sesja HTTP używana do pobierania danych.
+
+    Notes
+    -----
+    Nowe i usunięte wpisy są od razu zapisywane w indeksie. Czas ostatniego
+    użycia (dla usuwania najdawniej używanych wpisów) jest przy trafieniach
+    zmieniany tylko w pamięci i trafia na dysk przy najbliższym zapisie
+    indeksu, wywołaniu zapisz() albo przy zamknięciu programu.
+    """
+
+    PLIK_INDEKSU = "indeks.json"
+
+    def __init__(self, katalog:str, max_rozmiar:int=None, offline:bool=False,
+                 rewalidacja:bool=False, session:requests.Session=None):
+        self.katalog = katalog
+        self.max_rozmiar = max_rozmiar
+        self.offline = offline
+        self.rewalidacja = rewalidacja
+        self.session = session
+        # indeks jest współdzielony przez wątki pobierające (wczytaj_lata)
+        self._blokada = threading.RLock()
+        os.makedirs(os.path.join(katalog, "obiekty"), exist_ok=True)
+        os.makedirs(os.path.join(katalog, "tabele"), exist_ok=True)
+        self._indeks = self._wczytaj_indeks()
+        # identyfikatory archiwów, których nie wolno teraz usuwać (zob. przypiete)
+        self._przypiete = Counter()
+        # czasy użycia zmienione od ostatniego zapisu indeksu
+        self._zmieniony = threading.Event()
+        weakref.finalize(self, PamiecPodreczna._zapisz_jesli_zmieniony,
+                         os.path.join(katalog, self.PLIK_INDEKSU), self._indeks, self._zmieniony, self._blokada)
+
+    # --- indeks ---------------------------------------------------------------
+
+    def _wczytaj_indeks(self) -> dict:
+        sciezka = os.path.join(self.katalog, self.PLIK_INDEKSU)
+        if not os.path.exists(sciezka):
+            return {"archiwa": {}, "tabele": {}}
+        with open(sciezka, encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _zapisz_plik_indeksu(sciezka:str, indeks:dict) -> None:
+        tymczasowy = f"{sciezka}.{threading.get_ident()}.tmp"
+        with open(tymczasowy, "w", encoding="utf-8") as f:
+            json.dump(indeks, f, ensure_ascii=False, indent=1)
+        os.replace(tymczasowy, sciezka)
+
+    @staticmethod
+    def _zapisz_jesli_zmieniony(sciezka:str, indeks:dict, zmieniony:threading.Event, blokada) -> None:
+        with blokada:
+            if zmieniony.is_set():
+                PamiecPodreczna._zapisz_plik_indeksu(sciezka, indeks)
+                zmieniony.clear()
+
+    def _zapisz_indeks(self) -> None:
+        with self._blokada:
+            self._zapisz_plik_indeksu(os.path.join(self.katalog, self.PLIK_INDEKSU), self._indeks)
+            self._zmieniony.clear()
+
+    def zapisz(self) -> None:
+        """Zapisuje na dysku czasy użycia wpisów zmienione od ostatniego zapisu indeksu."""
+        self._zapisz_jesli_zmieniony(os.path.join(self.katalog, self.PLIK_INDEKSU), self._indeks,
+                                     self._zmieniony, self._blokada)
+
+    @staticmethod
+    def klucz_tabeli(sha256:str, filename:str, wariant:str=None) -> str:
+        """
+        Zwraca klucz tabeli wczytanej z pliku `filename` w archiwum o skrócie `sha256`.
+        `wariant` odróżnia tabele wczytane z tego samego pliku różnymi funkcjami.
+        """
+        opis = f"{sha256}/{filename}" if wariant is None else f"{sha256}/{filename}#{wariant}"
+        return hashlib.sha256(opis.encode("utf-8")).hexdigest()
+
+    def _sciezka_obiektu(self, sha256:str) -> str:
+        return os.path.join(self.katalog, "obiekty", sha256)
+
+    def _sciezka_tabeli(self, klucz:str) -> str:
+        return os.path.join(self.katalog, "tabele", f"{klucz}.pkl")
+
+    # --- surowe archiwa -------------------------------------------------------
+
+    def _wczytaj_obiekt(self, sha256:str) -> bytes:
+        sciezka = self._sciezka_obiektu(sha256)
+        if not os.path.exists(sciezka):
+            return None
+        with open(sciezka, "rb") as f:
+            zawartosc = f.read()
+        # plik uszkodzony lub podmieniony - traktujemy jak brak wpisu
+        if hashlib.sha256(zawartosc).hexdigest() != sha256:
+            os.remove(sciezka)
+            return None
+        return zawartosc
+
+    def pobierz_archiwum(self, gios_archive_url:str, gios_id:str, session:requests.Session=None) -> bytes:
+        """
+        Zwraca surową zawartość pliku spod adresu `gios_archive_url + gios_id`.
+
+        Plik jest brany z pamięci podręcznej, jeśli jest w niej dostępny
+        (i, przy włączonej rewalidacji, ETag na serwerze się nie zmienił),
+        w przeciwnym razie jest pobierany i zapisywany.
+
+        Parameters
+        ----------
+        gios_archive_url : str
+            Adres URL strony zawierającej archiwa danych GIOŚ.
+        gios_id : str
+            Identyfikator konkretnego linku archiwum na stronie GIOŚ.
+        session : requests.Session, optional
+            Sesja HTTP dla tego pobrania (np. sesja z pulą połączeń
+            z wczytaj_lata). Domyślnie używana jest sesja pamięci.
+
+        Returns
+        -------
+        bytes
+            Zawartość pobranego pliku.
+        """
+        wpis = self._indeks["archiwa"].get(str(gios_id))
+        zawartosc = self._wczytaj_obiekt(wpis["sha256"]) if wpis else None
+
+        if zawartosc is not None and (self.offline or not self.rewalidacja):
+            zlicz("pamiec.archiwum.trafienie")
+            self._oznacz_uzycie(wpis)
+            return zawartosc
+        if self.offline:
+            raise FileNotFoundError(f"Brak archiwum {gios_id} w pamięci podręcznej {self.katalog} (tryb offline)")
+
+        naglowki = {}
+        if zawartosc is not None and wpis.get("etag"):
+            naglowki["If-None-Match"] = wpis["etag"]
+        http = session or self.session or requests
+        with etap("pobieranie") as e:
+            response = http.get(f"{gios_archive_url}{gios_id}", headers=naglowki)
+            e.dodaj(bajty=len(response.content))
+        if response.status_code == 304 and zawartosc is not None:
+            zlicz("pamiec.archiwum.trafienie")
+            self._oznacz_uzycie(wpis)
+            return zawartosc
+        response.raise_for_status()
+        zlicz("pamiec.archiwum.chybienie")
+
+        zawartosc = response.content
+        sha256 = hashlib.sha256(zawartosc).hexdigest()
+        with open(self._sciezka_obiektu(sha256), "wb") as f:
+            f.write(zawartosc)
+        with self._blokada:
+            self._indeks["archiwa"][str(gios_id)] = {
+                "url": f"{gios_archive_url}{gios_id}",
+                "sha256": sha256,
+                "etag": response.headers.get("ETag"),
+                "rozmiar": len(zawartosc),
+                "ostatnie_uzycie": time.time(),
+            }
+            self._zapisz_indeks()
+            self._usun_nadmiar(chroniony=sha256)
+        return zawartosc
+
+    # --- wczytane tabele ------------------------------------------------------
+
+    def pobierz_tabele(self, gios_archive_url:str, gios_id:str, filename:str, wczytaj,
+                       wariant:str=None) -> pd.DataFrame:
+        """
+        Zwraca tabelę wczytaną z archiwum, korzystając z pamięci podręcznej.
+
+        Jeśli dla bieżącej wersji archiwum tabela była już wczytana,
+        zwracana jest ona bez otwierania archiwum (i bez korzystania z sieci).
+        W przeciwnym razie archiwum jest pobierane, przekazywane do funkcji
+        `wczytaj`, a wynik jest zapisywany.
+
+        Parameters
+        ----------
+        gios_archive_url : str
+            Adres URL strony zawierającej archiwa danych GIOŚ.
+        gios_id : str
+            Identyfikator konkretnego linku archiwum na stronie GIOŚ.
+        filename : str
+            Nazwa pliku w archiwum (lub None, gdy plik nie jest archiwum ZIP).
+        wczytaj : callable
+            Funkcja (zawartosc: bytes, filename: str) -> pandas.DataFrame.
+        wariant : str, optional
+            Nazwa wariantu wczytywania (np. "strumieniowo"), gdy ten sam
+            plik może być wczytywany różnymi funkcjami.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Wczytana tabela.
+        """
+        if self.offline or not self.rewalidacja:
+            tabela = self._tabela_z_pamieci(gios_id, filename, wariant)
+            if tabela is not None:
+                zlicz("pamiec.tabela.trafienie")
+                return tabela
+
+        with self.przypiete([gios_id]):
+            zawartosc = self.pobierz_archiwum(gios_archive_url, gios_id)
+            tabela = self._tabela_z_pamieci(gios_id, filename, wariant)
+            if tabela is not None:
+                zlicz("pamiec.tabela.trafienie")
+                return tabela
+            zlicz("pamiec.tabela.chybienie")
+            with etap("parsowanie") as e:
+                tabela = wczytaj(zawartosc, filename)
+                e.dodaj(wiersze=tabela.shape[0], komorki=tabela.size)
+            self.zapisz_tabele(gios_id, filename, tabela, wariant)
+        return tabela
+
+    def tabela_z_pamieci(self, gios_id:str, filename:str, wariant:str=None) -> pd.DataFrame:
+        """
+        Zwraca zapisaną tabelę dla bieżącej wersji archiwum `gios_id`
+        albo None, jeśli jej nie ma. Nigdy nie korzysta z sieci.
+        """
+        tabela = self._tabela_z_pamieci(gios_id, filename, wariant)
+        zlicz("pamiec.tabela.chybienie" if tabela is None else "pamiec.tabela.trafienie")
+        return tabela
+
+    def _tabela_z_pamieci(self, gios_id:str, filename:str, wariant:str=None) -> pd.DataFrame:
+        with self._blokada:
+            wpis = self._indeks["archiwa"].get(str(gios_id))
+            if wpis is None:
+                return None
+            klucz = self.klucz_tabeli(wpis["sha256"], filename, wariant)
+            sciezka = self._sciezka_tabeli(klucz)
+            if not os.path.exists(sciezka):
+                return None
+            for w in (wpis, self._indeks["tabele"].get(klucz)):
+                if w is not None:
+                    w["ostatnie_uzycie"] = time.time()
+            self._zmieniony.set()
+        return pd.read_pickle(sciezka)
+
+    def zapisz_tabele(self, gios_id:str, filename:str, tabela:pd.DataFrame, wariant:str=None) -> None:
+        """Zapisuje tabelę wczytaną z pliku `filename` bieżącej wersji archiwum `gios_id`."""
+        with self._blokada:
+            sha256 = self._indeks["archiwa"][str(gios_id)]["sha256"]
+            klucz = self.klucz_tabeli(sha256, filename, wariant)
+            sciezka = self._sciezka_tabeli(klucz)
+            tabela.to_pickle(sciezka)
+            self._indeks["tabele"][klucz] = {
+                "sha256": sha256,
+                "filename": filename,
+                "rozmiar": os.path.getsize(sciezka),
+                "ostatnie_uzycie": time.time(),
+            }
+            self._zapisz_indeks()
+            self._usun_nadmiar(chroniony=sha256)
+
+    # --- porządki -------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def przypiete(self, gios_ids):
+        """
+        Chroni archiwa `gios_ids` i ich tabele przed usuwaniem do końca bloku with.
+
+        Pozwala pobrać kilka archiwów, a dopiero potem zapisać wczytane
+        z nich tabele (np. w wczytaj_lata), także gdy pamięć jest mniejsza
+        niż cała partia. Nadmiar jest usuwany po wyjściu z bloku.
+        """
+        gios_ids = [str(i) for i in gios_ids]
+        with self._blokada:
+            self._przypiete.update(gios_ids)
+        try:
+            yield self
+        finally:
+            with self._blokada:
+                self._przypiete.subtract(gios_ids)
+                self._przypiete = +self._przypiete
+                self._usun_nadmiar()
+
+    def _oznacz_uzycie(self, wpis:dict) -> None:
+        with self._blokada:
+            wpis["ostatnie_uzycie"] = time.time()
+            self._zmieniony.set()
+
+    def rozmiar(self) -> int:
+        """Zwraca łączny rozmiar plików zapisanych w pamięci podręcznej (w bajtach)."""
+        with self._blokada:
+            archiwa = {w["sha256"]: w["rozmiar"] for w in self._indeks["archiwa"].values()}
+            return sum(archiwa.values()) + sum(w["rozmiar"] for w in self._indeks["tabele"].values())
+
+    def _usun_nadmiar(self, chroniony:str=None) -> None:
+        """
+        Usuwa najdawniej używane archiwa razem z wczytanymi z nich tabelami,
+        dopóki rozmiar przekracza max_rozmiar. Archiwum o skrócie `chroniony`
+        (właśnie zapisane albo to, z którego zapisano tabelę), archiwa
+        przypięte (przypiete) ani ostatnio używane archiwum nie są usuwane.
+        """
+        if self.max_rozmiar is None:
+            return
+        with self._blokada:
+            self._usun_nadmiar_bez_blokady(chroniony)
+
+    def _usun_nadmiar_bez_blokady(self, chroniony:str=None) -> None:
+        archiwa, tabele = self._indeks["archiwa"], self._indeks["tabele"]
+        # archiwum i tabele z niego wczytane są usuwane razem - łączy je skrót zawartości;
+        # tabele bez archiwum (np. po zmianie archiwum na serwerze) tworzą osobne jednostki
+        jednostki = defaultdict(lambda: {"archiwa": [], "tabele": [], "rozmiar": 0, "ostatnie_uzycie": 0.0})
+        for k, w in archiwa.items():
+            j = jednostki[w["sha256"]]
+            if not j["archiwa"]:
+                j["rozmiar"] += w["rozmiar"]  # ta sama zawartość pod kilkoma identyfikatorami to jeden plik
+            j["archiwa"].append(k)
+            j["ostatnie_uzycie"] = max(j["ostatnie_uzycie"], w["ostatnie_uzycie"])
+        for k, w in tabele.items():
+            j = jednostki[w["sha256"]]
+            j["tabele"].append(k)
+            j["rozmiar"] += w["rozmiar"]
+            j["ostatnie_uzycie"] = max(j["ostatnie_uzycie"], w["ostatnie_uzycie"])
+
+        chronione = {archiwa[k]["sha256"] for k in self._przypiete if k in archiwa}
+        chronione.add(chroniony)
+        rozmiar = sum(j["rozmiar"] for j in jednostki.values())
+        usuniete = False
+        # ostatnio używana jednostka zostaje zawsze, nawet gdy sama przekracza limit
+        for sha256, j in sorted(jednostki.items(), key=lambda e: e[1]["ostatnie_uzycie"])[:-1]:
+            if rozmiar <= self.max_rozmiar:
+                break
+            if sha256 in chronione:
+                continue
+            for k in j["archiwa"]:
+                del archiwa[k]
+            if j["archiwa"]:
+                self._usun_plik(self._sciezka_obiektu(sha256))
+            for k in j["tabele"]:
+                del tabele[k]
+                self._usun_plik(self._sciezka_tabeli(k))
+            rozmiar -= j["rozmiar"]
+            usuniete = True
+        if usuniete:
+            self._zapisz_indeks()
+
+    @staticmethod
+    def _usun_plik(sciezka:str) -> None:
+        if os.path.exists(sciezka):
+            os.remove(sciezka)
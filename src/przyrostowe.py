@@ -0,0 +1,222 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from analiza import Agregaty, przygotuj_dane
+from magazyn import ZbiorDyskowy
+from wczytaj_wyczysc import df_gotowy, ujednolic_dane, przesun_date, zapisz_zbior
+
+
+class ZbiorPrzyrostowy:
+    """
+    Zapisany na dysku zbiór danych PM2.5, do którego można dopisywać
+    nowe godziny lub lata bez przeliczania całej historii.
+
+    Dane godzinowe są przechowywane w podkatalogu "dane" w układzie
+    zapisz_zbior (osobne pliki dla każdego roku, czytane przez numpy.memmap),
+    a obok nich agregaty: sumy i liczby pomiarów dobowych (Agregaty), sumy
+    miesięczne oraz liczby dni z przekroczeniem norm w latach. Przy
+    dopisaniu wczytywane i zapisywane są tylko lata, których dotyczą nowe
+    dane, a przeliczane tylko zmienione dni, miesiące i lata.
+
+    Zbiór ma stały zestaw stacji ustalony przy tworzeniu (jak w df_gotowy);
+    stacje brakujące w nowych danych dostają NaN, a nowe stacje są pomijane.
+
+    Parameters
+    ----------
+    katalog : str
+        Katalog, w którym zapisany jest zbiór.
+    normy : list of float
+        Normy dobowe, dla których utrzymywane są liczby przekroczeń.
+    agregaty : Agregaty, optional
+        Agregaty dobowe całego zbioru (domyślnie liczone z danych na dysku).
+    """
+
+    PLIK_STANU = "stan.json"
+    PLIK_AGREGATOW = "agregaty.npz"
+    KATALOG_DANYCH = "dane"
+
+    def __init__(self, katalog:str, normy:list[float]=(15, 25, 35), agregaty:Agregaty=None):
+        self.katalog = katalog
+        self.normy = list(normy)
+        self.wersja = 0
+        self.zbior = ZbiorDyskowy(os.path.join(katalog, self.KATALOG_DANYCH))
+        if agregaty is None:
+            self.agregaty = Agregaty.z_danych(self.zbior)
+            self._miesiace, self._sumy_m, self._liczby_m = self.agregaty._agregaty_miesieczne
+            self._lata = np.array(self.agregaty.lata, dtype=np.int64)
+            self._przekroczenia = self.agregaty.przekroczenia(self.normy, self._lata)
+        else:
+            self.agregaty = agregaty
+
+    @property
+    def kolumny(self) -> pd.Index:
+        """Kolumny (Kod stacji, Miejscowość) zbioru."""
+        return self.zbior.kolumny
+
+    @property
+    def dane(self) -> pd.DataFrame:
+        """
+        Wszystkie dane godzinowe jako jeden DataFrame float32.
+
+        Dane są wczytywane z dysku przy każdym odwołaniu; do pracy na
+        fragmentach służy atrybut zbior (ZbiorDyskowy).
+        """
+        return self.zbior.do_dataframe()
+
+    # --- tworzenie i zapis ----------------------------------------------------
+
+    @classmethod
+    def utworz(cls, katalog:str, raw_df_dict:dict[int,pd.DataFrame], metadane:pd.DataFrame,
+               normy:list[float]=(15, 25, 35)) -> "ZbiorPrzyrostowy":
+        """
+        Tworzy nowy zbiór z surowych danych (jak df_gotowy) i zapisuje go w katalogu.
+
+        Parameters
+        ----------
+        katalog : str
+            Katalog docelowy (tworzony, jeśli nie istnieje).
+        raw_df_dict : dict[int, pandas.DataFrame]
+            Słownik surowych danych w postaci {rok: DataFrame}.
+        metadane : pandas.DataFrame
+            DataFrame z metadanymi stacji pomiarowych.
+        normy : list of float, optional
+            Normy dobowe, dla których utrzymywane są liczby przekroczeń.
+
+        Returns
+        -------
+        ZbiorPrzyrostowy
+            Utworzony zbiór.
+        """
+        zapisz_zbior(przygotuj_dane(df_gotowy(raw_df_dict, metadane)), os.path.join(katalog, cls.KATALOG_DANYCH))
+        zbior = cls(katalog, normy)
+        zbior._zapisz_stan()
+        return zbior
+
+    @classmethod
+    def otworz(cls, katalog:str) -> "ZbiorPrzyrostowy":
+        """Otwiera zbiór zapisany wcześniej w katalogu (bez wczytywania danych i przeliczania agregatów)."""
+        with open(os.path.join(katalog, cls.PLIK_STANU), encoding="utf-8") as f:
+            stan = json.load(f)
+        kolumny = ZbiorDyskowy(os.path.join(katalog, cls.KATALOG_DANYCH)).kolumny
+        with np.load(os.path.join(katalog, cls.PLIK_AGREGATOW)) as a:
+            zbior = cls(katalog, stan["normy"], Agregaty(a["dni"], a["sumy"], a["liczby"], kolumny))
+            zbior._miesiace, zbior._sumy_m, zbior._liczby_m = a["miesiace"], a["sumy_m"], a["liczby_m"]
+            zbior._lata, zbior._przekroczenia = a["lata"], a["przekroczenia"]
+        zbior.wersja = stan["wersja"]
+        return zbior
+
+    def _zapisz_stan(self) -> None:
+        np.savez(os.path.join(self.katalog, self.PLIK_AGREGATOW),
+                 dni=self.agregaty.dni, sumy=self.agregaty.sumy, liczby=self.agregaty.liczby,
+                 miesiace=self._miesiace, sumy_m=self._sumy_m, liczby_m=self._liczby_m,
+                 lata=self._lata, przekroczenia=self._przekroczenia)
+        stan = {"wersja": self.wersja, "normy": self.normy}
+        with open(os.path.join(self.katalog, self.PLIK_STANU), "w", encoding="utf-8") as f:
+            json.dump(stan, f)
+
+    # --- dopisywanie ----------------------------------------------------------
+
+    def _przygotuj_nowe(self, raw_df_dict:dict[int,pd.DataFrame], metadane:pd.DataFrame) -> pd.DataFrame:
+        kody = self.kolumny.get_level_values(0)
+        nowe = []
+        for tabela in raw_df_dict.values():
+            df = przesun_date(ujednolic_dane(tabela, metadane), w_miejscu=True)
+            df = przygotuj_dane(df.loc[:, ~df.columns.duplicated()])
+            df = df.reindex(columns=kody)
+            df.columns = self.kolumny
+            nowe.append(df)
+        nowe = pd.concat(nowe)
+        return nowe[~nowe.index.duplicated(keep="last")]
+
+    def dopisz(self, raw_df_dict:dict[int,pd.DataFrame], metadane:pd.DataFrame) -> dict:
+        """
+        Dopisuje nowe surowe dane i aktualizuje agregaty tylko dla zmienionych okresów.
+
+        Pomiary z datami, które już są w zbiorze, zastępują dotychczasowe.
+
+        Parameters
+        ----------
+        raw_df_dict : dict[int, pandas.DataFrame]
+            Nowe surowe dane w postaci {rok: DataFrame} (np. nowy rok
+            lub nowy miesięczny plik z GIOŚ).
+        metadane : pandas.DataFrame
+            DataFrame z metadanymi stacji pomiarowych.
+
+        Returns
+        -------
+        dict
+            Słownik z listami przeliczonych okresów: 'dni', 'miesiace'
+            (pary (rok, miesiąc)) i 'lata'.
+        """
+        nowe = self._przygotuj_nowe(raw_df_dict, metadane)
+        dni = np.unique(nowe.index.values.astype("datetime64[D]").astype(np.int64))
+
+        # wczytywane i zapisywane są tylko lata, do których trafiły nowe pomiary
+        zmienione = []
+        lata_nowych = nowe.index.year.to_numpy()
+        for rok in np.unique(lata_nowych):
+            nowe_w_roku = nowe[lata_nowych == rok]
+            if rok in self.zbior.lata:
+                stare = self.zbior.rok(int(rok))
+                stare = stare[~stare.index.isin(nowe_w_roku.index)]
+                nowe_w_roku = pd.concat([stare, nowe_w_roku]).sort_index(kind="stable")
+            zmienione.append(nowe_w_roku)
+        zmienione = pd.concat(zmienione)
+        zapisz_zbior(zmienione, self.zbior.katalog, aktualizuj=True)
+        self.zbior = ZbiorDyskowy(self.zbior.katalog)
+
+        # dni, do których trafiły nowe pomiary, są liczone od nowa w całości
+        w_dniach = np.isin(zmienione.index.values.astype("datetime64[D]").astype(np.int64), dni)
+        self.agregaty = self.agregaty.podmien(Agregaty.z_danych(zmienione[w_dniach]))
+
+        miesiace = np.unique(dni.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64))
+        czesc = self.agregaty.wybierz_dni(np.isin(self.agregaty._miesiace, miesiace))
+        m, sumy_m, liczby_m = czesc._agregaty_miesieczne
+        zostaja = ~np.isin(self._miesiace, m)
+        self._miesiace, self._sumy_m, self._liczby_m = _scal(
+            self._miesiace[zostaja], m, self._sumy_m[zostaja], sumy_m, self._liczby_m[zostaja], liczby_m)
+
+        lata = np.unique(miesiace // 12 + 1970)
+        czesc = self.agregaty.wybierz_dni(np.isin(self.agregaty._lata, lata))
+        zostaja = ~np.isin(self._lata, lata)
+        self._lata, self._przekroczenia = _scal(
+            self._lata[zostaja], lata, self._przekroczenia[zostaja], czesc.przekroczenia(self.normy, lata))
+
+        self.wersja += 1
+        self._zapisz_stan()
+        daty = pd.DatetimeIndex(dni.astype("datetime64[D]"))
+        return {
+            "dni": list(daty.date),
+            "miesiace": [(int(k // 12 + 1970), int(k % 12 + 1)) for k in miesiace],
+            "lata": [int(r) for r in lata],
+        }
+
+    # --- wyniki ---------------------------------------------------------------
+
+    @property
+    def srednie_miesieczne(self) -> pd.DataFrame:
+        """Średnie miesięczne (jak srednie_miesieczne z modułu analiza) dla całego zbioru."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            srednie = self._sumy_m / self._liczby_m
+        indeks = pd.MultiIndex.from_arrays([self._miesiace // 12 + 1970, self._miesiace % 12 + 1],
+                                           names=['Rok','Miesiąc'])
+        return pd.DataFrame(srednie, index=indeks, columns=self.kolumny)
+
+    @property
+    def przekroczenia_norm(self) -> pd.DataFrame:
+        """Liczby dni z przekroczeniem norm (jak dni_przekroczenia_norm) dla wszystkich lat zbioru."""
+        indeks = pd.MultiIndex.from_product([self._lata.tolist(), self.normy], names=['Rok','Norma'])
+        return pd.DataFrame(self._przekroczenia.reshape(len(indeks), -1), index=indeks, columns=self.kolumny)
+
+
+def _scal(kody_a:np.ndarray, kody_b:np.ndarray, *tablice) -> tuple:
+    """Łączy dwa zestawy wierszy (a, b) opisanych kodami okresów i sortuje je po kodach."""
+    kody = np.concatenate([kody_a, kody_b])
+    kolejnosc = np.argsort(kody, kind="stable")
+    wynik = [kody[kolejnosc]]
+    for a, b in zip(tablice[::2], tablice[1::2]):
+        wynik.append(np.concatenate([a, b])[kolejnosc])
+    return tuple(wynik)
@@ -0,0 +1,146 @@
+"""
+Generowanie raportu PM2.5 bez notatnika i bez ekranu.
+
+Uruchamia cały potok: wczytanie danych (z GIOŚ albo ze zbioru na dysku)
+-> analiza -> wykresy zapisywane prosto do plików. Niezależne wykresy
+są rysowane równolegle w procesach roboczych; każdy proces używa jednej
+figury dla kolejnych wykresów.
+
+Przykłady (z katalogu głównego repozytorium):
+    python src/raport.py --katalog raport --lata 2015 2018 2021 2024 --pamiec cache
+    python src/raport.py --katalog raport --zbior dane_pm25 --norma 25
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from analiza import Agregaty, przygotuj_dane, srednie_po_stacjach, dni_przekroczenia_normy, wybierz_stacje_max_min
+from instrumentacja import Profil, etap
+from wczytaj_wyczysc import df_gotowy, download_metadata, wczytaj_lata, wczytaj_zbior
+import wizualizacja
+
+GIOS_ARCHIVE_URL = "https://powietrze.gios.gov.pl/pjp/archives/downloadFile/"
+GIOS_URL_IDS = {2015: '236', 2018: '603', 2021: '486', 2024: '582'}
+METADATA_URL_ID = "622"
+
+# Figura współdzielona przez kolejne wykresy rysowane w jednym procesie
+_FIGURA = None
+
+
+def _rysuj(nazwa:str, args:tuple, plik:str) -> str:
+    """Rysuje wykres funkcją `nazwa` z modułu wizualizacja do pliku, na wspólnej figurze procesu."""
+    global _FIGURA
+    if _FIGURA is None:
+        _FIGURA = Figure()
+        FigureCanvasAgg(_FIGURA)
+    with etap(f"wykres.{nazwa}"):
+        getattr(wizualizacja, nazwa)(*args, fig=_FIGURA, plik=plik)
+    return plik
+
+
+def wczytaj_dane(args) -> tuple:
+    """Zwraca (dane godzinowe, lata) ze zbioru na dysku albo pobrane z GIOŚ."""
+    if args.zbior:
+        zbior = wczytaj_zbior(args.zbior)
+        lata = args.lata or zbior.lata
+        return zbior, lata
+    konfiguracja = {"url": GIOS_ARCHIVE_URL, "id": GIOS_URL_IDS, "metadane": METADATA_URL_ID}
+    if args.konfiguracja:
+        with open(args.konfiguracja, encoding="utf-8") as f:
+            konfiguracja.update(json.load(f))
+    ids = {int(rok): str(i) for rok, i in konfiguracja["id"].items()}
+    lata = args.lata or sorted(ids)
+    pliki = {rok: f"{rok}_PM25_1g.xlsx" for rok in lata}
+
+    pamiec = None
+    if args.pamiec:
+        from pamiec_podreczna import PamiecPodreczna
+        pamiec = PamiecPodreczna(args.pamiec, offline=args.offline)
+    metadane = download_metadata(konfiguracja["url"], konfiguracja["metadane"], pamiec=pamiec)
+    raw_data = wczytaj_lata(konfiguracja["url"], ids, pliki, lata, pamiec=pamiec, strumieniowo=True)
+    return przygotuj_dane(df_gotowy(raw_data, metadane)), lata
+
+
+def generuj_raport(args) -> dict:
+    """
+    Uruchamia potok i zapisuje wykresy w katalogu args.katalog.
+
+    Returns
+    -------
+    dict
+        Opis raportu: lata, norma, wybrane stacje i lista plików.
+    """
+    os.makedirs(args.katalog, exist_ok=True)
+    dane, lata = wczytaj_dane(args)
+
+    # agregaty dobowe liczone raz i używane przez wszystkie wyniki
+    agregaty = Agregaty.z_danych(dane)
+    miasta_srednie = srednie_po_stacjach(agregaty.srednie_miesieczne)
+    przekroczenia = dni_przekroczenia_normy(agregaty, args.norma, lata)
+    stacje, wybrane = wybierz_stacje_max_min(przekroczenia, lata[-1], args.ile_stacji)
+    miasta = [m for m in args.miasta if m in miasta_srednie.columns] or list(miasta_srednie.columns[:2])
+
+    sciezka = lambda nazwa: os.path.join(args.katalog, f"{nazwa}.{args.format}")
+    zadania = [
+        ("wykres_porownanie_miast", (miasta_srednie, lata, miasta), sciezka("porownanie_miast")),
+        ("wykres_przekroczenia", (wybrane, stacje, lata, args.norma), sciezka("przekroczenia")),
+    ]
+    if not args.heatmapy_wsadowo:
+        zadania.append(("wykres_heatmap_srednie", (miasta_srednie, lata), sciezka("heatmap")))
+
+    if args.procesy == 0:
+        pliki = [_rysuj(*z) for z in zadania]
+    else:
+        with ProcessPoolExecutor(max_workers=args.procesy) as pula:
+            pliki = list(pula.map(_rysuj, *zip(*zadania)))
+    if args.heatmapy_wsadowo:
+        pliki += wizualizacja.wykres_heatmap_wsadowo(miasta_srednie, lata, args.katalog,
+                                                     procesy=args.procesy, format=args.format)
+
+    return {
+        "lata": [int(r) for r in lata],
+        "norma": args.norma,
+        "miasta": miasta,
+        "stacje": [list(s) for s in stacje],
+        "pliki": pliki,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--katalog", required=True, help="katalog na wykresy i raport.json")
+    parser.add_argument("--lata", type=int, nargs="+", help="lata raportu (domyślnie wszystkie dostępne)")
+    parser.add_argument("--zbior", help="katalog zbioru zapisanego przez zapisz_zbior (zamiast pobierania z GIOŚ)")
+    parser.add_argument("--konfiguracja", help="plik JSON z kluczami url, id ({rok: id}) i metadane")
+    parser.add_argument("--pamiec", help="katalog pamięci podręcznej archiwów GIOŚ")
+    parser.add_argument("--offline", action="store_true", help="korzystaj tylko z pamięci podręcznej")
+    parser.add_argument("--norma", type=float, default=25.0, help="norma dobowa PM2.5 (domyślnie 25)")
+    parser.add_argument("--ile-stacji", type=int, default=3, help="liczba stacji z max i min przekroczeń")
+    parser.add_argument("--miasta", nargs="+", default=["Katowice", "Warszawa"], help="miasta na wykresie porównania")
+    parser.add_argument("--heatmapy-wsadowo", action="store_true",
+                        help="heatmapy wszystkich miejscowości na wielu stronach (wykres_heatmap_wsadowo)")
+    parser.add_argument("--procesy", type=int, help="liczba procesów rysujących (0 - bez procesów roboczych)")
+    parser.add_argument("--format", default="png", help="format plików z wykresami (domyślnie png)")
+    parser.add_argument("--profil", action="store_true", help="zapisz czasy etapów w profil.json")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    with Profil() as profil:
+        opis = generuj_raport(args)
+    opis["czas_s"] = time.perf_counter() - start
+    with open(os.path.join(args.katalog, "raport.json"), "w", encoding="utf-8") as f:
+        json.dump(opis, f, ensure_ascii=False, indent=1)
+    if args.profil:
+        profil.zapisz(os.path.join(args.katalog, "profil.json"))
+    print(f"Zapisano {len(opis['pliki'])} wykresów w {args.katalog} ({opis['czas_s']:.1f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
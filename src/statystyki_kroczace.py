@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+
+from analiza import Agregaty, macierz_indeks_kolumny
+from instrumentacja import etap
+from magazyn import ZbiorDyskowy
+from wczytaj_wyczysc import przesun_indeks
+
+# Minimalny udział poprawnych pomiarów w oknie (np. 18 z 24 godzin, 6 z 8 godzin)
+MIN_UDZIAL = 0.75
+# Minimalny udział dni ze średnią dobową w roku dla statystyk rocznych
+MIN_UDZIAL_ROKU = 0.9
+GODZINA_S = 3600
+
+
+def siatka_godzinowa(dane) -> tuple[np.ndarray, pd.DatetimeIndex, pd.Index]:
+    """
+    Układa dane godzinowe na regularnej siatce godzin (brakujące godziny to NaN).
+
+    Okna kroczące liczone są po liczbie godzin, więc luki w indeksie
+    czasowym (np. brakujące wiersze) muszą być uzupełnione. Pomiar
+    przypisywany jest do godziny, w której się kończy, dlatego znacznik
+    23:59:59 (pomiar z północy po przesun_date) trafia na godzinę 00:00.
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame, MagazynPM25 albo ZbiorDyskowy
+        Gotowe dane z funkcji df_gotowy (z indeksem czasowym).
+
+    Returns
+    -------
+    tuple
+        Macierz float64 (godziny × stacje), indeks czasowy siatki
+        (w konwencji przesun_date) i kolumny (Kod stacji, Miejscowość).
+    """
+    if isinstance(dane, ZbiorDyskowy):
+        # lata są kopiowane z memmap prosto do siatki, bez sklejania w jeden DataFrame
+        kolumny = dane.kolumny
+        fragmenty = [(dane.indeks(r), lambda r=r: dane.wartosci(r)) for r in dane.lata]
+    else:
+        wartosci, indeks, kolumny = macierz_indeks_kolumny(dane)
+        fragmenty = [(indeks, lambda: wartosci)]
+    godziny = [_godziny_pomiarow(indeks) for indeks, _ in fragmenty]
+    if not any(len(g) for g, _ in godziny):
+        return np.zeros((0, len(kolumny))), pd.DatetimeIndex([]), kolumny
+    start = min(g.min() for g, _ in godziny if len(g))
+    koniec = max(g.max() for g, _ in godziny if len(g))
+
+    siatka = np.full((koniec - start + 1, len(kolumny)), np.nan)
+    for (_, wczytaj), (g, poprawne) in zip(fragmenty, godziny):
+        if len(g):
+            blok = wczytaj()
+            siatka[g - start] = blok if poprawne.all() else blok[poprawne]
+    indeks = fragmenty[0][0]
+    czas = pd.DatetimeIndex((np.arange(start, koniec + 1) * GODZINA_S).astype("datetime64[s]"),
+                            name=indeks.name).as_unit(indeks.unit)
+    return siatka, przesun_indeks(czas), kolumny
+
+
+def _godziny_pomiarow(indeks:pd.DatetimeIndex) -> tuple[np.ndarray, np.ndarray]:
+    """Numery godzin (od 1970-01-01, zaokrąglone w górę) poprawnych znaczników i maska poprawnych."""
+    poprawne = ~indeks.isna()
+    sekundy = indeks.values[poprawne].astype("datetime64[s]").astype(np.int64)
+    return -(-sekundy // GODZINA_S), poprawne
+
+
+def _godziny_okna(okno) -> int:
+    if isinstance(okno, (int, np.integer)):
+        return int(okno)
+    return int(pd.Timedelta(okno) / pd.Timedelta(hours=1))
+
+
+def _sumy_kroczace(wartosci:np.ndarray, okno:int) -> tuple[np.ndarray, np.ndarray]:
+    """Sumy i liczby poprawnych pomiarów w oknach (t - okno, t] - różnice sum skumulowanych, O(n)."""
+    brak = np.isnan(wartosci)
+    n = wartosci.shape[0]
+    sumy = np.zeros((n + 1, wartosci.shape[1]))
+    np.cumsum(np.where(brak, 0, wartosci), axis=0, out=sumy[1:])
+    liczby = np.zeros((n + 1, wartosci.shape[1]), dtype=np.int64)
+    np.cumsum(~brak, axis=0, out=liczby[1:])
+    koniec = np.arange(1, n + 1)
+    poczatek = np.maximum(koniec - okno, 0)
+    return sumy[koniec] - sumy[poczatek], liczby[koniec] - liczby[poczatek]
+
+
+def srednie_kroczace(dane, okno="24h", min_udzial:float=MIN_UDZIAL) -> pd.DataFrame:
+    """
+    Średnie kroczące stężeń PM2.5 dla wszystkich stacji naraz.
+
+    Średnia w godzinie t obejmuje pomiary z okna (t - okno, t]. Sumy
+    i liczby poprawnych pomiarów w oknach są różnicami sum skumulowanych,
+    więc koszt nie zależy od długości okna - tak samo liczona jest
+    średnia 8-godzinna, 24-godzinna i krocząca średnia roczna.
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame, MagazynPM25 albo ZbiorDyskowy
+        Gotowe dane z funkcji df_gotowy (z indeksem czasowym).
+    okno : int albo str, optional
+        Długość okna w godzinach albo jako tekst dla pd.Timedelta,
+        np. "8h", "24h" (domyślnie) lub "365D".
+    min_udzial : float, optional
+        Minimalny udział godzin z poprawnym pomiarem w oknie (domyślnie 0.75,
+        czyli 18 z 24 godzin). Dla okien z mniejszą liczbą pomiarów,
+        także na początku danych, wynikiem jest NaN.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame z indeksem siatki godzinowej (zob. siatka_godzinowa)
+        i kolumnami (Kod stacji, Miejscowość).
+
+    Examples
+    --------
+    >>> srednie_kroczace(data, "8h")
+    >>> srednie_kroczace(data, "365D", min_udzial=0.9)   # krocząca średnia roczna
+    """
+    godziny = _godziny_okna(okno)
+    if godziny < 1:
+        raise ValueError(f"Okno musi obejmować co najmniej godzinę: {okno!r}")
+    wartosci, czas, kolumny = siatka_godzinowa(dane)
+    with etap("srednie_kroczace", wiersze=wartosci.shape[0]):
+        sumy, liczby = _sumy_kroczace(wartosci, godziny)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            srednie = sumy / liczby
+        srednie[liczby < np.ceil(min_udzial * godziny)] = np.nan
+    return pd.DataFrame(srednie, index=czas, columns=kolumny)
+
+
+def srednie_dobowe(dane, min_udzial:float=MIN_UDZIAL) -> pd.DataFrame:
+    """
+    Średnie dobowe z progiem kompletności danych.
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame, MagazynPM25, ZbiorDyskowy albo Agregaty
+        Gotowe dane z funkcji df_gotowy (lub ich agregaty).
+    min_udzial : float, optional
+        Minimalny udział godzin z pomiarem w dobie (domyślnie 0.75, czyli 18 z 24).
+        Średnie dni z mniejszą liczbą pomiarów są zastępowane NaN.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame z indeksem (Rok, Miesiąc, Dzień), jak Agregaty.srednie_dzienne.
+    """
+    agregaty = dane if isinstance(dane, Agregaty) else Agregaty.z_danych(dane)
+    return agregaty.srednie_dzienne.mask(agregaty.liczby < np.ceil(min_udzial * 24))
+
+
+def percentyl_dobowy(dane, percentyl:float=90.4, min_udzial:float=MIN_UDZIAL,
+                     min_udzial_roku:float=MIN_UDZIAL_ROKU) -> pd.DataFrame:
+    """
+    Percentyl średnich dobowych w każdym roku dla każdej stacji.
+
+    Domyślnie 90,4 percentyl, odpowiadający 35 dniom przekroczeń
+    w roku. Liczony jest tylko ze średnich dobowych spełniających próg
+    kompletności (srednie_dobowe).
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame, MagazynPM25, ZbiorDyskowy albo Agregaty
+        Gotowe dane z funkcji df_gotowy (lub ich agregaty).
+    percentyl : float, optional
+        Percentyl w procentach (domyślnie 90.4).
+    min_udzial : float, optional
+        Próg kompletności doby (zob. srednie_dobowe).
+    min_udzial_roku : float, optional
+        Minimalny udział dni roku z poprawną średnią dobową (domyślnie 0.9).
+        Dla lat z mniejszym pokryciem wynikiem jest NaN.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame z indeksem 'Rok' i kolumnami (Kod stacji, Miejscowość).
+    """
+    dobowe = srednie_dobowe(dane, min_udzial)
+    lata = dobowe.index.get_level_values('Rok').to_numpy()
+    wartosci = dobowe.to_numpy(dtype=np.float64)
+    unikalne, poczatki = np.unique(lata, return_index=True)
+    granice = np.r_[poczatki, len(lata)]
+    wynik = np.full((len(unikalne), wartosci.shape[1]), np.nan)
+    for nr, rok in enumerate(unikalne):
+        blok = wartosci[granice[nr]:granice[nr + 1]]
+        dni_roku = 366 if pd.Timestamp(int(rok), 1, 1).is_leap_year else 365
+        dni = (~np.isnan(blok)).sum(axis=0)
+        pelne = (dni > 0) & (dni >= min_udzial_roku * dni_roku)
+        if pelne.any():
+            wynik[nr, pelne] = np.nanpercentile(blok[:, pelne], percentyl, axis=0)
+    return pd.DataFrame(wynik, index=pd.Index(unikalne, name='Rok'), columns=dobowe.columns)
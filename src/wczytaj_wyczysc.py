@@ -1,9 +1,172 @@
+import numpy as np
 import pandas as pd
 import requests
 import zipfile
 import io
+import json
+import os
+import weakref
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-def download_gios_archive(gios_archive_url:str, gios_id:str, filename:str) -> pd.DataFrame:
+from instrumentacja import etap
+
+def _wczytaj_z_archiwum(zawartosc:bytes, filename:str) -> pd.DataFrame:
+    """Wczytuje surową tabelę z pliku Excel `filename` w archiwum ZIP podanym jako bajty."""
+    with zipfile.ZipFile(io.BytesIO(zawartosc)) as z:
+        with z.open(filename) as f:
+            df = pd.read_excel(f, header=None, decimal=",")
+    return df
+
+# Wiersze opisowe w plikach GIOŚ, pomijane przy ujednolicaniu danych
+WIERSZE_OPISOWE = ['Wskaźnik','Czas uśredniania','Jednostka', 'Kod stanowiska', 'Nr']
+
+_NS_ARKUSZ = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+def _numer_kolumny(adres:str) -> int:
+    """Zamienia adres komórki Excela (np. "AB12") na numer kolumny liczony od 0."""
+    nr = 0
+    for znak in adres:
+        if not znak.isalpha():
+            break
+        nr = nr * 26 + (ord(znak.upper()) - 64)
+    return nr - 1
+
+def _sciezka_pierwszego_arkusza(xlsx:zipfile.ZipFile) -> str:
+    try:
+        workbook = ET.fromstring(xlsx.read("xl/workbook.xml"))
+        rels = ET.fromstring(xlsx.read("xl/_rels/workbook.xml.rels"))
+        rid = workbook.find(f"{_NS_ARKUSZ}sheets/{_NS_ARKUSZ}sheet").get(f"{_NS_REL}id")
+        cel = next(r.get("Target") for r in rels if r.get("Id") == rid)
+    except (KeyError, AttributeError, StopIteration):
+        return "xl/worksheets/sheet1.xml"
+    return cel.lstrip("/") if cel.startswith("/") else f"xl/{cel}"
+
+def _wspolne_napisy(xlsx:zipfile.ZipFile) -> list[str]:
+    if "xl/sharedStrings.xml" not in xlsx.namelist():
+        return []
+    napisy = []
+    with xlsx.open("xl/sharedStrings.xml") as f:
+        for _, el in ET.iterparse(f):
+            if el.tag == f"{_NS_ARKUSZ}si":
+                napisy.append("".join(t.text or "" for t in el.iter(f"{_NS_ARKUSZ}t")))
+                el.clear()
+    return napisy
+
+def _wartosc_komorki(c:ET.Element, napisy:list[str]):
+    """
+    Wartość komórki arkusza zależnie od jej typu (atrybut t): napis wspólny (s),
+    napis w komórce (inlineStr), napis z formuły (str), błąd (e), data ISO (d)
+    jako tekst, wartość logiczna (b) i liczba (n) jako float. Wartość
+    nieliczbowa w komórce liczbowej jest zwracana jako tekst.
+    """
+    typ = c.get("t", "n")
+    if typ == "inlineStr":
+        return "".join(t.text or "" for t in c.iter(f"{_NS_ARKUSZ}t"))
+    v = c.find(f"{_NS_ARKUSZ}v")
+    if v is None or v.text is None:
+        return None
+    if typ == "s":
+        return napisy[int(v.text)]
+    if typ in ("str", "e", "d"):
+        return v.text
+    try:
+        return float(v.text)
+    except ValueError:
+        return v.text
+
+def _wiersze_arkusza(xlsx:zipfile.ZipFile):
+    """
+    Generator kolejnych wierszy pierwszego arkusza w postaci list wartości
+    (str, float albo None), czytanych strumieniowo z XML-a arkusza.
+    """
+    napisy = _wspolne_napisy(xlsx)
+    with xlsx.open(_sciezka_pierwszego_arkusza(xlsx)) as f:
+        for _, el in ET.iterparse(f):
+            if el.tag != f"{_NS_ARKUSZ}row":
+                continue
+            wiersz = []
+            for c in el.iter(f"{_NS_ARKUSZ}c"):
+                nr = _numer_kolumny(c.get("r")) if c.get("r") else len(wiersz)
+                wiersz.extend([None] * (nr - len(wiersz)))
+                wiersz.append(_wartosc_komorki(c, napisy))
+            el.clear()
+            yield wiersz
+
+def _na_liczbe(wartosc) -> float:
+    if wartosc is None or isinstance(wartosc, float):
+        return np.nan if wartosc is None else wartosc
+    try:
+        return float(wartosc.replace(",", "."))
+    except ValueError:
+        return np.nan
+
+def wczytaj_xlsx_strumieniowo(plik) -> pd.DataFrame:
+    """
+    Wczytuje arkusz GIOŚ strumieniowo, bez budowania tabeli obiektów pandas.
+
+    Funkcja czyta XML pierwszego arkusza wiersz po wierszu, pomija wiersze
+    opisowe (WIERSZE_OPISOWE), pierwszy pozostały wiersz traktuje jako
+    nagłówek z kodami stacji, a wartości pomiarów zapisuje od razu
+    w macierzy float32. Wynik odpowiada ujednolic_dane bez aktualizacji
+    kodów stacji, ale z wartościami liczbowymi i indeksem DatetimeIndex.
+
+    Parameters
+    ----------
+    plik : bytes lub obiekt plikowy
+        Zawartość pliku .xlsx.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame float32 z indeksem czasowym 'Data poboru danych'
+        i kolumnami odpowiadającymi kodom stacji.
+    """
+    if isinstance(plik, bytes):
+        plik = io.BytesIO(plik)
+    with zipfile.ZipFile(plik) as xlsx:
+        stacje = None
+        wartosci = None
+        czasy = []
+        n = 0
+        for wiersz in _wiersze_arkusza(xlsx):
+            if not wiersz or wiersz[0] in WIERSZE_OPISOWE:
+                continue
+            if stacje is None:
+                stacje = wiersz[1:]
+                wartosci = np.empty((8784, len(stacje)), dtype=np.float32)
+                continue
+            if n == len(wartosci):
+                wartosci = np.resize(wartosci, (2 * n, len(stacje)))
+            pomiary = wiersz[1:len(stacje) + 1]
+            pomiary += [None] * (len(stacje) - len(pomiary))
+            wartosci[n] = [_na_liczbe(w) for w in pomiary]
+            czasy.append(wiersz[0])
+            n += 1
+
+    if stacje is None:
+        return pd.DataFrame()
+    # daty mogą być zapisane jako liczby (format daty Excela) albo jako tekst
+    # (napis "RRRR-MM-DD GG:MM:SS" albo komórka typu daty ISO 8601)
+    liczbowe = np.array([isinstance(t, float) for t in czasy], dtype=bool)
+    indeks = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    if liczbowe.any():
+        sekundy = np.round(np.array([t for t in czasy if isinstance(t, float)]) * 86400).astype(np.int64)
+        indeks[liczbowe] = np.datetime64("1899-12-30", "ns") + sekundy.astype("timedelta64[s]")
+    if (~liczbowe).any():
+        tekstowe = [t for t in czasy if not isinstance(t, float)]
+        indeks[~liczbowe] = pd.to_datetime(tekstowe, errors="coerce", format="ISO8601").values
+    indeks = pd.DatetimeIndex(indeks, name="Data poboru danych")
+    return pd.DataFrame(wartosci[:n], index=indeks, columns=pd.Index(stacje, dtype=object), copy=False)
+
+def _wczytaj_z_archiwum_strumieniowo(zawartosc:bytes, filename:str) -> pd.DataFrame:
+    """Wczytuje strumieniowo plik Excel `filename` z archiwum ZIP podanego jako bajty."""
+    with zipfile.ZipFile(io.BytesIO(zawartosc)) as z:
+        return wczytaj_xlsx_strumieniowo(z.read(filename))
+
+def download_gios_archive(gios_archive_url:str, gios_id:str, filename:str, pamiec=None,
+                          strumieniowo:bool=False) -> pd.DataFrame:
     """
         Pobiera archiwalne dane pomiarowe PM2.5 ze strony GIOŚ i zwraca je
         w postaci surowej tabeli danych.
@@ -22,21 +185,147 @@ def download_gios_archive(gios_archive_url:str, gios_id:str, filename:str) -> pd
         filename : str
             Nazwa pliku Excel znajdującego się w archiwum ZIP,
             np. "*rok*_PM25_1g.xlsx".
+        pamiec : PamiecPodreczna, optional
+            Lokalna pamięć podręczna (moduł pamiec_podreczna). Jeśli podana,
+            archiwum i wczytana tabela są brane z niej bez pobierania
+            i ponownego parsowania pliku Excel.
+        strumieniowo : bool, optional
+            Jeśli True, arkusz jest czytany funkcją wczytaj_xlsx_strumieniowo
+            i zwracana jest od razu oczyszczona tabela float32 z indeksem
+            czasowym (bez pośredniej tabeli obiektów).
 
         Returns
         -------
         pandas.DataFrame
             Surowe dane pomiarowe wczytane bez nagłówków,
-            dokładnie w takiej postaci, w jakiej występują w pliku źródłowym.
+            dokładnie w takiej postaci, w jakiej występują w pliku źródłowym
+            (albo, dla strumieniowo=True, dane po oczyszczeniu).
         """
-    response = requests.get(f"{gios_archive_url}{gios_id}")
-    response.raise_for_status()
-    with zipfile.ZipFile(io.BytesIO(response.content)) as z:
-        with z.open(filename) as f:
-            df = pd.read_excel(f, header=None, decimal=",")
-    return df
+    wczytaj = _wczytaj_z_archiwum_strumieniowo if strumieniowo else _wczytaj_z_archiwum
+    if pamiec is not None:
+        wariant = "strumieniowo" if strumieniowo else None
+        return pamiec.pobierz_tabele(gios_archive_url, gios_id, filename, wczytaj, wariant=wariant)
+    with etap("pobieranie") as e:
+        response = requests.get(f"{gios_archive_url}{gios_id}")
+        response.raise_for_status()
+        e.dodaj(bajty=len(response.content))
+    with etap("parsowanie") as e:
+        tabela = wczytaj(response.content, filename)
+        e.dodaj(wiersze=tabela.shape[0], komorki=tabela.size)
+    return tabela
+
+def wczytaj_lata(gios_archive_url:str, gios_url_ids:dict[int,str], gios_pm25_file:dict[int,str],
+                 years:list[int], max_watkow:int=8, max_procesow:int=None, pamiec=None,
+                 strumieniowo:bool=False) -> dict[int,pd.DataFrame]:
+    """
+    Pobiera i wczytuje archiwa GIOŚ dla wielu lat równolegle.
+
+    Archiwa są pobierane współbieżnie w puli wątków przez jedną sesję HTTP
+    (z pulą połączeń), a pliki Excel są parsowane w puli procesów.
+    Wynik jest taki sam jak przy wywołaniu download_gios_archive
+    w pętli po latach.
+
+    Parameters
+    ----------
+    gios_archive_url : str
+        Adres URL strony zawierającej archiwa danych GIOŚ.
+    gios_url_ids : dict[int, str]
+        Słownik {rok: identyfikator linku archiwum}.
+    gios_pm25_file : dict[int, str]
+        Słownik {rok: nazwa pliku Excel w archiwum}.
+    years : list of int
+        Lista lat do wczytania.
+    max_watkow : int, optional
+        Liczba wątków pobierających archiwa (domyślnie 8).
+    max_procesow : int, optional
+        Liczba procesów parsujących pliki Excel. Domyślnie tyle, ile rdzeni;
+        0 oznacza parsowanie w bieżącym procesie.
+    pamiec : PamiecPodreczna, optional
+        Lokalna pamięć podręczna; lata, których tabele są w niej zapisane,
+        nie są ani pobierane, ani parsowane. Archiwa wczytywanych lat nie są
+        usuwane z pamięci do końca wywołania, więc może ona na ten czas
+        przekroczyć max_rozmiar.
+    strumieniowo : bool, optional
+        Jeśli True, arkusze są czytane funkcją wczytaj_xlsx_strumieniowo
+        (jak w download_gios_archive).
 
-def download_metadata(gios_archive_url:str,metadata_url_id:str) -> pd.DataFrame:
+    Returns
+    -------
+    dict[int, pandas.DataFrame]
+        Słownik surowych danych w postaci {rok: DataFrame}.
+    """
+    wczytaj = _wczytaj_z_archiwum_strumieniowo if strumieniowo else _wczytaj_z_archiwum
+    wariant = "strumieniowo" if strumieniowo else None
+    argumenty = (gios_archive_url, gios_url_ids, gios_pm25_file, years, max_watkow, max_procesow,
+                 pamiec, wczytaj, wariant)
+    if pamiec is None:
+        return _wczytaj_lata(*argumenty)
+    # archiwa pobrane w tym wywołaniu nie mogą zostać usunięte z pamięci,
+    # zanim zostaną zapisane wczytane z nich tabele
+    with pamiec.przypiete(gios_url_ids[rok] for rok in years):
+        return _wczytaj_lata(*argumenty)
+
+def _wczytaj_lata(gios_archive_url, gios_url_ids, gios_pm25_file, years, max_watkow, max_procesow,
+                  pamiec, wczytaj, wariant) -> dict[int,pd.DataFrame]:
+    raw_data = {}
+    # jak w PamiecPodreczna.pobierz_tabele: przy rewalidacji tabela z pamięci
+    # jest używana dopiero po sprawdzeniu archiwum na serwerze
+    if pamiec is not None and (pamiec.offline or not pamiec.rewalidacja):
+        for rok in years:
+            tabela = pamiec.tabela_z_pamieci(gios_url_ids[rok], gios_pm25_file[rok], wariant)
+            if tabela is not None:
+                raw_data[rok] = tabela
+    do_pobrania = [rok for rok in years if rok not in raw_data]
+
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_watkow, pool_maxsize=max_watkow)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def pobierz(rok):
+            if pamiec is not None:
+                return pamiec.pobierz_archiwum(gios_archive_url, gios_url_ids[rok], session=session)
+            with etap("pobieranie") as e:
+                response = session.get(f"{gios_archive_url}{gios_url_ids[rok]}")
+                response.raise_for_status()
+                e.dodaj(bajty=len(response.content))
+            return response.content
+
+        with ThreadPoolExecutor(max_workers=max_watkow) as watki:
+            archiwa = list(watki.map(pobierz, do_pobrania))
+
+    if pamiec is not None and pamiec.rewalidacja:
+        # archiwa, które się nie zmieniły, mają już wczytane tabele
+        for rok in do_pobrania:
+            tabela = pamiec.tabela_z_pamieci(gios_url_ids[rok], gios_pm25_file[rok], wariant)
+            if tabela is not None:
+                raw_data[rok] = tabela
+        archiwa = [a for rok, a in zip(do_pobrania, archiwa) if rok not in raw_data]
+        do_pobrania = [rok for rok in do_pobrania if rok not in raw_data]
+    if not do_pobrania:
+        return {rok: raw_data[rok] for rok in years}
+
+    pliki = [gios_pm25_file[rok] for rok in do_pobrania]
+    # parsowanie w procesach potomnych jest mierzone w całości, w procesie głównym
+    with etap("parsowanie") as e:
+        if max_procesow == 0:
+            tabele = list(map(wczytaj, archiwa, pliki))
+        else:
+            with ProcessPoolExecutor(max_workers=max_procesow) as procesy:
+                tabele = list(procesy.map(wczytaj, archiwa, pliki))
+        e.dodaj(wiersze=sum(t.shape[0] for t in tabele), komorki=sum(t.size for t in tabele))
+
+    for rok, tabela in zip(do_pobrania, tabele):
+        raw_data[rok] = tabela
+        if pamiec is not None:
+            pamiec.zapisz_tabele(gios_url_ids[rok], gios_pm25_file[rok], tabela, wariant)
+    return {rok: raw_data[rok] for rok in years}
+
+def _wczytaj_metadane(zawartosc:bytes, filename:str=None) -> pd.DataFrame:
+    """Wczytuje tabelę metadanych z pliku Excel podanego jako bajty."""
+    return pd.read_excel(io.BytesIO(zawartosc),engine='openpyxl')
+
+def download_metadata(gios_archive_url:str,metadata_url_id:str, pamiec=None) -> pd.DataFrame:
     """
     Pobiera plik metadanych GIOŚ i wczytuje go do obiektu pandas.DataFrame.
 
@@ -50,6 +339,9 @@ def download_metadata(gios_archive_url:str,metadata_url_id:str) -> pd.DataFrame:
         Adres URL strony zawierającej archiwa danych GIOŚ
     metadata_url_id : str
         Identyfikator linku prowadzącego do pliku metadanych.
+    pamiec : PamiecPodreczna, optional
+        Lokalna pamięć podręczna (moduł pamiec_podreczna), z której
+        brane są metadane, jeśli były już wcześniej pobrane.
 
     Returns
     -------
@@ -58,53 +350,140 @@ def download_metadata(gios_archive_url:str,metadata_url_id:str) -> pd.DataFrame:
         W przypadku błędu wczytywania zwracane jest None.
     """
     # Pobranie metadanych
+    if pamiec is not None:
+        try:
+            return pamiec.pobierz_tabele(gios_archive_url, metadata_url_id, None, _wczytaj_metadane)
+        except (requests.RequestException, FileNotFoundError):
+            raise  # błędy pobierania i brak wpisu w trybie offline, jak bez pamięci
+        except Exception as e:
+            print(f"Błąd przy wczytywaniu metadanych: {e}")
+            return None
     url = f"{gios_archive_url}{metadata_url_id}"
-    response = requests.get(url)
-    response.raise_for_status()  # jeśli błąd HTTP, zatrzymaj
+    with etap("pobieranie") as e:
+        response = requests.get(url)
+        response.raise_for_status()  # jeśli błąd HTTP, zatrzymaj
+        e.dodaj(bajty=len(response.content))
 
     try:
-        df = pd.read_excel(io.BytesIO(response.content),engine='openpyxl')
+        df = _wczytaj_metadane(response.content)
         return df
     except Exception as e:
         print(f"Błąd przy wczytywaniu metadanych: {e}")
         return None
 
+KOLUMNA_STARY_KOD = 'Stary Kod stacji \n(o ile inny od aktualnego)'
+
+class RejestrStacji:
+    """
+    Rejestr stacji pomiarowych zbudowany jednorazowo z tabeli metadanych.
+
+    Zawiera mapowanie starych kodów stacji na aktualne (z rozwiniętymi
+    łańcuchami zmian A -> B -> C oraz usuniętymi białymi znakami)
+    i przypisanie aktualnego kodu stacji do miejscowości.
+
+    Parameters
+    ----------
+    metadane : pandas.DataFrame
+        DataFrame z metadanymi stacji (kolumny 'Kod stacji',
+        'Miejscowość' i kolumna ze starymi kodami).
+
+    Attributes
+    ----------
+    nowe_kody : dict[str, str]
+        Słownik {stary kod: aktualny kod}.
+    miasta : pandas.Series
+        Miejscowość stacji, indeksowana aktualnym kodem stacji.
+    """
+
+    def __init__(self, metadane:pd.DataFrame):
+        kody = metadane["Kod stacji"].astype(str).str.strip()
+        if KOLUMNA_STARY_KOD in metadane.columns:
+            stare = metadane[KOLUMNA_STARY_KOD].where(metadane[KOLUMNA_STARY_KOD].notna(), "")
+            stare = stare.astype(str).str.split(",").explode().str.strip()
+            mapa = pd.Series(kody.loc[stare.index].to_numpy(), index=stare.to_numpy())
+            mapa = mapa[(mapa.index != "") & (mapa.index != mapa.to_numpy())]
+            mapa = mapa[~mapa.index.duplicated(keep="last")]
+        else:
+            mapa = pd.Series(dtype=object)
+
+        # domknięcie przechodnie: A -> B i B -> C daje A -> C
+        for _ in range(len(mapa)):
+            nastepne = mapa.map(mapa)
+            zmienione = nastepne.notna() & (nastepne != mapa) & (nastepne.to_numpy() != mapa.index)
+            if not zmienione.any():
+                break
+            mapa[zmienione] = nastepne[zmienione]
+        self.nowe_kody = mapa.to_dict()
+
+        miasta = pd.Series(metadane["Miejscowość"].to_numpy(), index=kody.to_numpy())
+        self.miasta = miasta[~miasta.index.duplicated(keep="first")]
+
+    def aktualne_kody(self, kody) -> pd.Index:
+        """Zwraca aktualne kody dla podanych (starych lub aktualnych) kodów stacji."""
+        kody = pd.Index(kody).map(lambda k: k.strip() if isinstance(k, str) else k)
+        return kody.map(lambda k: self.nowe_kody.get(k, k))
+
+    def miasta_dla(self, kody) -> pd.Index:
+        """Zwraca miejscowości stacji o podanych aktualnych kodach (NaN dla nieznanych)."""
+        return pd.Index(self.miasta.reindex(pd.Index(kody)).to_numpy())
+
+_REJESTRY = {}
+
+def rejestr_stacji(metadane) -> RejestrStacji:
+    """
+    Zwraca rejestr stacji dla tabeli metadanych, budując go tylko raz.
+
+    Rejestr jest zapamiętywany dla danego obiektu metadanych (dopóki
+    ten obiekt istnieje). Jeśli przekazany zostanie już RejestrStacji,
+    jest on zwracany bez zmian. Po modyfikacji metadanych w miejscu
+    należy utworzyć RejestrStacji ręcznie.
+
+    Parameters
+    ----------
+    metadane : pandas.DataFrame albo RejestrStacji
+        DataFrame z metadanymi stacji.
+
+    Returns
+    -------
+    RejestrStacji
+        Rejestr stacji zbudowany z metadanych.
+    """
+    if isinstance(metadane, RejestrStacji):
+        return metadane
+    klucz = id(metadane)
+    wpis = _REJESTRY.get(klucz)
+    if wpis is not None and wpis[0]() is metadane:
+        return wpis[1]
+    rejestr = RejestrStacji(metadane)
+    _REJESTRY[klucz] = (weakref.ref(metadane), rejestr)
+    weakref.finalize(metadane, _REJESTRY.pop, klucz, None)
+    return rejestr
+
 def zaktualizuj_nazwy_stacji(df:pd.DataFrame, metadane:pd.DataFrame) -> pd.DataFrame:
     """
         Aktualizuje kody stacji pomiarowych w surowych danych na podstawie metadanych.
 
-        Funkcja tworzy mapowanie starych kodów stacji na ich aktualne odpowiedniki
-        na podstawie tabeli metadanych i zmienia nazwy kolumn w surowym DataFrame.
-        Operacja dotyczy wyłącznie nazw kolumn.
+        Funkcja korzysta z rejestru stacji (RejestrStacji) zbudowanego
+        z metadanych, który mapuje stare kody stacji na ich aktualne
+        odpowiedniki (także przez kilka kolejnych zmian kodu), i zmienia
+        nazwy kolumn w surowym DataFrame. Operacja dotyczy wyłącznie nazw kolumn.
 
         Parameters
         ----------
         df : pandas.DataFrame
             Surowy DataFrame z danymi pomiarowymi, gdzie kolumny reprezentują
             kody stacji.
-        metadane : pandas.DataFrame
+        metadane : pandas.DataFrame albo RejestrStacji
             DataFrame z metadanymi zawierający aktualne oraz historyczne
-            kody stacji.
+            kody stacji (albo zbudowany z niego rejestr).
 
         Returns
         -------
         pandas.DataFrame
             DataFrame z uaktualnionymi kodami stacji w nazwach kolumn.
         """
-    # Teraz chcę zmienić kody stacji, tak aby były aktualne na podstawie pliku metadane:
-    # Tworzę słownik kodów- będzie działał na zasadzie stary kod: nowy kod.
-    # W ten sposób mogę potem łatwo aktualizować kody stacji.
-    slownik_kodow = {}
-    for _, row in metadane.iterrows():
-        stary_kod = row['Stary Kod stacji \n(o ile inny od aktualnego)']
-        nowy_kod = row["Kod stacji"]
-        if pd.notna(stary_kod):
-            # Starych kodów może być też kilka:
-            stary_kod = stary_kod.split(",")
-            for s in stary_kod:
-                slownik_kodow[s] = nowy_kod
-
-    df.rename(columns=slownik_kodow, inplace=True)
+    with etap("zmiana_kodow", kolumny=df.shape[1]):
+        df.columns = rejestr_stacji(metadane).aktualne_kody(df.columns)
     return df
 
 def ujednolic_dane(tabela:pd.DataFrame, metadane:pd.DataFrame) -> pd.DataFrame:
@@ -118,8 +497,10 @@ def ujednolic_dane(tabela:pd.DataFrame, metadane:pd.DataFrame) -> pd.DataFrame:
         Parameters
         ----------
         tabela : pandas.DataFrame
-            Surowy DataFrame wczytany bezpośrednio z pliku Excel.
-        metadane : pandas.DataFrame
+            Surowy DataFrame wczytany bezpośrednio z pliku Excel
+            albo tabela z wczytaj_xlsx_strumieniowo (z indeksem czasowym),
+            dla której aktualizowane są już tylko kody stacji.
+        metadane : pandas.DataFrame albo RejestrStacji
             DataFrame z metadanymi stacji, wykorzystywany do aktualizacji
             kodów stacji.
 
@@ -128,13 +509,17 @@ def ujednolic_dane(tabela:pd.DataFrame, metadane:pd.DataFrame) -> pd.DataFrame:
         pandas.DataFrame
             Ujednolicony DataFrame z
         """
-    tabela = tabela.copy()
-    tabela = tabela[~tabela.iloc[:,0].isin(['Wskaźnik','Czas uśredniania','Jednostka', 'Kod stanowiska', 'Nr'])]
-    tabela.columns = tabela.iloc[0]
-    tabela = tabela.drop(tabela.index[0]).reset_index(drop=True)
-    tabela = tabela.rename(columns={"Kod stacji": "Data poboru danych"})
-    tabela = tabela.set_index('Data poboru danych')
-    tabela = zaktualizuj_nazwy_stacji(tabela,metadane)
+    with etap("ujednolicanie", wiersze=tabela.shape[0], komorki=tabela.size):
+        tabela = tabela.copy()
+        if isinstance(tabela.index, pd.DatetimeIndex):
+            # tabela jest już oczyszczona przez wczytaj_xlsx_strumieniowo
+            return zaktualizuj_nazwy_stacji(tabela, metadane)
+        tabela = tabela[~tabela.iloc[:,0].isin(WIERSZE_OPISOWE)]
+        tabela.columns = tabela.iloc[0]
+        tabela = tabela.drop(tabela.index[0]).reset_index(drop=True)
+        tabela = tabela.rename(columns={"Kod stacji": "Data poboru danych"})
+        tabela = tabela.set_index('Data poboru danych')
+        tabela = zaktualizuj_nazwy_stacji(tabela,metadane)
     return tabela 
 
 def wspolne_stacje(df_list:list[pd.DataFrame]) -> pd.Index:
@@ -159,11 +544,51 @@ def wspolne_stacje(df_list:list[pd.DataFrame]) -> pd.Index:
         wsp = wsp.intersection(df.columns)
     return wsp
 
+def wszystkie_stacje(df_list:list[pd.DataFrame]) -> pd.Index:
+    """
+        Wyznacza zbiór wszystkich stacji pomiarowych występujących w DataFrame’ach.
+
+        W przeciwieństwie do wspolne_stacje zwraca sumę (a nie część wspólną)
+        kodów stacji, w kolejności pierwszego wystąpienia.
+
+        Parameters
+        ----------
+        df_list : list of pandas.DataFrame
+            Lista DataFrame’ów z danymi pomiarowymi dla różnych lat.
+
+        Returns
+        -------
+        pandas.Index
+            Indeks zawierający kody stacji obecne w którymkolwiek DataFrame.
+        """
+    wsz = df_list[0].columns
+    for df in df_list[1:]:
+        wsz = wsz.union(df.columns, sort=False)
+    return wsz
+
+def _polacz_rzadko(df_list:list[pd.DataFrame], stacje:pd.Index) -> pd.DataFrame:
+    """
+    Łączy lata w jeden DataFrame, w którym każda stacja jest kolumną rzadką
+    (SparseDtype float32, kind="block") - lata bez danych stacji zajmują
+    tylko opis bloku, a nie gęsty blok wartości NaN.
+    """
+    df_list = [df.loc[:, ~df.columns.duplicated()] for df in df_list]
+    kolumny = {}
+    for nr, kod in enumerate(stacje):
+        czesci = [pd.to_numeric(df[kod], errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+                  if kod in df.columns else np.full(len(df), np.nan, dtype=np.float32)
+                  for df in df_list]
+        kolumny[nr] = pd.arrays.SparseArray(np.concatenate(czesci), fill_value=np.nan, kind="block")
+    wynik = pd.DataFrame(kolumny, index=df_list[0].index.append([df.index for df in df_list[1:]]))
+    wynik.columns = stacje
+    return wynik
+
 def multiindex_funkcja(df:pd.DataFrame, metadane:pd.DataFrame, wsp_stacje:pd.Index) -> pd.DataFrame:
     """
         Tworzy dwupoziomowy indeks kolumn na podstawie kodu stacji i miejscowości.
 
-        Na podstawie metadanych funkcja przypisuje każdej stacji nazwę miejscowości
+        Na podstawie rejestru stacji zbudowanego z metadanych funkcja
+        przypisuje każdej kolumnie (stacji) nazwę miejscowości
         i ustawia kolumny DataFrame jako MultiIndex:
         (Kod stacji, Miejscowość).
 
@@ -171,7 +596,7 @@ def multiindex_funkcja(df:pd.DataFrame, metadane:pd.DataFrame, wsp_stacje:pd.Ind
         ----------
         df : pandas.DataFrame
             DataFrame z danymi pomiarowymi i kolumnami reprezentującymi kody stacji.
-        metadane : pandas.DataFrame
+        metadane : pandas.DataFrame albo RejestrStacji
             DataFrame z metadanymi stacji, zawierający m.in. miejscowości.
         wsp_stacje : pandas.Index
             Indeks zawierający kody stacji wspólne dla wszystkich analizowanych lat.
@@ -181,12 +606,41 @@ def multiindex_funkcja(df:pd.DataFrame, metadane:pd.DataFrame, wsp_stacje:pd.Ind
         pandas.DataFrame
             DataFrame z kolumnami ustawionymi jako dwupoziomowy MultiIndex.
         """
-    filt = metadane[metadane['Kod stacji'].isin(wsp_stacje)]
-    tuples = list(zip(filt['Kod stacji'], filt['Miejscowość']))
-    df.columns = pd.MultiIndex.from_tuples(tuples, names=("Kod stacji", "Miejscowość"))
+    df = df[wsp_stacje]
+    miasta = rejestr_stacji(metadane).miasta_dla(df.columns)
+    df.columns = pd.MultiIndex.from_arrays([df.columns, miasta], names=("Kod stacji", "Miejscowość"))
     return df
 
-def przesun_date(df:pd.DataFrame) -> pd.DataFrame:
+NS_SEKUNDA = 1_000_000_000
+NS_GODZINA = 3600 * NS_SEKUNDA
+NS_DOBA = 24 * NS_GODZINA
+
+def przesun_indeks(indeks:pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """
+    Zwraca indeks czasowy, w którym znaczniki z godziny 00 są cofnięte o sekundę.
+
+    Operacja jest wykonywana wektorowo na widoku int64 (nanosekundy)
+    indeksu - bez tworzenia obiektów Timestamp dla każdego pomiaru.
+    Wartości NaT pozostają bez zmian.
+
+    Parameters
+    ----------
+    indeks : pandas.DatetimeIndex
+        Indeks czasowy bez strefy czasowej.
+
+    Returns
+    -------
+    pandas.DatetimeIndex
+        Nowy indeks czasowy z poprawionymi znacznikami.
+    """
+    # indeks może mieć jednostkę inną niż ns (np. "s" albo "us" w pandas 3)
+    na_ns = NS_SEKUNDA // np.timedelta64(1, "s").astype(f"timedelta64[{indeks.unit}]").astype(np.int64)
+    wartosci = indeks.asi8
+    polnoc = (wartosci // (NS_GODZINA // na_ns)) % 24 == 0
+    polnoc &= ~indeks.isna()
+    return pd.DatetimeIndex(wartosci - polnoc * (NS_SEKUNDA // na_ns), dtype=indeks.dtype)
+
+def przesun_date(df:pd.DataFrame, w_miejscu:bool=False) -> pd.DataFrame:
     """
       Przesuwa datę pomiaru o jeden dzień wstecz dla pomiarów wykonanych o północy.
 
@@ -198,20 +652,24 @@ def przesun_date(df:pd.DataFrame) -> pd.DataFrame:
       ----------
       df : pandas.DataFrame
           DataFrame z indeksem czasowym reprezentującym moment pomiaru.
+      w_miejscu : bool, optional
+          Jeśli True, podmieniany jest tylko indeks przekazanego DataFrame
+          (bez kopiowania danych) i zwracany jest ten sam obiekt.
 
       Returns
       -------
       pandas.DataFrame
           DataFrame z poprawionym indeksem czasowym.
       """
-    df = df.copy()
-    df.index = pd.to_datetime(df.index, errors="coerce",format="%Y-%m-%d %H:%M:%S")
-    polnoc = df.index.hour == 0
-    nowy_indeks = [t - pd.Timedelta(seconds=1) if h else t for t, h in zip(df.index, polnoc)]
-    df.index = pd.DatetimeIndex(nowy_indeks)
+    with etap("przesuniecie_dat", wiersze=df.shape[0]):
+        if not w_miejscu:
+            df = df.copy()
+        indeks = pd.DatetimeIndex(pd.to_datetime(df.index, errors="coerce",format="%Y-%m-%d %H:%M:%S"))
+        df.index = przesun_indeks(indeks)
     return df
 
-def df_gotowy(raw_df_dict:dict[int:pd.DataFrame], metadane:pd.DataFrame) -> pd.DataFrame:
+def df_gotowy(raw_df_dict:dict[int:pd.DataFrame], metadane:pd.DataFrame, kompaktowy:bool=False,
+              stacje:str="wspolne") -> pd.DataFrame:
     """
     Tworzy końcowy DataFrame z danymi PM2.5 połączonymi dla wielu lat.
 
@@ -225,21 +683,170 @@ def df_gotowy(raw_df_dict:dict[int:pd.DataFrame], metadane:pd.DataFrame) -> pd.D
         Słownik surowych danych w postaci {rok: DataFrame}.
     metadane : pandas.DataFrame
         DataFrame z metadanymi stacji pomiarowych.
+    kompaktowy : bool, optional
+        Jeśli True, wynik jest zwracany jako MagazynPM25 (moduł magazyn):
+        macierz float32 godziny × stacje z osobną tabelą stacji
+        i osią czasu int32 zamiast DataFrame z kolumnami typu object.
+        Macierz jest wypełniana rok po roku, bez łączenia lat w jeden DataFrame.
+    stacje : {"wspolne", "wszystkie"}, optional
+        "wspolne" (domyślnie) - tylko stacje obecne we wszystkich latach;
+        "wszystkie" - wszystkie stacje z całego okresu, każda jako kolumna
+        rzadka float32 (brakujące lata nie zajmują pamięci). Pokrycie
+        danymi można sprawdzić funkcją pokrycie_stacji z modułu analiza.
 
     Returns
     -------
-    pandas.DataFrame
+    pandas.DataFrame albo MagazynPM25
         Gotowy DataFrame zawierający połączone dane ze wszystkich lat,
         z ujednoliconą strukturą i wielopoziomowym indeksem kolumn.
     """
 
+    # rejestr stacji budowany raz dla wszystkich lat
+    metadane = rejestr_stacji(metadane)
+
     # sprowadzam slownik raw_data {rok:df} do listy [df] i ujednolicam każdy df
     ujednolicone_df_list = []
     for rok in raw_df_dict.keys():
         ujednolicone_df_list.append(ujednolic_dane(raw_df_dict[rok], metadane))
 
+    if stacje == "wszystkie":
+        if kompaktowy:
+            raise ValueError("Tryb stacje='wszystkie' nie jest dostępny dla kompaktowy=True")
+        df_list = [przesun_date(df, w_miejscu=True) for df in ujednolicone_df_list]
+        wsz_st = wszystkie_stacje(df_list)
+        with etap("laczenie", wiersze=sum(len(df) for df in df_list)):
+            wynik = _polacz_rzadko(df_list, wsz_st)
+        miasta = metadane.miasta_dla(wsz_st)
+        wynik.columns = pd.MultiIndex.from_arrays([wsz_st, miasta], names=("Kod stacji", "Miejscowość"))
+        return wynik
+    if stacje != "wspolne":
+        raise ValueError(f"Nieznany tryb stacji: {stacje}")
+
     wsp_st = wspolne_stacje(ujednolicone_df_list)
+    if kompaktowy:
+        return _magazyn_z_lat(ujednolicone_df_list, metadane, wsp_st)
     df_list_wsp = [df[wsp_st] for df in ujednolicone_df_list]
     df_list_multi = [multiindex_funkcja(df, metadane, wsp_st) for df in df_list_wsp]
     df_gotowe = [przesun_date(df) for df in df_list_multi]
-    return pd.concat(df_gotowe)
\ No newline at end of file
+    with etap("laczenie", wiersze=sum(len(df) for df in df_gotowe)):
+        wynik = pd.concat(df_gotowe)
+    return wynik
+
+def _magazyn_z_lat(df_list:list[pd.DataFrame], metadane, wsp_stacje:pd.Index):
+    """
+    MagazynPM25 dla df_gotowy(kompaktowy=True): macierz float32 jest alokowana
+    raz i wypełniana rok po roku, bez sklejania tabel obiektów wszystkich lat.
+    """
+    from magazyn import MagazynPM25
+    wiersze = sum(len(df) for df in df_list)
+    wartosci = np.empty((wiersze, len(wsp_stacje)), dtype=np.float32, order="F")
+    indeksy = []
+    poczatek = 0
+    with etap("laczenie", wiersze=wiersze):
+        for df in df_list:
+            df = przesun_date(df[wsp_stacje], w_miejscu=True)
+            if not all(pd.api.types.is_float_dtype(t) for t in df.dtypes):
+                df = df.apply(pd.to_numeric, errors="coerce")
+            wartosci[poczatek:poczatek + len(df)] = df.to_numpy(dtype=np.float32)
+            indeksy.append(df.index)
+            poczatek += len(df)
+    indeks = indeksy[0].append(indeksy[1:]) if indeksy else pd.DatetimeIndex([])
+    miasta = rejestr_stacji(metadane).miasta_dla(wsp_stacje)
+    kolumny = pd.MultiIndex.from_arrays([wsp_stacje, miasta], names=("Kod stacji", "Miejscowość"))
+    return MagazynPM25.z_macierzy(wartosci, indeks, kolumny)
+
+def _zapisz_atomowo(tablica:np.ndarray, sciezka:str) -> None:
+    """Zapisuje tablicę do pliku tymczasowego i podmienia plik docelowy (otwarte memmapy starej wersji zostają poprawne)."""
+    np.ascontiguousarray(tablica).tofile(sciezka + ".tmp")
+    os.replace(sciezka + ".tmp", sciezka)
+
+def zapisz_zbior(dane, katalog:str, aktualizuj:bool=False) -> None:
+    """
+    Zapisuje gotowe dane PM2.5 w binarnym formacie do mapowania w pamięci.
+
+    Dane są dzielone na lata; dla każdego roku zapisywana jest macierz
+    float32 (godziny × stacje, plik <rok>.f32) i znaczniki czasu int64
+    w nanosekundach (plik <rok>.czas). Kody stacji, miejscowości i liczby
+    wierszy trafiają do pliku naglowek.json. Zbiór otwiera funkcja
+    wczytaj_zbior.
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame albo MagazynPM25
+        Gotowe dane z funkcji df_gotowy.
+    katalog : str
+        Katalog docelowy (tworzony, jeśli nie istnieje).
+    aktualizuj : bool, optional
+        Jeśli True, a w katalogu jest już zbiór, zapisywane są tylko lata
+        obecne w `dane` (zastępują te lata w zbiorze), a pozostałe lata
+        zostają bez zmian. Stacje muszą być takie same jak w zbiorze.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    ValueError
+        Jeśli przy aktualizacji stacje różnią się od stacji zbioru.
+    """
+    from magazyn import MagazynPM25
+
+    if isinstance(dane, MagazynPM25):
+        dane = dane.do_dataframe()
+    os.makedirs(katalog, exist_ok=True)
+    indeks = pd.DatetimeIndex(dane.index).as_unit("ns")
+    lata = indeks.year.to_numpy()
+    if isinstance(dane.columns, pd.MultiIndex):
+        stacje, miasta = dane.columns.get_level_values(0), dane.columns.get_level_values(1)
+    else:
+        stacje, miasta = dane.columns, [None] * dane.shape[1]
+    naglowek = {
+        "format": 1,
+        "stacje": [str(k) for k in stacje],
+        "miasta": [None if pd.isna(m) else str(m) for m in miasta],
+    }
+
+    wiersze = {}
+    sciezka_naglowka = os.path.join(katalog, "naglowek.json")
+    if aktualizuj and os.path.exists(sciezka_naglowka):
+        with open(sciezka_naglowka, encoding="utf-8") as f:
+            stary = json.load(f)
+        if stary["stacje"] != naglowek["stacje"]:
+            raise ValueError("Stacje w danych różnią się od stacji zapisanego zbioru")
+        wiersze = stary["wiersze"]
+
+    for rok in np.unique(lata):
+        maska = lata == rok
+        blok = dane[maska]
+        if any(isinstance(t, pd.SparseDtype) for t in blok.dtypes):
+            blok = blok.sparse.to_dense()
+        if not all(pd.api.types.is_float_dtype(t) for t in blok.dtypes):
+            blok = blok.apply(pd.to_numeric, errors="coerce")
+        _zapisz_atomowo(blok.to_numpy(dtype=np.float32), os.path.join(katalog, f"{rok}.f32"))
+        _zapisz_atomowo(indeks[maska].asi8, os.path.join(katalog, f"{rok}.czas"))
+        wiersze[str(rok)] = int(maska.sum())
+
+    naglowek["lata"] = sorted(int(r) for r in wiersze)
+    naglowek["wiersze"] = wiersze
+    with open(sciezka_naglowka + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(naglowek, f, ensure_ascii=False, indent=1)
+    os.replace(sciezka_naglowka + ".tmp", sciezka_naglowka)
+
+def wczytaj_zbior(katalog:str):
+    """
+    Otwiera zbiór zapisany funkcją zapisz_zbior bez wczytywania danych do pamięci.
+
+    Parameters
+    ----------
+    katalog : str
+        Katalog ze zbiorem.
+
+    Returns
+    -------
+    ZbiorDyskowy
+        Obiekt (moduł magazyn) udostępniający dane poszczególnych lat
+        jako DataFrame opakowujące numpy.memmap.
+    """
+    from magazyn import ZbiorDyskowy
+    return ZbiorDyskowy(katalog)
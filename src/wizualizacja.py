@@ -1,8 +1,41 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+def _figura(fig:Figure, figsize:tuple, plik:str=None) -> Figure:
+    """
+    Zwraca nową figurę albo czyści i dopasowuje przekazaną (do ponownego użycia).
 
-def wykres_porownanie_miast(srednie_miast:pd.DataFrame, lata:list[int], miasta:list[str]) -> None:
+    Nowa figura do zapisu w pliku nie jest rejestrowana w pyplot, więc
+    nie trzeba jej zamykać (wykresy rysowane seriami nie zostają w pamięci);
+    do wyświetlenia (plt.show) tworzona jest figura pyplot.
+    """
+    if fig is None:
+        if plik is None:
+            return plt.figure(figsize=figsize)
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        return fig
+    fig.clear()
+    fig.set_size_inches(figsize)
+    return fig
+
+def _pokaz_lub_zapisz(fig:Figure, plik:str) -> Figure:
+    """Wyświetla wykres (plt.show) albo, gdy podano plik, tylko zapisuje go na dysku."""
+    if plik is None:
+        plt.show()
+    else:
+        fig.savefig(plik)
+    return fig
+
+def wykres_porownanie_miast(srednie_miast:pd.DataFrame, lata:list[int], miasta:list[str],
+                            fig:Figure=None, plik:str=None) -> Figure:
     """
     Rysuje wykres porównujący średnie miesięczne stężenia PM2.5
     dla wybranych miast i lat.
@@ -14,7 +47,9 @@ def wykres_porownanie_miast(srednie_miast:pd.DataFrame, lata:list[int], miasta:l
 
     Na jednym wykresie rysowane są łamane linie przedstawiające
     zmiany średnich miesięcznych wartości PM2.5 w kolejnych miesiącach,
-    osobno dla każdej kombinacji miasta i roku.
+    osobno dla każdej kombinacji miasta i roku. Liczba miast i lat jest
+    dowolna: dane są raz przekształcane w tablicę (miasto × rok × miesiąc),
+    a linie wszystkich lat jednego miasta są rysowane jednym wywołaniem.
 
     Parameters
     ----------
@@ -25,29 +60,34 @@ def wykres_porownanie_miast(srednie_miast:pd.DataFrame, lata:list[int], miasta:l
         Lista lat, które mają zostać uwzględnione na wykresie.
     miasta : list of str
         Lista nazw miejscowości, dla których mają zostać narysowane wykresy.
+    fig : matplotlib.figure.Figure, optional
+        Figura do ponownego użycia (jest czyszczona). Domyślnie tworzona jest nowa.
+    plik : str, optional
+        Jeśli podany, wykres jest zapisywany do tego pliku zamiast wyświetlania.
 
     Returns
     -------
-    None
-        Funkcja wyświetla wykres i nie zwraca żadnej wartości.
+    matplotlib.figure.Figure
+        Figura z wykresem.
     """
-    plt.figure(figsize=(12,8))
+    fig = _figura(fig, (12,8), plik)
+    ax = fig.subplots()
 
-    for miasto in miasta:
-        m = srednie_miast[miasto]
-        for rok in lata:
-            plt.plot(m.xs(rok, level='Rok').index, m.xs(rok, level='Rok').values,
-             marker='*', label=f'{miasto} {rok}')
+    kostka = kostka_heatmap(srednie_miast[list(miasta)], lata)
+    for nr, miasto in enumerate(miasta):
+        ax.plot(range(1, 13), kostka[nr].T, marker='*', label=[f'{miasto} {rok}' for rok in lata])
 
-    plt.xlabel('Miesiąc')
-    plt.ylabel('Średnia wartość PM2.5')
-    plt.title('Średnie miesięczne stężenie PM2.5 w Katowicach i Warszawie')
-    plt.xticks(range(1,13))
-    plt.grid(True)
-    plt.legend()
-    plt.show()
+    ax.set_xlabel('Miesiąc')
+    ax.set_ylabel('Średnia wartość PM2.5')
+    ax.set_title(f"Średnie miesięczne stężenie PM2.5: {', '.join(map(str, miasta))}"
+                 if len(miasta) <= 4 else 'Średnie miesięczne stężenie PM2.5 w wybranych miastach')
+    ax.set_xticks(range(1,13))
+    ax.grid(True)
+    ax.legend(ncol=1 + len(miasta) * len(lata) // 20, fontsize='small')
+    return _pokaz_lub_zapisz(fig, plik)
 
-def wykres_heatmap_srednie(srednie_po_miejscach:pd.DataFrame, lata:list[int]) -> None:
+def wykres_heatmap_srednie(srednie_po_miejscach:pd.DataFrame, lata:list[int], fig:Figure=None,
+                           plik:str=None) -> Figure:
     """
     Rysuje zestaw wykresów typu heatmap przedstawiających
     średnie miesięczne stężenia PM2.5 dla wszystkich miejscowości.
@@ -72,23 +112,25 @@ def wykres_heatmap_srednie(srednie_po_miejscach:pd.DataFrame, lata:list[int]) ->
         po miejscowościach (wynik funkcji srednie_po_stacjach).
     lata : list of int
         Lista lat uwzględnianych na wykresach.
+    fig : matplotlib.figure.Figure, optional
+        Figura do ponownego użycia (jest czyszczona). Domyślnie tworzona jest nowa.
+    plik : str, optional
+        Jeśli podany, wykresy są zapisywane do tego pliku zamiast wyświetlania.
 
     Returns
     -------
-    None
-        Funkcja wyświetla zestaw wykresów heatmap i nie zwraca żadnej wartości.
+    matplotlib.figure.Figure
+        Figura z zestawem heatmap.
     """
     miejscowosci = srednie_po_miejscach.columns.to_list()
-    fig, axes = plt.subplots((len(miejscowosci)+2)//3, 3, figsize=(15, 20))
+    kostka = kostka_heatmap(srednie_po_miejscach, lata)
+    fig = _figura(fig, (15, 20), plik)
+    axes = fig.subplots((len(miejscowosci)+2)//3, 3, squeeze=False)
     fig.suptitle("Średnie miesięczne stężenie PM2.5 we wszystkich miejscowościach", fontsize=20)
     for nr, miasto in enumerate(miejscowosci):
-        df_heat = pd.concat([srednie_po_miejscach.loc[y, miasto] for y in lata], axis=1).T
-        df_heat.index = lata
-        df_heat.columns.names = ['Miesiac']
-        df_heat.index.names = ['Rok']
         y = nr//3
         x = nr%3
-        hm = axes[y][x].imshow(df_heat, aspect='auto', vmin=0, vmax=80)
+        hm = axes[y][x].imshow(kostka[nr], aspect='auto', vmin=0, vmax=80)
         axes[y][x].set_title(miasto)
         axes[y][x].set_xticks(range(12))
         axes[y][x].set_xticklabels(range(1,13))
@@ -98,9 +140,108 @@ def wykres_heatmap_srednie(srednie_po_miejscach:pd.DataFrame, lata:list[int]) ->
         axes[y][x].set_ylabel("Rok")
         fig.colorbar(hm, ax=axes[y][x], fraction=0.046, pad=0.04)
     fig.tight_layout(rect=[0, 0, 1, 0.98])
-    plt.show()
+    return _pokaz_lub_zapisz(fig, plik)
+
+def kostka_heatmap(srednie_po_miejscach:pd.DataFrame, lata:list[int]) -> np.ndarray:
+    """
+    Zamienia średnie miesięczne miejscowości na kostkę (miasto × rok × miesiąc).
+
+    Wiersze są dopasowywane jednym reindex do pełnej siatki (lata × 12
+    miesięcy), a kostka powstaje przez zmianę kształtu macierzy - bez
+    wycinania danych osobno dla każdego miasta i roku. Brakujące
+    miesiące mają wartość NaN.
+
+    Parameters
+    ----------
+    srednie_po_miejscach : pandas.DataFrame
+        Wynik funkcji srednie_po_stacjach (indeks (Rok, Miesiąc)).
+    lata : list of int
+        Lata w kolejności wierszy heatmapy.
 
-def wykres_przekroczenia(ile_dni_wybrane_stacje:pd.DataFrame, wybrane_stacje:list[str], lata:list[int], norma_dobowa:float) -> None:
+    Returns
+    -------
+    numpy.ndarray
+        Tablica float64 o kształcie (liczba miejscowości, len(lata), 12).
+    """
+    siatka = pd.MultiIndex.from_product([lata, range(1, 13)], names=['Rok', 'Miesiąc'])
+    wartosci = srednie_po_miejscach.reindex(siatka).to_numpy(dtype=np.float64)
+    return wartosci.reshape(len(lata), 12, -1).transpose(2, 0, 1)
+
+def _rysuj_strone_heatmap(kostka:np.ndarray, miasta:list[str], lata:list[int], sciezka:str,
+                          kolumny:int, vmin:float, vmax:float, dpi:int) -> str:
+    """Rysuje jedną stronę heatmap do pliku (bez pyplot, więc działa w procesach roboczych)."""
+    wiersze = -(-len(miasta) // kolumny)
+    fig = Figure(figsize=(4 * kolumny, wiersze * (0.3 * len(lata) + 1.2) + 0.8), layout="constrained")
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(wiersze, kolumny, squeeze=False)
+    for nr, ax in enumerate(axes.flat):
+        if nr >= len(miasta):
+            ax.set_axis_off()
+            continue
+        hm = ax.imshow(kostka[nr], aspect='auto', vmin=vmin, vmax=vmax)
+        ax.set_title(miasta[nr], fontsize=9)
+        ax.set_xticks(range(12))
+        ax.set_xticklabels(range(1, 13), fontsize=7)
+        ax.set_yticks(range(len(lata)))
+        ax.set_yticklabels(lata, fontsize=7)
+    fig.suptitle("Średnie miesięczne stężenie PM2.5 (oś X - miesiąc, oś Y - rok)")
+    fig.colorbar(hm, ax=axes, fraction=0.02, label="PM2.5 [µg/m³]")
+    fig.savefig(sciezka, dpi=dpi)
+    return sciezka
+
+def wykres_heatmap_wsadowo(srednie_po_miejscach:pd.DataFrame, lata:list[int], katalog:str,
+                           na_stronie:int=24, kolumny:int=4, procesy:int=None, vmin:float=0,
+                           vmax:float=80, dpi:int=100, format:str="png") -> list[str]:
+    """
+    Rysuje heatmapy średnich miesięcznych dla wielu miejscowości do plików.
+
+    Wersja funkcji wykres_heatmap_srednie dla setek miejscowości: dane
+    są najpierw zamieniane na jedną kostkę (kostka_heatmap), miejscowości
+    są dzielone na strony po `na_stronie` wykresów, a każda strona jest
+    osobnym plikiem z jedną wspólną skalą kolorów. Strony są rysowane
+    równolegle w procesach roboczych, bez interaktywnego backendu (Agg).
+
+    Parameters
+    ----------
+    srednie_po_miejscach : pandas.DataFrame
+        Wynik funkcji srednie_po_stacjach.
+    lata : list of int
+        Lata uwzględniane na wykresach.
+    katalog : str
+        Katalog na pliki (tworzony, jeśli nie istnieje).
+    na_stronie : int, optional
+        Liczba miejscowości na jednej stronie (domyślnie 24).
+    kolumny : int, optional
+        Liczba wykresów w wierszu strony (domyślnie 4).
+    procesy : int, optional
+        Liczba procesów rysujących. Domyślnie tyle, ile rdzeni;
+        0 oznacza rysowanie w bieżącym procesie.
+    vmin, vmax : float, optional
+        Zakres wspólnej skali kolorów (domyślnie 0-80 µg/m³).
+    dpi : int, optional
+        Rozdzielczość plików.
+    format : str, optional
+        Format plików obsługiwany przez matplotlib (domyślnie "png").
+
+    Returns
+    -------
+    list of str
+        Ścieżki zapisanych plików (heatmap_001.png, heatmap_002.png, ...).
+    """
+    os.makedirs(katalog, exist_ok=True)
+    miasta = srednie_po_miejscach.columns.to_list()
+    kostka = kostka_heatmap(srednie_po_miejscach, lata)
+    strony = range(0, len(miasta), na_stronie)
+    zadania = [(kostka[a:a + na_stronie], miasta[a:a + na_stronie], list(lata),
+                os.path.join(katalog, f"heatmap_{nr + 1:03d}.{format}"), kolumny, vmin, vmax, dpi)
+               for nr, a in enumerate(strony)]
+    if procesy == 0 or len(zadania) <= 1:
+        return [_rysuj_strone_heatmap(*z) for z in zadania]
+    with ProcessPoolExecutor(max_workers=procesy) as pula:
+        return list(pula.map(_rysuj_strone_heatmap, *zip(*zadania)))
+
+def wykres_przekroczenia(ile_dni_wybrane_stacje:pd.DataFrame, wybrane_stacje:list[str], lata:list[int], norma_dobowa:float,
+                         fig:Figure=None, plik:str=None) -> Figure:
     """
     Rysuje wykres słupkowy liczby dni z przekroczeniem normy PM2.5
     dla wybranych stacji i lat.
@@ -110,7 +251,8 @@ def wykres_przekroczenia(ile_dni_wybrane_stacje:pd.DataFrame, wybrane_stacje:lis
     Na wykresie:
     - oś X - stacje pomiarowe,
     - oś Y przedstawia liczbę dni z przekroczeniem normy,
-    - słupki są pogrupowane według lat.
+    - słupki są pogrupowane według lat (dowolnie wielu; szerokość
+      słupka zależy od liczby lat).
 
     Parameters
     ----------
@@ -124,22 +266,152 @@ def wykres_przekroczenia(ile_dni_wybrane_stacje:pd.DataFrame, wybrane_stacje:lis
     norma_dobowa : float
         Wartość dobowej normy PM2.5 użytej do obliczeń,
         wyświetlana w tytule wykresu.
+    fig : matplotlib.figure.Figure, optional
+        Figura do ponownego użycia (jest czyszczona). Domyślnie tworzona jest nowa.
+    plik : str, optional
+        Jeśli podany, wykres jest zapisywany do tego pliku zamiast wyświetlania.
 
     Returns
     -------
-    None
-        Funkcja wyświetla wykres słupkowy i nie zwraca żadnej wartości.
+    matplotlib.figure.Figure
+        Figura z wykresem słupkowym.
     """
     x = np.arange(len(wybrane_stacje))
-    width = 0.2
-    plt.figure(figsize=(10,6))
-    plt.bar(x-width, ile_dni_wybrane_stacje.loc[lata[0]], width, color='red', label=lata[0])
-    plt.bar(x, ile_dni_wybrane_stacje.loc[lata[1]], width, color='green', label=lata[1])
-    plt.bar(x+width, ile_dni_wybrane_stacje.loc[lata[2]], width, color='blue', label=lata[2])
-    plt.bar(x+2*width, ile_dni_wybrane_stacje.loc[lata[3]], width, color='purple', label=lata[3])
-    plt.xticks(x, [stacja[0] for stacja in wybrane_stacje], rotation=30)
-    plt.ylabel('Liczba dni z przekroczeniem normy PM2.5')
-    plt.xlabel('Stacja')
-    plt.legend()
-    plt.title(f"Liczba dni z przekroczeniem normy dobowej = {norma_dobowa} µg/m³")
-    plt.grid(True)
+    width = 0.8 / len(lata)
+    # jedna tablica (lata × stacje) zamiast wycinania wiersza dla każdego roku osobno
+    wartosci = ile_dni_wybrane_stacje.loc[list(lata), list(wybrane_stacje)].to_numpy()
+    kolory = (['red', 'green', 'blue', 'purple'] if len(lata) <= 4
+              else plt.get_cmap('viridis')(np.linspace(0, 1, len(lata))))
+    fig = _figura(fig, (max(10, 0.15 * len(lata) * len(wybrane_stacje)), 6), plik)
+    ax = fig.subplots()
+    for nr, rok in enumerate(lata):
+        ax.bar(x + (nr - (len(lata) - 1) / 2) * width, wartosci[nr], width, color=kolory[nr], label=rok)
+    ax.set_xticks(x, [stacja[0] for stacja in wybrane_stacje], rotation=30)
+    ax.set_ylabel('Liczba dni z przekroczeniem normy PM2.5')
+    ax.set_xlabel('Stacja')
+    ax.legend(ncol=1 + len(lata) // 12)
+    ax.set_title(f"Liczba dni z przekroczeniem normy dobowej = {norma_dobowa} µg/m³")
+    ax.grid(True)
+    return _pokaz_lub_zapisz(fig, plik)
+
+def decymuj_min_max(x:np.ndarray, y:np.ndarray, przedzialy:int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Zmniejsza liczbę punktów szeregów czasowych, zachowując minima i maksima.
+
+    Wiersze są dzielone na `przedzialy` równych przedziałów (np. po jednym
+    na piksel szerokości wykresu), a z każdego przedziału zostają dwa punkty:
+    najmniejsza i największa wartość, w kolejności czasowej. Dzięki temu
+    krótkie epizody smogowe są widoczne tak jak na pełnych danych
+    (podobnie jak w metodach typu LTTB, ale bez interpolacji).
+    Wszystkie stacje są przetwarzane naraz; przedziały bez pomiarów dają NaN
+    (przerwę w linii).
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Oś czasu (długość n), np. datetime64.
+    y : numpy.ndarray
+        Macierz wartości (n × stacje).
+    przedzialy : int
+        Liczba przedziałów; wynik ma co najwyżej 2 * przedzialy wierszy.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Macierze (x, y) o kształcie (2 * przedzialy, stacje) - oś czasu
+        jest osobna dla każdej stacji, bo minima i maksima wypadają
+        w różnych chwilach. Gdy n <= 2 * przedzialy, dane są zwracane
+        bez zmian (x powielone dla każdej stacji).
+    """
+    y = np.asarray(y, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    n, stacje = y.shape
+    if n <= 2 * przedzialy:
+        return np.repeat(np.asarray(x)[:, None], stacje, axis=1), y
+    dlugosc = -(-n // przedzialy)
+    przedzialy = -(-n // dlugosc)
+    bloki = np.full((przedzialy * dlugosc, stacje), np.nan)
+    bloki[:n] = y
+    bloki = bloki.reshape(przedzialy, dlugosc, stacje)
+    brak = np.isnan(bloki)
+    nr_min = np.where(brak, np.inf, bloki).argmin(axis=1)
+    nr_max = np.where(brak, -np.inf, bloki).argmax(axis=1)
+    poczatki = (np.arange(przedzialy) * dlugosc)[:, None]
+    pierwszy = poczatki + np.minimum(nr_min, nr_max)
+    drugi = poczatki + np.maximum(nr_min, nr_max)
+    # pozycje w kolejności czasowej: (przedział, min/max) -> wiersz wyniku
+    pozycje = np.stack([pierwszy, drugi], axis=1).reshape(2 * przedzialy, stacje)
+    pozycje = np.minimum(pozycje, n - 1)
+    wartosci = np.take_along_axis(y, pozycje, axis=0)
+    puste = np.repeat(brak.all(axis=1), 2, axis=0)
+    wartosci[puste] = np.nan
+    return np.asarray(x)[pozycje], wartosci
+
+def wykres_godzinowy(dane:pd.DataFrame, stacje:list[str]=None, od=None, do=None, fig:Figure=None,
+                     plik:str=None, figsize:tuple=(14, 6)) -> Figure:
+    """
+    Rysuje godzinowe stężenia PM2.5 wybranych stacji z decymacją do szerokości wykresu.
+
+    Zamiast dziesiątek tysięcy punktów na stację rysowane są najwyżej dwa
+    punkty (minimum i maksimum) na piksel szerokości osi
+    (decymuj_min_max), więc wieloletnie przebiegi wielu stacji rysują się
+    szybko, a szczyty stężeń pozostają widoczne. Po przybliżeniu wykresu
+    (zmiana zakresu osi X) widoczny fragment jest decymowany ponownie
+    z danych pełnych.
+
+    Parameters
+    ----------
+    dane : pandas.DataFrame
+        Dane godzinowe z funkcji df_gotowy (z indeksem czasowym)
+        i kolumnami (Kod stacji, Miejscowość).
+    stacje : list of str, optional
+        Kody stacji do narysowania (domyślnie wszystkie kolumny).
+    od, do : str albo pandas.Timestamp, optional
+        Zakres czasu (jak przy wycinaniu DataFrame po indeksie czasowym).
+    fig : matplotlib.figure.Figure, optional
+        Figura do ponownego użycia (jest czyszczona). Domyślnie tworzona jest nowa.
+    plik : str, optional
+        Jeśli podany, wykres jest zapisywany do tego pliku zamiast wyświetlania.
+    figsize : tuple, optional
+        Rozmiar figury w calach.
+
+    Returns
+    -------
+    matplotlib.figure.Figure
+        Figura z wykresem.
+    """
+    if stacje is not None:
+        dane = dane.loc[:, dane.columns.get_level_values(0).isin(stacje)]
+    if od is not None or do is not None:
+        dane = dane.loc[od:do]
+    if not all(pd.api.types.is_float_dtype(t) for t in dane.dtypes):
+        dane = dane.apply(pd.to_numeric, errors="coerce")
+    x = pd.DatetimeIndex(dane.index).to_numpy()
+    y = dane.to_numpy(dtype=np.float64)
+    etykiety = [k[0] if isinstance(k, tuple) else k for k in dane.columns]
+
+    fig = _figura(fig, figsize, plik)
+    ax = fig.subplots()
+    przedzialy = max(1, int(ax.get_window_extent().width))
+    xd, yd = decymuj_min_max(x, y, przedzialy)
+    linie = ax.plot(xd, yd, linewidth=0.8, label=etykiety)
+
+    def przelicz(ax):
+        # ponowna decymacja widocznego zakresu po przybliżeniu lub przesunięciu osi
+        lewa, prawa = (np.datetime64(d.replace(tzinfo=None)) for d in mdates.num2date(ax.get_xlim()))
+        a, b = np.searchsorted(x, [lewa, prawa])
+        a, b = max(a - 1, 0), min(b + 1, len(x))
+        xd, yd = decymuj_min_max(x[a:b], y[a:b], max(1, int(ax.get_window_extent().width)))
+        for nr, linia in enumerate(linie):
+            linia.set_data(xd[:, nr], yd[:, nr])
+    ax.callbacks.connect('xlim_changed', przelicz)
+
+    ax.set_xlabel('Data')
+    ax.set_ylabel('PM2.5 [µg/m³]')
+    ax.set_title('Godzinowe stężenie PM2.5')
+    ax.grid(True)
+    if len(linie) <= 20:
+        ax.legend(fontsize='small')
+    return _pokaz_lub_zapisz(fig, plik)
+
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+from analiza import Agregaty, dni_przekroczenia_norm, jako_liczby
+from magazyn import MagazynPM25, ZbiorDyskowy
+
+
+class Zapytanie:
+    """
+    Leniwe zapytanie o dane PM2.5: filtry są tylko zapamiętywane,
+    a dane są czytane i agregowane dopiero przy wywołaniu metody
+    zwracającej wynik (dane, agregaty, srednie_miesieczne, ...).
+
+    Filtry są przenoszone do źródła danych: z DataFrame i MagazynPM25
+    wybierane są tylko potrzebne kolumny i zakres wierszy (przed konwersją
+    na liczby i agregacją), a ze ZbiorDyskowy czytane są z dysku tylko lata
+    z podanego okresu i tylko wybrane stacje.
+
+    Metody filtrujące zwracają nowe zapytanie; kolejne filtry miast
+    i stacji zawężają wynik (część wspólna).
+
+    Parameters
+    ----------
+    zrodlo : pandas.DataFrame, MagazynPM25 albo ZbiorDyskowy
+        Gotowe dane z funkcji df_gotowy albo wczytaj_zbior.
+
+    Examples
+    --------
+    >>> zima = Zapytanie(data).miasta("Katowice").okres("2024-01", "2024-02")
+    >>> zima.srednie_dzienne()
+    """
+
+    def __init__(self, zrodlo):
+        self.zrodlo = zrodlo
+        self._miasta = None
+        self._stacje = None
+        self._od = None
+        self._do = None
+
+    def _zmien(self, **zmiany) -> "Zapytanie":
+        nowe = Zapytanie(self.zrodlo)
+        nowe.__dict__.update(self.__dict__)
+        nowe.__dict__.update(zmiany)
+        return nowe
+
+    # --- filtry ---------------------------------------------------------------
+
+    def miasta(self, *miasta:str) -> "Zapytanie":
+        """Ogranicza zapytanie do stacji w podanych miejscowościach."""
+        wybrane = set(miasta) if self._miasta is None else self._miasta & set(miasta)
+        return self._zmien(_miasta=wybrane)
+
+    def stacje(self, *kody:str) -> "Zapytanie":
+        """Ogranicza zapytanie do stacji o podanych kodach."""
+        wybrane = set(kody) if self._stacje is None else self._stacje & set(kody)
+        return self._zmien(_stacje=wybrane)
+
+    def okres(self, od=None, do=None) -> "Zapytanie":
+        """
+        Ogranicza zapytanie do pomiarów z przedziału [od, do].
+
+        Granice są rozumiane jak przy wycinaniu DataFrame po indeksie
+        czasowym, więc niepełna data obejmuje cały okres, np.
+        okres("2024-01", "2024-02") to styczeń i cały luty 2024.
+        Kolejne wywołanie zastępuje wcześniej podany przedział.
+        """
+        return self._zmien(_od=od, _do=do)
+
+    # --- planowanie -----------------------------------------------------------
+
+    def _kolumny_zrodla(self) -> pd.Index:
+        if isinstance(self.zrodlo, (MagazynPM25, ZbiorDyskowy)):
+            return self.zrodlo.kolumny
+        return self.zrodlo.columns
+
+    def _pozycje_kolumn(self):
+        """Pozycje wybranych kolumn źródła (wycinek, jeśli tworzą ciągły zakres)."""
+        kolumny = self._kolumny_zrodla()
+        maska = np.ones(len(kolumny), dtype=bool)
+        if self._stacje is not None:
+            maska &= kolumny.get_level_values(0).isin(list(self._stacje))
+        if self._miasta is not None:
+            maska &= kolumny.get_level_values("Miejscowość").isin(list(self._miasta))
+        pozycje = np.flatnonzero(maska)
+        if len(pozycje) == len(kolumny):
+            return slice(None)
+        if len(pozycje) and (np.diff(pozycje) == 1).all():
+            return slice(pozycje[0], pozycje[-1] + 1)
+        return pozycje
+
+    def _wiersze(self, indeks:pd.DatetimeIndex):
+        """Wiersze indeksu czasowego z okresu zapytania (wycinek dla indeksu rosnącego)."""
+        if self._od is None and self._do is None:
+            return slice(None)
+        if indeks.is_monotonic_increasing:
+            return indeks.slice_indexer(self._od, self._do)
+        kolejnosc = np.argsort(indeks.values, kind="stable")
+        return np.sort(kolejnosc[indeks[kolejnosc].slice_indexer(self._od, self._do)])
+
+    def _lata_w_okresie(self, lata:list[int]) -> list[int]:
+        od = pd.Timestamp(self._od).year if self._od is not None else None
+        do = pd.Timestamp(self._do).year if self._do is not None else None
+        return [r for r in lata if (od is None or r >= od) and (do is None or r <= do)]
+
+    @property
+    def kolumny(self) -> pd.Index:
+        """Kolumny (Kod stacji, Miejscowość), które obejmie wynik - bez czytania danych."""
+        return self._kolumny_zrodla()[self._pozycje_kolumn()]
+
+    def _fragmenty(self):
+        """Generator fragmentów danych liczbowych po zastosowaniu filtrów."""
+        kolumny = self._pozycje_kolumn()
+        if isinstance(self.zrodlo, ZbiorDyskowy):
+            wybrane = self.kolumny
+            lata = self._lata_w_okresie(self.zrodlo.lata)
+            for rok in lata:
+                indeks = self.zrodlo.indeks(rok)
+                wiersze = self._wiersze(indeks)
+                # z memmap kopiowane są tylko wybrane wiersze i kolumny
+                wartosci = np.asarray(self.zrodlo.wartosci(rok)[wiersze][:, kolumny])
+                yield pd.DataFrame(wartosci, index=indeks[wiersze], columns=wybrane, copy=False)
+            if not lata:
+                yield pd.DataFrame(np.empty((0, len(wybrane)), dtype=np.float32),
+                                   index=pd.DatetimeIndex([]), columns=wybrane)
+        elif isinstance(self.zrodlo, MagazynPM25):
+            indeks = self.zrodlo.indeks
+            wiersze = self._wiersze(indeks)
+            yield pd.DataFrame(self.zrodlo.wartosci[wiersze][:, kolumny], index=indeks[wiersze],
+                               columns=self.kolumny, copy=False)
+        else:
+            df = self.zrodlo
+            yield jako_liczby(df.iloc[self._wiersze(pd.DatetimeIndex(df.index)), kolumny])
+
+    # --- wyniki ---------------------------------------------------------------
+
+    def dane(self) -> pd.DataFrame:
+        """Dane godzinowe spełniające filtry (DataFrame liczbowy)."""
+        return pd.concat(list(self._fragmenty()))
+
+    def agregaty(self, executor=None) -> Agregaty:
+        """
+        Agregaty dobowe (moduł analiza) dla danych spełniających filtry.
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor albo int, optional
+            Pula (lub liczba wątków) do równoległego liczenia bloków stacji.
+        """
+        return Agregaty.z_fragmentow(self._fragmenty(), executor=executor)
+
+    def srednie_dzienne(self, executor=None) -> pd.DataFrame:
+        """Średnie dobowe z indeksem (Rok, Miesiąc, Dzień)."""
+        return self.agregaty(executor).srednie_dzienne
+
+    def srednie_miesieczne(self, executor=None) -> pd.DataFrame:
+        """Średnie miesięczne z indeksem (Rok, Miesiąc), jak srednie_miesieczne z modułu analiza."""
+        return self.agregaty(executor).srednie_miesieczne
+
+    def przekroczenia(self, normy:list[float], lata:list[int]=None, executor=None) -> pd.DataFrame:
+        """
+        Liczby dni z przekroczeniem norm dobowych, jak dni_przekroczenia_norm.
+
+        Parameters
+        ----------
+        normy : list of float
+            Normy dobowe PM2.5.
+        lata : list of int, optional
+            Lata w wyniku (domyślnie wszystkie lata z danymi spełniającymi filtry).
+        executor : concurrent.futures.Executor albo int, optional
+            Pula (lub liczba wątków) do równoległego liczenia średnich dobowych.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame int64 z indeksem (Rok, Norma).
+        """
+        agregaty = self.agregaty(executor)
+        if lata is None:
+            lata = agregaty.lata
+        return dni_przekroczenia_norm(agregaty, normy, lata)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def metadata_df():
+    """Metadane trzech stacji; StationA i StationC mają stare kody."""
+    return pd.DataFrame({
+        "Nr": [1, 2, 3],
+        "Kod stacji": ["StationA", "StationB", "StationC"],
+        "Kod międzynarodowy": ["INT_A", "", ""],
+        "Nazwa stacji": ["Alpha City", "Beta Town", "Gamma Village"],
+        "Stary Kod stacji \n(o ile inny od aktualnego)": [
+            "OldStationA",
+            "",
+            "OldStationC",
+        ],
+        "Miejscowość": ["Alpha", "Beta", "Gamma"],
+    })
+
+
+def _surowa_tabela(start, godziny, stacje, seed):
+    """Tabela w układzie pliku GIOŚ (wiersze opisowe + pomiary godzinowe)."""
+    rng = np.random.default_rng(seed)
+    daty = pd.date_range(start, periods=godziny, freq="h").strftime("%Y-%m-%d %H:%M:%S")
+    wartosci = rng.uniform(0, 60, (godziny, len(stacje))).round(1)
+    naglowek = [["Nr"] + [str(i) for i in range(len(stacje))],
+                ["Kod stacji"] + stacje,
+                ["Wskaźnik"] + ["PM2.5"] * len(stacje)]
+    wiersze = [[d] + list(w) for d, w in zip(daty, wartosci)]
+    return pd.DataFrame(naglowek + wiersze)
+
+
+@pytest.fixture
+def surowa_tabela():
+    """Funkcja (start, godziny, stacje, seed) tworząca surową tabelę GIOŚ."""
+    return _surowa_tabela
@@ -64,3 +64,160 @@ def test_wybierz_stacje_max_min(przykladowy_df):
     stacje, wybrane = wybierz_stacje_max_min(dni_wiecej, 2024, ile_maxmin=1)
     assert len(stacje) == 2  # 1 max + 1 min
     assert set(stacje) == set(wybrane.columns)
+
+def test_przygotuj_dane(przykladowy_df):
+    surowe = przykladowy_df.astype(object)
+    surowe.iloc[0, 0] = "brak"
+    przygotowane = przygotuj_dane(surowe)
+
+    assert (przygotowane.dtypes == "float32").all()
+    assert przygotuj_dane(przygotowane) is przygotowane
+    pd.testing.assert_frame_equal(srednie_miesieczne(przygotowane), srednie_miesieczne(surowe),
+                                  check_dtype=False)
+
+@pytest.fixture
+def dane_godzinowe():
+    idx = pd.date_range("2023-12-30 01:00", periods=24 * 40, freq="h")
+    columns = pd.MultiIndex.from_tuples(
+        [("S1", "Warszawa"), ("S2", "Warszawa"), ("S3", "Krakow")],
+        names=["Kod stacji", "Miejscowość"])
+    rng = np.random.default_rng(0)
+    data = rng.uniform(0, 60, (len(idx), 3))
+    data[rng.random(data.shape) < 0.2] = np.nan
+    data[:100, 2] = np.nan
+    return pd.DataFrame(data, index=idx, columns=columns)
+
+def test_agregaty_zgodne_z_groupby(dane_godzinowe):
+    df = dane_godzinowe
+    agregaty = Agregaty.z_danych(df)
+
+    miesieczne = df.groupby([df.index.year, df.index.month]).mean()
+    dzienne = df.groupby([df.index.year, df.index.month, df.index.day]).mean()
+    assert np.allclose(agregaty.srednie_miesieczne.to_numpy(), miesieczne.to_numpy(), equal_nan=True)
+    assert np.allclose(agregaty.srednie_dzienne.to_numpy(), dzienne.to_numpy(), equal_nan=True)
+    assert agregaty.srednie_dzienne.index.names == ['Rok','Miesiąc','Dzień']
+    assert (agregaty.godziny_miesiecznie.to_numpy() == df.notna().groupby([df.index.year, df.index.month]).sum().to_numpy()).all()
+
+    roczne = agregaty.statystyki_roczne
+    assert np.isclose(roczne.loc[(2024, 'średnia'), ("S1", "Warszawa")], df.loc["2024", ("S1", "Warszawa")].mean())
+    assert roczne.loc[(2024, 'godziny'), ("S3", "Krakow")] == df.loc["2024", ("S3", "Krakow")].notna().sum()
+
+def test_funkcje_przyjmuja_agregaty(dane_godzinowe):
+    agregaty = Agregaty.z_danych(dane_godzinowe)
+    pd.testing.assert_frame_equal(srednie_miesieczne(agregaty), agregaty.srednie_miesieczne)
+    pd.testing.assert_frame_equal(dni_przekroczenia_normy(agregaty, 25, [2023, 2024]),
+                                  dni_przekroczenia_normy(dane_godzinowe, 25, [2023, 2024]))
+
+def test_wyniki_agregatow_nie_sa_wspoldzielone(dane_godzinowe):
+    agregaty = Agregaty.z_danych(dane_godzinowe)
+    oczekiwane = {nazwa: getattr(agregaty, nazwa).copy() for nazwa in
+                  ("srednie_dzienne", "srednie_miesieczne", "godziny_miesiecznie", "statystyki_roczne")}
+    for nazwa in oczekiwane:
+        wynik = getattr(agregaty, nazwa)
+        wynik.mask(wynik.notna(), -1, inplace=True)
+        wynik["nowa"] = 0
+    for nazwa, ramka in oczekiwane.items():
+        pd.testing.assert_frame_equal(getattr(agregaty, nazwa), ramka)
+
+def test_dni_przekroczenia_norm(dane_godzinowe):
+    wynik = dni_przekroczenia_norm(dane_godzinowe, [15, 25, 35], [2023, 2024, 2030])
+
+    assert wynik.index.names == ['Rok','Norma']
+    assert (wynik.dtypes == "int64").all()
+    for norma in [15, 25, 35]:
+        pojedyncza = dni_przekroczenia_normy(dane_godzinowe, norma, [2023, 2024, 2030])
+        assert (wynik.xs(norma, level='Norma').to_numpy() == pojedyncza.to_numpy()).all()
+    dzienne = dane_godzinowe.groupby(dane_godzinowe.index.date).mean()
+    dzienne_2024 = dzienne[pd.to_datetime(dzienne.index).year == 2024]
+    assert wynik.loc[(2024, 25), ("S1", "Warszawa")] == (dzienne_2024[("S1", "Warszawa")] > 25).sum()
+    assert (wynik.loc[2030] == 0).all().all()
+
+def test_pokrycie_i_agregaty_danych_rzadkich(dane_godzinowe):
+    rzadkie = dane_godzinowe.astype(pd.SparseDtype("float32", np.nan))
+
+    pd.testing.assert_frame_equal(srednie_miesieczne(rzadkie), srednie_miesieczne(dane_godzinowe.astype("float32")))
+    rownolegle = Agregaty.z_danych(rzadkie, executor=2, blok_stacji=1)
+    pd.testing.assert_frame_equal(rownolegle.srednie_miesieczne, srednie_miesieczne(rzadkie))
+    pokrycie = pokrycie_stacji(rzadkie)
+    assert pokrycie.index.tolist() == [2023, 2024]
+    assert np.isclose(pokrycie.loc[2024, ("S1", "Warszawa")], dane_godzinowe.loc["2024", ("S1", "Warszawa")].notna().sum() / 8784)
+
+def test_powtorzona_godzina_gesto_i_rzadko():
+    indeks = pd.DatetimeIndex(["2024-01-01 01:00", "2024-01-01 02:00", "2024-01-01 02:00", "2024-01-01 03:00"])
+    gesty = pd.DataFrame({"a": [1.0, 2.0, 4.0, 3.0], "b": [np.nan, 1.0, np.nan, 1.0]}, index=indeks)
+    rzadki = gesty.astype(pd.SparseDtype("float32", np.nan))
+
+    for agregaty in (Agregaty.z_danych(gesty.astype("float32")), Agregaty.z_danych(rzadki),
+                     Agregaty.z_danych(rzadki, executor=2, blok_stacji=1)):
+        assert agregaty.sumy.tolist() == [[8.0, 1.0]]
+        assert agregaty.liczby.tolist() == [[3, 1]]
+
+def test_agregacja_fragmentami_z_dysku(tmp_path, dane_godzinowe):
+    from wczytaj_wyczysc import zapisz_zbior, wczytaj_zbior, przesun_date
+    dane = przesun_date(dane_godzinowe)
+    zapisz_zbior(dane, str(tmp_path))
+    zbior = wczytaj_zbior(str(tmp_path))
+
+    w_pamieci = srednie_miesieczne(dane)
+    for agregaty in (agreguj_fragmentami(zbior), agreguj_fragmentami(zbior, blok_stacji=2)):
+        assert np.allclose(srednie_miesieczne(agregaty).to_numpy(), w_pamieci.to_numpy(), equal_nan=True)
+        assert (dni_przekroczenia_normy(agregaty, 25, [2023, 2024]).to_numpy()
+                == dni_przekroczenia_normy(dane, 25, [2023, 2024]).to_numpy()).all()
+    assert srednie_miesieczne(zbior).index.equals(w_pamieci.index)
+
+def test_bloki_stacji_z_dysku(tmp_path, monkeypatch, dane_godzinowe):
+    import analiza
+    from wczytaj_wyczysc import zapisz_zbior, wczytaj_zbior, przesun_date
+    zapisz_zbior(przesun_date(dane_godzinowe), str(tmp_path))
+    zbior = wczytaj_zbior(str(tmp_path))
+    calosc = Agregaty.z_danych(zbior)
+
+    szerokosci = []
+    sumy_dobowe = analiza._sumy_dobowe
+    def _sumy_dobowe(wartosci, *args):
+        szerokosci.append(wartosci.shape[1])
+        return sumy_dobowe(wartosci, *args)
+    monkeypatch.setattr(analiza, "_sumy_dobowe", _sumy_dobowe)
+    blokami = Agregaty.z_danych(zbior, blok_stacji=1)
+
+    assert set(szerokosci) == {1}
+    pd.testing.assert_frame_equal(blokami.srednie_dzienne, calosc.srednie_dzienne)
+
+def test_rownolegle_agregaty(dane_godzinowe):
+    from concurrent.futures import ThreadPoolExecutor
+    jednowatkowo = Agregaty.z_danych(dane_godzinowe)
+    with ThreadPoolExecutor(max_workers=3) as pula:
+        rownolegle = Agregaty.z_danych(dane_godzinowe, executor=pula, blok_stacji=1)
+    pd.testing.assert_frame_equal(rownolegle.srednie_dzienne, jednowatkowo.srednie_dzienne)
+    pd.testing.assert_frame_equal(srednie_miesieczne(dane_godzinowe, executor=2), jednowatkowo.srednie_miesieczne)
+    pd.testing.assert_frame_equal(dni_przekroczenia_normy(dane_godzinowe, 25, [2024], executor=4),
+                                  dni_przekroczenia_normy(dane_godzinowe, 25, [2024]))
+
+def test_indeks_miast(dane_godzinowe):
+    miesieczne = srednie_miesieczne(dane_godzinowe)
+    indeks = indeks_miast(miesieczne.columns)
+    assert indeks_miast(miesieczne.columns) is indeks
+    assert indeks.miasta.tolist() == ["Krakow", "Warszawa"]
+    assert indeks.kolumny_miasta("Warszawa").tolist() == [0, 1]
+    assert len(indeks.kolumny_miasta("Gdansk")) == 0
+
+    wynik = srednie_po_stacjach(miesieczne)
+    oczekiwane = miesieczne.T.groupby(level="Miejscowość").mean().T
+    pd.testing.assert_frame_equal(wynik, oczekiwane, check_names=False)
+    pd.testing.assert_series_equal(srednie_dla_miast(miesieczne, "Warszawa"), oczekiwane["Warszawa"],
+                                   check_names=False)
+
+def test_ranking_stacji():
+    kolumny = pd.MultiIndex.from_tuples([(f"S{i}", "X") for i in range(6)], names=["Kod stacji", "Miejscowość"])
+    dni = pd.DataFrame([[5, 9, 9, 1, 0, 1], [3, 3, 3, 3, 3, 3], [0, 1, 2, 3, 4, np.nan]],
+                       index=pd.Index([2022, 2023, 2024], name="Rok"), columns=kolumny)
+    najwiecej, najmniej = ranking_stacji(dni, 2)
+
+    kody = lambda ramka: [[k for k, _ in wiersz] for wiersz in ramka.to_numpy()]
+    assert kody(najwiecej) == [["S1", "S2"], ["S0", "S1"], ["S4", "S3"]]
+    assert kody(najmniej) == [["S4", "S3"], ["S2", "S3"], ["S0", "S1"]]
+
+    # przy 3 stacjach listy się nie pokrywają
+    stacje, wybrane = wybierz_stacje_max_min(dni.iloc[:, :3], 2022, ile_maxmin=2)
+    assert len(set(stacje)) == 3 and stacje[:2] == [("S1", "X"), ("S2", "X")]
+    assert list(wybrane.columns) == stacje
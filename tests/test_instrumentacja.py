@@ -0,0 +1,118 @@
+import io
+import json
+import zipfile
+import sys
+import os
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+import instrumentacja
+from instrumentacja import Profil, etap, zlicz
+from analiza import Agregaty
+from pamiec_podreczna import PamiecPodreczna
+from wczytaj_wyczysc import download_gios_archive, df_gotowy
+
+
+class Odpowiedz:
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+class Sesja:
+    def __init__(self, zawartosc):
+        self.zawartosc = zawartosc
+
+    def get(self, url, headers=None):
+        return Odpowiedz(self.zawartosc)
+
+
+@pytest.fixture
+def archiwum_zip():
+    bufor_xlsx = io.BytesIO()
+    pd.DataFrame([["Kod stacji", "StationA"], ["Wskaźnik", "PM2.5"],
+                  ["2020-01-01 01:00:00", 1.5], ["2020-01-01 02:00:00", 2.5]]).to_excel(
+        bufor_xlsx, header=False, index=False)
+    bufor_zip = io.BytesIO()
+    with zipfile.ZipFile(bufor_zip, "w") as z:
+        z.writestr("2020_PM25_1g.xlsx", bufor_xlsx.getvalue())
+    return bufor_zip.getvalue()
+
+
+def test_wylaczona_bez_kosztu():
+    assert not instrumentacja.wlaczona()
+    assert etap("a") is etap("b")
+    zlicz("cokolwiek")  # bez słuchaczy nic się nie dzieje
+
+
+def test_profil_potoku(tmp_path, archiwum_zip):
+    metadane = pd.DataFrame({"Kod stacji": ["StationA"], "Stary Kod stacji \n(o ile inny od aktualnego)": [None],
+                             "Miejscowość": ["Alpha"]})
+    pamiec = PamiecPodreczna(str(tmp_path / "cache"), session=Sesja(archiwum_zip))
+    with Profil() as profil:
+        raw = {2020: download_gios_archive("http://gios/", "1", "2020_PM25_1g.xlsx", pamiec=pamiec)}
+        raw = {2020: download_gios_archive("http://gios/", "1", "2020_PM25_1g.xlsx", pamiec=pamiec)}
+        Agregaty.z_danych(df_gotowy(raw, metadane))
+    assert not instrumentacja.wlaczona()
+
+    raport = profil.raport()
+    etapy = raport["etapy"]
+    assert etapy["pobieranie"]["bajty"] == len(archiwum_zip)
+    assert etapy["parsowanie"]["wywolania"] == 1
+    assert etapy["agregacja"]["wiersze"] == 2
+    for nazwa in ("ujednolicanie", "zmiana_kodow", "przesuniecie_dat", "laczenie"):
+        assert etapy[nazwa]["czas_s"] >= 0
+    assert raport["zdarzenia"] == {"pamiec.archiwum.chybienie": 1, "pamiec.tabela.chybienie": 1,
+                                   "pamiec.tabela.trafienie": 1}
+    assert raport["czas_s"] > 0
+
+    profil.zapisz(str(tmp_path / "profil.json"))
+    with open(tmp_path / "profil.json", encoding="utf-8") as f:
+        assert json.load(f)["etapy"].keys() == etapy.keys()
+
+
+def test_pamiec_etapow(monkeypatch):
+    odczyty = iter([100.0, 150.0, 150.0, 160.0, 160.0, 160.0])
+    monkeypatch.setattr(instrumentacja, "szczyt_rss_mb", lambda: next(odczyty))
+    with Profil() as profil:
+        with etap("wczytanie"):
+            pass
+        with etap("wczytanie"):
+            pass
+    wpis = profil.raport()["etapy"]["wczytanie"]
+    assert wpis["szczyt_rss_mb"] == 160.0
+    assert wpis["przyrost_szczytu_rss_mb"] == 50.0
+
+
+@pytest.mark.parametrize("platforma, oczekiwane", [("linux", 2.0), ("darwin", 2048 / 2**20)])
+def test_szczyt_rss_jednostki(monkeypatch, platforma, oczekiwane):
+    class Zasoby:
+        RUSAGE_SELF = 0
+
+        @staticmethod
+        def getrusage(kto):
+            return type("Uzycie", (), {"ru_maxrss": 2048})
+
+    monkeypatch.setattr(instrumentacja, "resource", Zasoby)
+    monkeypatch.setattr(instrumentacja.sys, "platform", platforma)
+    assert instrumentacja.szczyt_rss_mb() == oczekiwane
+
+
+def test_agregacja_zbioru_dyskowego_bez_podwojnego_liczenia(tmp_path):
+    from wczytaj_wyczysc import zapisz_zbior, wczytaj_zbior
+    indeks = pd.date_range("2020-12-31 22:00", periods=24 * 367, freq="h", name="Data poboru danych")
+    kolumny = pd.MultiIndex.from_tuples([("S1", "Alpha")], names=["Kod stacji", "Miejscowość"])
+    zapisz_zbior(pd.DataFrame(1.0, index=indeks, columns=kolumny), str(tmp_path))
+    zbior = wczytaj_zbior(str(tmp_path))
+
+    with Profil() as profil:
+        Agregaty.z_danych(zbior)
+    raport = profil.raport()
+    assert len(zbior.lata) == 3
+    assert raport["etapy"]["agregacja"]["wywolania"] == 3
+    assert raport["etapy"]["agregacja"]["wiersze"] == len(indeks)
+    assert raport["etapy"]["agregacja"]["czas_s"] <= raport["czas_s"]
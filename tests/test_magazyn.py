@@ -0,0 +1,72 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+from magazyn import MagazynPM25
+from wczytaj_wyczysc import przesun_date
+
+
+@pytest.fixture
+def dane_godzinowe():
+    idx = pd.date_range("2020-12-31 22:00", periods=5, freq="h")
+    columns = pd.MultiIndex.from_tuples(
+        [("StationA", "Alpha"), ("StationB", "Beta"), ("StationC", "Alpha")],
+        names=["Kod stacji", "Miejscowość"])
+    data = np.arange(15, dtype=float).reshape(5, 3).astype(object)
+    data[1, 1] = "brak"
+    return przesun_date(pd.DataFrame(data, index=idx, columns=columns))
+
+
+def test_z_dataframe_i_z_powrotem(dane_godzinowe):
+    m = MagazynPM25.z_dataframe(dane_godzinowe)
+
+    assert m.wartosci.dtype == np.float32
+    assert m.godziny.dtype == np.int32
+    assert m.przesuniecie_polnocy
+    assert m.stacje["Miejscowość"].dtype == "category"
+
+    df = m.do_dataframe()
+    assert df.index.equals(dane_godzinowe.index)
+    assert df.columns.equals(dane_godzinowe.columns)
+    assert np.isnan(df.iloc[1, 1])
+    assert df.iloc[4, 2] == 14
+
+
+def test_wybierz_bez_kopiowania(dane_godzinowe):
+    m = MagazynPM25.z_dataframe(dane_godzinowe)
+
+    ciagly = m.wybierz(["StationB", "StationC"])
+    assert np.shares_memory(ciagly.wartosci, m.wartosci)
+    assert np.shares_memory(m.kolumna("StationA"), m.wartosci)
+    assert list(m.wybierz(["StationC", "StationA"]).stacje["Kod stacji"]) == ["StationC", "StationA"]
+    with pytest.raises(KeyError):
+        m.wybierz(["StationX"])
+
+
+def test_niepelne_godziny():
+    df = pd.DataFrame({"A": [1.0]}, index=pd.to_datetime(["2020-01-01 10:30"]))
+    with pytest.raises(ValueError):
+        MagazynPM25.z_dataframe(df)
+
+
+def test_zapis_i_odczyt_zbioru(tmp_path, dane_godzinowe):
+    from magazyn import ZbiorDyskowy
+    from wczytaj_wyczysc import zapisz_zbior, wczytaj_zbior
+
+    zapisz_zbior(dane_godzinowe, str(tmp_path))
+    zbior = wczytaj_zbior(str(tmp_path))
+
+    assert isinstance(zbior, ZbiorDyskowy)
+    assert zbior.lata == [2020, 2021]
+    assert isinstance(zbior.wartosci(2021), np.memmap)
+    tablica = zbior.rok(2021).to_numpy()
+    while not isinstance(tablica, np.memmap) and tablica.base is not None:
+        tablica = tablica.base
+    assert isinstance(tablica, np.memmap)  # DataFrame bez kopiowania danych z dysku
+
+    odczytane = zbior.do_dataframe()
+    assert odczytane.index.equals(dane_godzinowe.index)
+    assert odczytane.columns.equals(dane_godzinowe.columns)
+    assert np.allclose(odczytane.to_numpy(), MagazynPM25.z_dataframe(dane_godzinowe).wartosci, equal_nan=True)
@@ -0,0 +1,93 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+from analiza import srednie_miesieczne, dni_przekroczenia_normy
+from memoizacja import PamiecWynikow, odcisk
+from przyrostowe import ZbiorPrzyrostowy
+
+
+@pytest.fixture
+def dane():
+    idx = pd.date_range("2024-01-01 01:00", periods=24 * 40, freq="h")
+    columns = pd.MultiIndex.from_tuples([("S1", "Alpha"), ("S2", "Beta")], names=["Kod stacji", "Miejscowość"])
+    return pd.DataFrame(np.random.default_rng(0).uniform(0, 60, (len(idx), 2)), index=idx, columns=columns)
+
+
+def test_memoizacja_po_parametrach(dane):
+    wyniki = PamiecWynikow()
+    przekroczenia = wyniki.memoizuj(dni_przekroczenia_normy)
+
+    pierwszy = przekroczenia(dane, 25, [2024])
+    assert przekroczenia(dane, 25, [2024], executor=2) is pierwszy
+    assert przekroczenia(dane, 35, [2024]) is not pierwszy
+    assert (wyniki.trafienia, wyniki.chybienia) == (1, 2)
+
+    zmienione = dane.copy()
+    zmienione.iloc[0, 0] += 1
+    assert odcisk(zmienione) != odcisk(dane)
+    pd.testing.assert_frame_equal(przekroczenia(dane.copy(), 25, [2024]), pierwszy)
+    assert wyniki.trafienia == 2
+
+
+def test_pomijane_argumenty_pozycyjne(dane):
+    wyniki = PamiecWynikow()
+    srednie = wyniki.memoizuj(srednie_miesieczne)
+    with ThreadPoolExecutor(2) as executor:
+        pierwszy = srednie(dane, executor)
+    assert srednie(dane) is pierwszy
+    assert srednie(dane, executor=None) is pierwszy
+    assert (wyniki.trafienia, wyniki.chybienia) == (2, 1)
+
+
+def test_uniewaznienie_po_dopisaniu_i_dysk(tmp_path, metadata_df, surowa_tabela):
+    zbior = ZbiorPrzyrostowy.utworz(
+        str(tmp_path / "zbior"), {2020: surowa_tabela("2020-01-01 01:00", 24 * 10, ["OldStationA", "StationB"], 0)},
+        metadata_df)
+    katalog = str(tmp_path / "wyniki")
+    srednie = PamiecWynikow(katalog=katalog).memoizuj(srednie_miesieczne)
+
+    przed = srednie(zbior)
+    assert len(os.listdir(katalog)) == 1
+    # nowa instancja (np. kolejne uruchomienie) korzysta z warstwy dyskowej
+    z_dysku = PamiecWynikow(katalog=katalog)
+    pd.testing.assert_frame_equal(z_dysku.wywolaj(srednie_miesieczne, zbior), przed)
+    assert z_dysku.trafienia == 1
+
+    zbior.dopisz({2020: surowa_tabela("2020-02-01 01:00", 24 * 5, ["StationA", "StationB"], 1)}, metadata_df)
+    po = srednie(zbior)
+    assert po.index.tolist() == [(2020, 1), (2020, 2)]
+    pd.testing.assert_frame_equal(po, srednie_miesieczne(zbior.dane))
+    assert len(os.listdir(katalog)) == 1
+
+
+def test_zbior_przyrostowy_bez_wczytywania_historii(tmp_path, monkeypatch, metadata_df, surowa_tabela):
+    zbior = ZbiorPrzyrostowy.utworz(
+        str(tmp_path / "zbior"), {2020: surowa_tabela("2020-01-01 01:00", 24 * 10, ["StationA", "StationB"], 0)},
+        metadata_df)
+    oczekiwane = srednie_miesieczne(zbior.dane)
+
+    def bez_historii(self):
+        raise AssertionError("historia nie powinna być wczytywana do pamięci")
+    monkeypatch.setattr(ZbiorPrzyrostowy, "dane", property(bez_historii))
+    pd.testing.assert_frame_equal(PamiecWynikow().wywolaj(srednie_miesieczne, zbior), oczekiwane)
+
+
+def test_limit_rozmiaru_na_dysku(tmp_path, dane):
+    katalog = tmp_path / "wyniki"
+    pelna = PamiecWynikow(katalog=str(katalog))
+    pelna.wywolaj(dni_przekroczenia_normy, dane, 25, [2024])
+    rozmiar = os.path.getsize(next(katalog.iterdir()))
+    wyniki = PamiecWynikow(max_wpisow=1, katalog=str(katalog), max_rozmiar=2 * rozmiar)
+    for norma in (15, 35, 45):
+        wyniki.wywolaj(dni_przekroczenia_normy, dane, norma, [2024])
+
+    pliki = sorted(p.name for p in katalog.iterdir())
+    assert len(pliki) == 2 and all(p.endswith(".pkl") for p in pliki)
+    # zostają dwa ostatnio używane wyniki
+    wyniki.wywolaj(dni_przekroczenia_normy, dane, 45, [2024])
+    wyniki.wywolaj(dni_przekroczenia_normy, dane, 35, [2024])
+    assert wyniki.trafienia == 2
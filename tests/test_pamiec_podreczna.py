@@ -0,0 +1,136 @@
+import io
+import zipfile
+import sys
+import os
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+from pamiec_podreczna import PamiecPodreczna
+from wczytaj_wyczysc import download_gios_archive
+
+
+class FalszywaOdpowiedz:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FalszywaSesja:
+    """Udaje serwer GIOŚ - zlicza zapytania i obsługuje ETag."""
+    def __init__(self, pliki):
+        self.pliki = pliki
+        self.zapytania = 0
+
+    def get(self, url, headers=None):
+        self.zapytania += 1
+        gios_id = url.rsplit("/", 1)[-1]
+        if headers and headers.get("If-None-Match") == f'"{gios_id}"':
+            return FalszywaOdpowiedz(b"", 304)
+        return FalszywaOdpowiedz(self.pliki[gios_id], headers={"ETag": f'"{gios_id}"'})
+
+
+class BezSieci:
+    def get(self, url, headers=None):
+        raise AssertionError("pamięć podręczna nie powinna korzystać z sieci")
+
+
+@pytest.fixture
+def archiwum_zip():
+    bufor_xlsx = io.BytesIO()
+    pd.DataFrame([["Kod stacji", "StationA"], ["2020-01-01 01:00:00", 1.5]]).to_excel(
+        bufor_xlsx, header=False, index=False)
+    bufor_zip = io.BytesIO()
+    with zipfile.ZipFile(bufor_zip, "w") as z:
+        z.writestr("2020_PM25_1g.xlsx", bufor_xlsx.getvalue())
+    return bufor_zip.getvalue()
+
+
+def test_ciepla_pamiec_bez_sieci(tmp_path, archiwum_zip):
+    sesja = FalszywaSesja({"1": archiwum_zip})
+    pamiec = PamiecPodreczna(str(tmp_path), session=sesja)
+    df1 = download_gios_archive("http://gios/", "1", "2020_PM25_1g.xlsx", pamiec=pamiec)
+    assert sesja.zapytania == 1
+
+    pamiec2 = PamiecPodreczna(str(tmp_path), session=BezSieci())
+    df2 = download_gios_archive("http://gios/", "1", "2020_PM25_1g.xlsx", pamiec=pamiec2)
+    pd.testing.assert_frame_equal(df1, df2)
+    assert df2.iloc[1, 1] == 1.5
+
+
+def test_offline(tmp_path, archiwum_zip):
+    PamiecPodreczna(str(tmp_path), session=FalszywaSesja({"1": archiwum_zip})).pobierz_archiwum("http://gios/", "1")
+    offline = PamiecPodreczna(str(tmp_path), offline=True, session=BezSieci())
+    assert offline.pobierz_archiwum("http://gios/", "1") == archiwum_zip
+    with pytest.raises(FileNotFoundError):
+        offline.pobierz_archiwum("http://gios/", "2")
+
+
+def test_rewalidacja_etag(tmp_path, archiwum_zip):
+    sesja = FalszywaSesja({"1": archiwum_zip})
+    pamiec = PamiecPodreczna(str(tmp_path), rewalidacja=True, session=sesja)
+    pamiec.pobierz_archiwum("http://gios/", "1")
+    assert pamiec.pobierz_archiwum("http://gios/", "1") == archiwum_zip
+    assert sesja.zapytania == 2  # drugie zapytanie zakończone odpowiedzią 304
+
+
+def test_usuwanie_najstarszych(tmp_path):
+    sesja = FalszywaSesja({"1": b"a" * 100, "2": b"b" * 100})
+    pamiec = PamiecPodreczna(str(tmp_path), max_rozmiar=150, session=sesja)
+    pamiec.pobierz_archiwum("http://gios/", "1")
+    pamiec.pobierz_archiwum("http://gios/", "2")
+    assert pamiec.rozmiar() <= 150
+    assert "2" in pamiec._indeks["archiwa"]
+    assert "1" not in pamiec._indeks["archiwa"]
+
+
+def test_trafienia_bez_zapisu_indeksu(tmp_path, archiwum_zip, monkeypatch):
+    pamiec = PamiecPodreczna(str(tmp_path), session=FalszywaSesja({"1": archiwum_zip}))
+    download_gios_archive("http://gios/", "1", "2020_PM25_1g.xlsx", pamiec=pamiec)
+    zapisy = []
+    monkeypatch.setattr(PamiecPodreczna, "_zapisz_plik_indeksu", staticmethod(lambda *a: zapisy.append(a)))
+    for _ in range(5):
+        download_gios_archive("http://gios/", "1", "2020_PM25_1g.xlsx", pamiec=pamiec)
+    assert zapisy == []
+    monkeypatch.undo()
+
+    uzycie = pamiec._indeks["archiwa"]["1"]["ostatnie_uzycie"]
+    pamiec.zapisz()
+    assert PamiecPodreczna(str(tmp_path))._indeks["archiwa"]["1"]["ostatnie_uzycie"] == uzycie
+
+
+def test_usuwanie_archiwum_z_tabelami(tmp_path):
+    sesja = FalszywaSesja({"1": b"a" * 100, "2": b"b" * 100})
+    pamiec = PamiecPodreczna(str(tmp_path), session=sesja)
+    pamiec.pobierz_archiwum("http://gios/", "1")
+    pamiec.zapisz_tabele("1", "plik.xlsx", pd.DataFrame({"a": [1.0]}))
+    # archiwum "1" (najdawniej używane) musi zniknąć, a razem z nim jego tabela
+    pamiec.max_rozmiar = pamiec.rozmiar() + 50
+    pamiec.pobierz_archiwum("http://gios/", "2")
+
+    assert list(pamiec._indeks["archiwa"]) == ["2"]
+    assert pamiec._indeks["tabele"] == {}
+    assert os.listdir(tmp_path / "tabele") == []
+    assert pamiec.rozmiar() == 100
+
+
+def test_nowy_wpis_nie_jest_usuwany(tmp_path, archiwum_zip):
+    pamiec = PamiecPodreczna(str(tmp_path), max_rozmiar=len(archiwum_zip) + 1,
+                             session=FalszywaSesja({"1": archiwum_zip}))
+    download_gios_archive("http://gios/", "1", "2020_PM25_1g.xlsx", pamiec=pamiec)
+
+    # archiwum z tabelą przekracza limit, ale jest jedynym (właśnie zapisanym) wpisem
+    assert list(pamiec._indeks["archiwa"]) == ["1"]
+    assert len(pamiec._indeks["tabele"]) == 1
+    ciepla = PamiecPodreczna(str(tmp_path), max_rozmiar=len(archiwum_zip) + 1, session=BezSieci())
+    download_gios_archive("http://gios/", "1", "2020_PM25_1g.xlsx", pamiec=ciepla)
+
+
+def test_metadane_z_bledem_wczytywania(tmp_path):
+    from wczytaj_wyczysc import download_metadata
+    pamiec = PamiecPodreczna(str(tmp_path), session=FalszywaSesja({"m": b"to nie jest plik Excel"}))
+    assert download_metadata("http://gios/", "m", pamiec=pamiec) is None
@@ -0,0 +1,49 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+from analiza import srednie_miesieczne, dni_przekroczenia_norm
+from przyrostowe import ZbiorPrzyrostowy
+
+
+def test_dopisz_zgodne_z_pelnym_przeliczeniem(tmp_path, metadata_df, surowa_tabela):
+    katalog = str(tmp_path / "zbior")
+    zbior = ZbiorPrzyrostowy.utworz(
+        katalog, {2020: surowa_tabela("2020-11-30 01:00", 24 * 32, ["OldStationA", "StationB"], 0)},
+        metadata_df, normy=[15, 25])
+
+    # nowe dane zaczynają się w środku dnia i nadpisują jedną istniejącą godzinę
+    zmienione = zbior.dopisz(
+        {2021: surowa_tabela("2020-12-31 23:00", 24 * 40, ["StationA", "StationB", "StationX"], 1)},
+        metadata_df)
+
+    assert zmienione["lata"] == [2020, 2021]
+    assert (2021, 2) in zmienione["miesiace"] and (2020, 11) not in zmienione["miesiace"]
+    assert zbior.wersja == 1
+
+    pelne = srednie_miesieczne(zbior.dane)
+    assert np.allclose(zbior.srednie_miesieczne.to_numpy(), pelne.to_numpy(), equal_nan=True)
+    assert zbior.srednie_miesieczne.index.equals(pelne.index)
+    assert (zbior.przekroczenia_norm.to_numpy()
+            == dni_przekroczenia_norm(zbior.dane, [15, 25], [2020, 2021]).to_numpy()).all()
+
+    otwarty = ZbiorPrzyrostowy.otworz(katalog)
+    pd.testing.assert_frame_equal(otwarty.dane, zbior.dane)
+    pd.testing.assert_frame_equal(otwarty.srednie_miesieczne, zbior.srednie_miesieczne)
+    assert otwarty.wersja == 1
+
+
+def test_dopisz_zapisuje_tylko_zmienione_lata(tmp_path, metadata_df, surowa_tabela):
+    katalog = str(tmp_path / "zbior")
+    zbior = ZbiorPrzyrostowy.utworz(
+        katalog, {2020: surowa_tabela("2020-12-01 01:00", 24 * 60, ["StationA", "StationB"], 0)}, metadata_df)
+    plik_2020 = os.path.join(katalog, "dane", "2020.f32")
+    przed = os.stat(plik_2020).st_mtime_ns
+
+    zbior.dopisz({2021: surowa_tabela("2021-02-01 01:00", 24 * 3, ["StationA", "StationB"], 2)}, metadata_df)
+    assert os.stat(plik_2020).st_mtime_ns == przed
+    assert zbior.zbior.lata == [2020, 2021]
+    assert len(zbior.zbior.indeks(2021)) == 24 * 29 + 24 * 3
+    assert np.allclose(zbior.srednie_miesieczne.to_numpy(), srednie_miesieczne(zbior.dane).to_numpy(),
+                       equal_nan=True)
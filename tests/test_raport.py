@@ -0,0 +1,31 @@
+import json
+import sys
+import os
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+from raport import main
+from wczytaj_wyczysc import przesun_date, zapisz_zbior
+
+
+def test_raport_bez_ekranu(tmp_path):
+    idx = pd.date_range("2021-01-01 01:00", "2025-01-01 00:00", freq="h")
+    columns = pd.MultiIndex.from_tuples(
+        [(f"S{i}", miasto) for i, miasto in enumerate(["Katowice", "Warszawa", "Krakow"] * 3)],
+        names=["Kod stacji", "Miejscowość"])
+    wartosci = np.random.default_rng(0).uniform(0, 60, (len(idx), len(columns))).astype(np.float32)
+    zapisz_zbior(przesun_date(pd.DataFrame(wartosci, index=idx, columns=columns)), str(tmp_path / "zbior"))
+
+    katalog = tmp_path / "raport"
+    assert main(["--katalog", str(katalog), "--zbior", str(tmp_path / "zbior"), "--procesy", "2", "--profil"]) == 0
+
+    with open(katalog / "raport.json", encoding="utf-8") as f:
+        opis = json.load(f)
+    assert opis["lata"] == [2021, 2022, 2023, 2024]
+    assert opis["miasta"] == ["Katowice", "Warszawa"]
+    assert len(opis["stacje"]) == 6
+    assert sorted(os.path.basename(p) for p in opis["pliki"]) == ["heatmap.png", "porownanie_miast.png",
+                                                                  "przekroczenia.png"]
+    assert all(os.path.getsize(p) > 0 for p in opis["pliki"])
+    with open(katalog / "profil.json", encoding="utf-8") as f:
+        assert "agregacja" in json.load(f)["etapy"]
@@ -0,0 +1,71 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+from magazyn import MagazynPM25
+from wczytaj_wyczysc import przesun_date, zapisz_zbior, wczytaj_zbior
+from statystyki_kroczace import siatka_godzinowa, srednie_kroczace, srednie_dobowe, percentyl_dobowy
+
+
+@pytest.fixture
+def dane():
+    idx = pd.date_range("2023-01-01 01:00", "2025-01-01 00:00", freq="h")
+    columns = pd.MultiIndex.from_tuples([("S1", "Warszawa"), ("S2", "Krakow"), ("S3", "Gdansk")],
+                                        names=["Kod stacji", "Miejscowość"])
+    rng = np.random.default_rng(3)
+    data = rng.uniform(0, 60, (len(idx), 3))
+    data[rng.random(data.shape) < 0.1] = np.nan
+    data[: 24 * 200, 2] = np.nan  # S3 bez danych przez większość 2023
+    df = przesun_date(pd.DataFrame(data, index=idx, columns=columns))
+    return df.drop(df.index[100:110])  # luka w indeksie
+
+
+def test_siatka_uzupelnia_luki(dane):
+    wartosci, czas, kolumny = siatka_godzinowa(dane)
+    assert wartosci.shape == (24 * 731, 3)
+    assert np.isnan(wartosci[100:110]).all()
+    assert czas[23] == pd.Timestamp("2023-01-01 23:59:59")
+    pd.testing.assert_frame_equal(pd.DataFrame(wartosci, index=czas, columns=kolumny).loc[dane.index], dane,
+                                  check_freq=False)
+
+
+def test_siatka_ze_zbioru_na_dysku(tmp_path, dane):
+    zapisz_zbior(dane, str(tmp_path))
+    wartosci, czas, kolumny = siatka_godzinowa(wczytaj_zbior(str(tmp_path)))
+    oczekiwane, oczekiwany_czas, _ = siatka_godzinowa(dane)
+    assert np.allclose(wartosci, oczekiwane, equal_nan=True)
+    assert (czas == oczekiwany_czas).all()
+    assert kolumny.tolist() == dane.columns.tolist()
+
+
+@pytest.mark.parametrize("okno", ["8h", 24])
+def test_srednie_kroczace_jak_rolling(dane, okno):
+    godziny = 8 if okno == "8h" else 24
+    wynik = srednie_kroczace(dane, okno)
+    wartosci, czas, kolumny = siatka_godzinowa(dane)
+    oczekiwane = pd.DataFrame(wartosci, index=czas, columns=kolumny).rolling(
+        godziny, min_periods=int(np.ceil(0.75 * godziny))).mean()
+    pd.testing.assert_frame_equal(wynik, oczekiwane, check_freq=False)
+    pd.testing.assert_frame_equal(srednie_kroczace(MagazynPM25.z_dataframe(dane), okno), wynik,
+                                  check_freq=False, check_column_type=False, check_index_type=False)
+
+
+def test_srednia_roczna_kroczaca(dane):
+    wynik = srednie_kroczace(dane, "365D", min_udzial=0.5)
+    assert wynik.iloc[:24 * 182, :].isna().all().all()
+    ostatnia = dane.loc["2024-01-02":].iloc[:, 0]
+    assert wynik.iloc[-1, 0] == pytest.approx(ostatnia.mean())
+
+
+def test_percentyl_dobowy(dane):
+    dobowe = srednie_dobowe(dane)
+    liczby = dane.notna().groupby(dane.index.date).sum().to_numpy()
+    assert dobowe.isna().to_numpy().sum() == (liczby < 18).sum()
+
+    wynik = percentyl_dobowy(dane)
+    assert wynik.index.tolist() == [2023, 2024]
+    assert np.isnan(wynik.loc[2023, ("S3", "Gdansk")])
+    rok = dobowe.loc[2024].iloc[:, 0]
+    assert wynik.loc[2024].iloc[0] == pytest.approx(np.nanpercentile(rok, 90.4))
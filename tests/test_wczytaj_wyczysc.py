@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import sys
 import os
@@ -5,22 +6,6 @@ import pytest
 sys.path.append(os.path.join(os.getcwd(), "..", "src"))
 from wczytaj_wyczysc import *
 
-# Tworzę testowy plik z metadanymi
-@pytest.fixture
-def metadata_df():
-    return pd.DataFrame({
-        "Nr": [1, 2, 3],
-        "Kod stacji": ["StationA", "StationB", "StationC"],
-        "Kod międzynarodowy": ["INT_A", "", ""],
-        "Nazwa stacji": ["Alpha City", "Beta Town", "Gamma Village"],
-        "Stary Kod stacji \n(o ile inny od aktualnego)": [
-            "OldStationA",
-            "",
-            "OldStationC",
-        ],
-        "Miejscowość": ["Alpha", "Beta", "Gamma"],
-    })
-
 # Testowy DF
 @pytest.fixture
 def raw_gios_df_1():
@@ -179,3 +164,237 @@ def test_df_gotowy_pipeline(raw_gios_df_1, raw_gios_df_2, metadata_df):
     assert data.index.is_monotonic_increasing
 
 
+
+def _archiwum_zip(tabela, filename):
+    import io
+    import zipfile
+    bufor_xlsx = io.BytesIO()
+    tabela.to_excel(bufor_xlsx, header=False, index=False)
+    bufor_zip = io.BytesIO()
+    with zipfile.ZipFile(bufor_zip, "w") as z:
+        z.writestr(filename, bufor_xlsx.getvalue())
+    return bufor_zip.getvalue()
+
+@pytest.fixture
+def pliki_serwera(raw_gios_df_1, raw_gios_df_2):
+    """Zawartość serwera z lokalny_serwer_gios: {ścieżka: archiwum ZIP} (można ją podmieniać w teście)."""
+    return {
+        "/1": _archiwum_zip(raw_gios_df_1, "2020_PM25_1g.xlsx"),
+        "/2": _archiwum_zip(raw_gios_df_2, "2021_PM25_1g.xlsx"),
+    }
+
+@pytest.fixture
+def lokalny_serwer_gios(pliki_serwera):
+    """
+    Lokalny serwer HTTP udający stronę archiwów GIOŚ.
+    """
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    pliki = pliki_serwera
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in pliki:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(pliki[self.path])))
+            self.end_headers()
+            self.wfile.write(pliki[self.path])
+
+        def log_message(self, *args):
+            pass
+
+    serwer = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    watek = threading.Thread(target=serwer.serve_forever, daemon=True)
+    watek.start()
+    yield f"http://127.0.0.1:{serwer.server_address[1]}/"
+    serwer.shutdown()
+    serwer.server_close()
+
+def test_wczytaj_lata(lokalny_serwer_gios):
+    ids = {2020: "1", 2021: "2"}
+    pliki = {2020: "2020_PM25_1g.xlsx", 2021: "2021_PM25_1g.xlsx"}
+
+    raw_data = wczytaj_lata(lokalny_serwer_gios, ids, pliki, [2020, 2021], max_procesow=2)
+
+    assert list(raw_data.keys()) == [2020, 2021]
+    for rok in raw_data:
+        oczekiwane = download_gios_archive(lokalny_serwer_gios, ids[rok], pliki[rok])
+        pd.testing.assert_frame_equal(raw_data[rok], oczekiwane)
+
+def test_wczytaj_lata_pamiec(tmp_path, monkeypatch, lokalny_serwer_gios, pliki_serwera, raw_gios_df_2):
+    import wczytaj_wyczysc
+    from pamiec_podreczna import PamiecPodreczna
+    ids = {2020: "1", 2021: "2"}
+    pliki = {2020: "2020_PM25_1g.xlsx", 2021: "2021_PM25_1g.xlsx"}
+    katalog = str(tmp_path / "cache")
+    stare = wczytaj_lata(lokalny_serwer_gios, ids, pliki, [2020, 2021], max_procesow=0,
+                         pamiec=PamiecPodreczna(katalog))
+
+    # archiwum 2020 zmienia się na serwerze
+    pliki_serwera["/1"] = _archiwum_zip(raw_gios_df_2, "2020_PM25_1g.xlsx")
+
+    # w pełni z pamięci: bez pobierania i bez puli procesów
+    def bez_puli(*args, **kwargs):
+        raise AssertionError("pula procesów nie powinna być tworzona")
+    monkeypatch.setattr(wczytaj_wyczysc, "ProcessPoolExecutor", bez_puli)
+    z_pamieci = wczytaj_lata(lokalny_serwer_gios, ids, pliki, [2020, 2021], pamiec=PamiecPodreczna(katalog))
+    pd.testing.assert_frame_equal(z_pamieci[2020], stare[2020])
+
+    # z rewalidacją zmienione archiwum jest wczytywane od nowa
+    monkeypatch.undo()
+    nowe = wczytaj_lata(lokalny_serwer_gios, ids, pliki, [2020, 2021], max_procesow=0,
+                        pamiec=PamiecPodreczna(katalog, rewalidacja=True))
+    pd.testing.assert_frame_equal(nowe[2020], stare[2021])
+    pd.testing.assert_frame_equal(nowe[2021], stare[2021])
+
+def test_wczytaj_lata_mala_pamiec(tmp_path, lokalny_serwer_gios, pliki_serwera, raw_gios_df_1, raw_gios_df_2):
+    from pamiec_podreczna import PamiecPodreczna
+    lata = [2020, 2021, 2022, 2023]
+    ids = {rok: str(nr) for nr, rok in enumerate(lata, 1)}
+    pliki = {rok: f"{rok}_PM25_1g.xlsx" for rok in lata}
+    for rok in lata:
+        pliki_serwera[f"/{ids[rok]}"] = _archiwum_zip(raw_gios_df_1 if rok % 2 else raw_gios_df_2, pliki[rok])
+    # pamięć mieści ok. 2,5 archiwum, mniej niż cała partia
+    max_rozmiar = int(2.5 * max(len(a) for a in pliki_serwera.values()))
+    pamiec = PamiecPodreczna(str(tmp_path / "cache"), max_rozmiar=max_rozmiar)
+
+    raw_data = wczytaj_lata(lokalny_serwer_gios, ids, pliki, lata, max_procesow=0, pamiec=pamiec)
+
+    bez_pamieci = wczytaj_lata(lokalny_serwer_gios, ids, pliki, lata, max_procesow=0)
+    for rok in lata:
+        pd.testing.assert_frame_equal(raw_data[rok], bez_pamieci[rok])
+    assert pamiec.rozmiar() <= max_rozmiar
+
+def test_wczytaj_xlsx_strumieniowo(raw_gios_df_1, metadata_df):
+    import io
+    bufor = io.BytesIO()
+    raw_gios_df_1.to_excel(bufor, header=False, index=False)
+
+    df = wczytaj_xlsx_strumieniowo(bufor.getvalue())
+    oczekiwane = ujednolic_dane(pd.read_excel(io.BytesIO(bufor.getvalue()), header=None), metadata_df)
+
+    assert isinstance(df.index, pd.DatetimeIndex)
+    assert (df.dtypes == "float32").all()
+    assert list(df.columns) == ["OldStationA", "StationB"]
+    assert df.index.equals(pd.DatetimeIndex(pd.to_datetime(oczekiwane.index)))
+    assert df.to_numpy().tolist() == [[10.0, 20.0], [11.0, 21.0]]
+    assert set(ujednolic_dane(df, metadata_df).columns) == set(oczekiwane.columns)
+
+def test_wczytaj_xlsx_strumieniowo_daty_excela():
+    import io
+    surowe = pd.DataFrame([
+        ["Kod stacji", "StationA", "StationB"],
+        ["Wskaźnik", "PM2.5", "PM2.5"],
+        [pd.Timestamp("2020-01-01 01:00:00"), "1,5", None],
+        [pd.Timestamp("2020-01-01 02:00:00"), 2.0, "brak"],
+    ])
+    bufor = io.BytesIO()
+    surowe.to_excel(bufor, header=False, index=False)
+
+    df = wczytaj_xlsx_strumieniowo(bufor.getvalue())
+
+    assert list(df.index) == [pd.Timestamp("2020-01-01 01:00:00"), pd.Timestamp("2020-01-01 02:00:00")]
+    assert df.loc[df.index[0], "StationA"] == 1.5
+    assert df.isna().sum().sum() == 2
+
+_NS_XLSX = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+
+@pytest.fixture
+def xlsx_typy_komorek():
+    """Plik .xlsx z komórkami typów s, inlineStr, str, d, e, b i n (jak zapisują je różne programy)."""
+    import io
+    import zipfile
+    arkusz = f"""<worksheet {_NS_XLSX}><sheetData>
+<row r="1"><c r="A1" t="inlineStr"><is><t>Kod stacji</t></is></c><c r="B1" t="s"><v>0</v></c>
+<c r="C1" t="inlineStr"><is><t>StationB</t></is></c></row>
+<row r="2"><c r="A2" t="s"><v>1</v></c><c r="B2" t="inlineStr"><is><t>PM2.5</t></is></c><c r="C2" t="str"><v>PM2.5</v></c></row>
+<row r="3"><c r="A3" t="d"><v>2020-01-01T01:00:00</v></c><c r="B3"><v>1.5</v></c><c r="C3" t="e"><v>#N/A</v></c></row>
+<row r="4"><c r="A4" t="inlineStr"><is><t>2020-01-01 02:00:00</t></is></c><c r="B4" t="str"><v>2,5</v></c>
+<c r="C4" t="b"><v>1</v></c></row>
+<row r="5"><c r="A5" t="s"><v>2</v></c><c r="B5"><v>brak</v></c></row>
+</sheetData></worksheet>"""
+    napisy = f"<sst {_NS_XLSX}><si><t>StationA</t></si><si><t>Wskaźnik</t></si><si><t>2020-01-01 03:00:00</t></si></sst>"
+    bufor = io.BytesIO()
+    with zipfile.ZipFile(bufor, "w") as z:
+        z.writestr("xl/worksheets/sheet1.xml", arkusz)
+        z.writestr("xl/sharedStrings.xml", napisy)
+    return bufor.getvalue()
+
+def test_wczytaj_xlsx_strumieniowo_typy_komorek(xlsx_typy_komorek):
+    df = wczytaj_xlsx_strumieniowo(xlsx_typy_komorek)
+
+    assert list(df.columns) == ["StationA", "StationB"]
+    assert list(df.index) == [pd.Timestamp("2020-01-01 01:00:00"), pd.Timestamp("2020-01-01 02:00:00"),
+                              pd.Timestamp("2020-01-01 03:00:00")]
+    assert np.array_equal(df.to_numpy(), [[1.5, np.nan], [2.5, 1.0], [np.nan, np.nan]], equal_nan=True)
+
+def test_przesun_date_zgodnosc_z_petla():
+    idx = pd.date_range("2019-12-30 20:00", periods=24 * 800, freq="h")
+    df = pd.DataFrame({"StationA": range(len(idx))}, index=idx.strftime("%Y-%m-%d %H:%M:%S"))
+
+    df2 = przesun_date(df)
+
+    polnoc = idx.hour == 0
+    oczekiwany = pd.DatetimeIndex([t - pd.Timedelta(seconds=1) if h else t for t, h in zip(idx, polnoc)])
+    assert (df2.index == oczekiwany).all()
+    assert df.index[0] == "2019-12-30 20:00:00"  # oryginał bez zmian
+
+def test_przesun_date_w_miejscu():
+    idx = pd.to_datetime(["2020-01-02 00:00:00", "2020-01-02 01:00:00"])
+    df = pd.DataFrame({"StationA": [1, 2]}, index=idx)
+
+    df2 = przesun_date(df, w_miejscu=True)
+
+    assert df2 is df
+    assert df.index[0] == pd.Timestamp("2020-01-01 23:59:59")
+
+def test_df_gotowy_kompaktowy(monkeypatch, raw_gios_df_1, raw_gios_df_2, metadata_df):
+    raw_data = {2020: raw_gios_df_1, 2021: raw_gios_df_2}
+    data = df_gotowy(raw_data, metadata_df)
+
+    # lata trafiają prosto do macierzy float32, bez sklejania tabel obiektów
+    def bez_laczenia(*args, **kwargs):
+        raise AssertionError("pd.concat nie powinno być wywoływane")
+    monkeypatch.setattr(pd, "concat", bez_laczenia)
+    magazyn = df_gotowy(raw_data, metadata_df, kompaktowy=True)
+    monkeypatch.undo()
+
+    odtworzone = magazyn.do_dataframe()
+    assert odtworzone.index.equals(data.index)
+    assert odtworzone.columns.equals(data.columns)
+    assert np.allclose(odtworzone.to_numpy(), data.to_numpy(dtype=float))
+
+def test_rejestr_stacji_lancuch_zmian():
+    metadane = pd.DataFrame({
+        "Kod stacji": ["StationB", " StationC ", "StationD"],
+        "Stary Kod stacji \n(o ile inny od aktualnego)": ["StationA", "StationB, OldC", None],
+        "Miejscowość": ["Beta", "Gamma", "Delta"],
+    })
+    rejestr = rejestr_stacji(metadane)
+
+    assert rejestr_stacji(metadane) is rejestr  # zbudowany tylko raz
+    assert rejestr.nowe_kody["StationA"] == "StationC"
+    assert rejestr.nowe_kody["OldC"] == "StationC"
+
+    df = pd.DataFrame({"StationA ": [1], "StationD": [2]})
+    assert list(zaktualizuj_nazwy_stacji(df, rejestr).columns) == ["StationC", "StationD"]
+
+def test_multiindex_funkcja_niezalezny_od_kolejnosci_metadanych(metadata_df):
+    df = pd.DataFrame({"StationC": [1.0], "StationA": [2.0]})
+    wynik = multiindex_funkcja(df, metadata_df.iloc[::-1], pd.Index(["StationC", "StationA"]))
+    assert list(wynik.columns) == [("StationC", "Gamma"), ("StationA", "Alpha")]
+
+def test_df_gotowy_wszystkie_stacje(raw_gios_df_1, raw_gios_df_2, metadata_df):
+    raw_data = {2020: raw_gios_df_1, 2021: raw_gios_df_2}
+
+    data = df_gotowy(raw_data, metadata_df, stacje="wszystkie")
+
+    assert set(data.columns.get_level_values(0)) == {"StationA", "StationB", "StationC"}
+    assert all(isinstance(t, pd.SparseDtype) for t in data.dtypes)
+    assert data[("StationB", "Beta")].isna().sum() == 2  # brak stacji B w 2021
+    assert data[("StationA", "Alpha")].tolist() == [10.0, 11.0, 30.0, 31.0]
+    # brakujące lata nie są zapisywane jako gęste wartości NaN
+    assert data[("StationC", "Gamma")].array.sp_values.tolist() == [40.0, 41.0]
@@ -0,0 +1,81 @@
+import sys
+import os
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+from wizualizacja import *
+
+
+@pytest.fixture
+def srednie_miast():
+    indeks = pd.MultiIndex.from_product([[2022, 2023, 2024], range(1, 13)], names=['Rok', 'Miesiąc'])
+    miasta = pd.Index([f"Miasto{i}" for i in range(7)], name="Miejscowość")
+    wartosci = np.arange(len(indeks) * len(miasta), dtype=float).reshape(len(indeks), -1)
+    return pd.DataFrame(wartosci, index=indeks, columns=miasta).drop((2023, 5))
+
+
+def test_kostka_heatmap(srednie_miast):
+    kostka = kostka_heatmap(srednie_miast, [2024, 2022])
+    assert kostka.shape == (7, 2, 12)
+    assert kostka[3, 0, 1] == srednie_miast.loc[(2024, 2), "Miasto3"]
+    assert np.isnan(kostka_heatmap(srednie_miast, [2023])[0, 0, 4])
+
+
+def test_heatmap_wsadowo(tmp_path, srednie_miast):
+    pliki = wykres_heatmap_wsadowo(srednie_miast, [2022, 2023, 2024], str(tmp_path), na_stronie=3, procesy=2)
+    assert [os.path.basename(p) for p in pliki] == ["heatmap_001.png", "heatmap_002.png", "heatmap_003.png"]
+    assert all(os.path.getsize(p) > 0 for p in pliki)
+
+
+def test_wykresy_dla_dowolnej_liczby_lat(tmp_path, srednie_miast):
+    lata = [2022, 2023, 2024]
+    fig = wykres_porownanie_miast(srednie_miast, lata, ["Miasto1", "Miasto4"], plik=str(tmp_path / "m.png"))
+    linie = fig.axes[0].get_lines()
+    assert [l.get_label() for l in linie][:4] == ["Miasto1 2022", "Miasto1 2023", "Miasto1 2024", "Miasto4 2022"]
+    assert np.array_equal(linie[2].get_ydata(), srednie_miast.loc[2024, "Miasto1"].to_numpy())
+
+    stacje = [("S1", "A"), ("S2", "B")]
+    dni = pd.DataFrame([[1, 2]] * 7, index=range(2018, 2025), columns=pd.MultiIndex.from_tuples(stacje))
+    fig = wykres_przekroczenia(dni, stacje, list(range(2018, 2025)), 25.0, fig=fig, plik=str(tmp_path / "p.png"))
+    assert len(fig.axes[0].patches) == 14
+    assert os.path.getsize(tmp_path / "p.png") > 0
+
+
+def test_decymacja_zachowuje_szczyty():
+    rng = np.random.default_rng(0)
+    x = pd.date_range("2020-01-01", periods=50_001, freq="h").to_numpy()
+    y = rng.uniform(0, 30, (len(x), 3))
+    y[12_345, 0] = 500.0
+    y[:20_000, 2] = np.nan
+    xd, yd = decymuj_min_max(x, y, 400)
+
+    assert yd.shape[0] <= 800 and xd.shape == yd.shape
+    assert np.nanmax(yd[:, 0]) == 500.0 and xd[np.nanargmax(yd[:, 0]), 0] == x[12_345]
+    assert np.nanmin(yd, axis=0) == pytest.approx(np.nanmin(y, axis=0))
+    assert (np.diff(xd[:, 1]) >= np.timedelta64(0)).all()
+    assert np.isnan(yd[:100, 2]).all()
+
+
+def test_wykres_godzinowy(tmp_path):
+    idx = pd.date_range("2021-01-01 01:00", periods=24 * 365 * 3, freq="h")
+    kolumny = pd.MultiIndex.from_tuples([("S1", "A"), ("S2", "B"), ("S3", "C")], names=["Kod stacji", "Miejscowość"])
+    dane = pd.DataFrame(np.random.default_rng(1).uniform(0, 60, (len(idx), 3)), index=idx, columns=kolumny)
+    fig = wykres_godzinowy(dane, stacje=["S1", "S3"], plik=str(tmp_path / "g.png"))
+    linie = fig.axes[0].get_lines()
+    assert [l.get_label() for l in linie] == ["S1", "S3"]
+    assert all(len(l.get_xdata()) <= 2 * fig.axes[0].get_window_extent().width + 2 for l in linie)
+
+    fig.axes[0].set_xlim(pd.Timestamp("2022-03-01"), pd.Timestamp("2022-03-03"))
+    assert len(linie[0].get_xdata()) <= 2 * 24 * 2 + 4
+
+
+def test_zapis_do_pliku_bez_figur_pyplot(tmp_path, srednie_miast):
+    import matplotlib.pyplot as plt
+    plt.close("all")
+    for nr in range(25):
+        wykres_porownanie_miast(srednie_miast, [2022], ["Miasto1"], plik=str(tmp_path / f"m{nr}.png"))
+    assert plt.get_fignums() == []
+    assert len(os.listdir(tmp_path)) == 25
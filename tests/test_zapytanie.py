@@ -0,0 +1,52 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import pytest
+sys.path.append(os.path.join(os.getcwd(), "..", "src"))
+from analiza import srednie_miesieczne, dni_przekroczenia_norm
+from magazyn import MagazynPM25
+from wczytaj_wyczysc import przesun_date, zapisz_zbior, wczytaj_zbior
+from zapytanie import Zapytanie
+
+
+@pytest.fixture
+def dane():
+    idx = pd.date_range("2023-12-01 01:00", periods=24 * 90, freq="h")
+    columns = pd.MultiIndex.from_tuples(
+        [("S1", "Warszawa"), ("S2", "Krakow"), ("S3", "Warszawa"), ("S4", "Gdansk")],
+        names=["Kod stacji", "Miejscowość"])
+    rng = np.random.default_rng(1)
+    data = rng.uniform(0, 60, (len(idx), 4)).astype(np.float32)
+    data[rng.random(data.shape) < 0.1] = np.nan
+    return przesun_date(pd.DataFrame(data, index=idx, columns=columns))
+
+
+def test_filtry_jak_pelne_przeliczenie(tmp_path, dane):
+    zapisz_zbior(dane, str(tmp_path))
+    oczekiwane = dane.loc["2024-01":"2024-02", dane.columns.get_level_values(1) == "Warszawa"]
+
+    for zrodlo in (dane, MagazynPM25.z_dataframe(dane), wczytaj_zbior(str(tmp_path))):
+        zapytanie = Zapytanie(zrodlo).miasta("Warszawa", "Krakow").miasta("Warszawa").okres("2024-01", "2024-02")
+        assert zapytanie.kolumny.tolist() == [("S1", "Warszawa"), ("S3", "Warszawa")]
+
+        pd.testing.assert_frame_equal(zapytanie.dane(), oczekiwane, check_freq=False, check_index_type=False,
+                                      check_column_type=False)
+        wynik = zapytanie.srednie_miesieczne()
+        assert wynik.index.tolist() == [(2024, 1), (2024, 2)]
+        assert np.allclose(wynik.to_numpy(), srednie_miesieczne(oczekiwane).to_numpy(), equal_nan=True)
+        assert (zapytanie.przekroczenia([25]).to_numpy()
+                == dni_przekroczenia_norm(oczekiwane, [25], [2024]).to_numpy()).all()
+
+
+def test_stacje_i_brak_danych(tmp_path, dane):
+    zapytanie = Zapytanie(dane).stacje("S2", "S4")
+    assert zapytanie.kolumny.get_level_values(0).tolist() == ["S2", "S4"]
+    wybrane = dane.iloc[:, [1, 3]]
+    dzienne = wybrane.groupby([wybrane.index.year, wybrane.index.month, wybrane.index.day]).mean()
+    assert np.allclose(zapytanie.srednie_dzienne().to_numpy(), dzienne.to_numpy(), equal_nan=True)
+    assert Zapytanie(dane).okres("2024-01-15", "2024-01-15").dane().shape == (24, 4)
+
+    zapisz_zbior(dane, str(tmp_path))
+    pusty = Zapytanie(wczytaj_zbior(str(tmp_path))).okres("2030").srednie_miesieczne()
+    assert pusty.shape == (0, 4)